@@ -1,18 +1,66 @@
 # -*- coding: utf-8 -*-
 """
 Módulo __init__ - Ponto de entrada do pacote nfce_reader.
+
+Os nomes públicos são importados só no primeiro acesso: `import nfce_reader`
+(ou usar apenas o scraper) não carrega o OpenCV do decoder nem o
+httpx/BeautifulSoup do scraper. Confira com `benchmark.py importacao`.
 """
 
-from .decoder import decode_qr_from_image, decode_multiple_qr
-from .scraper import fetch_page, parse_nfce, scrape_nfce
-from .models import Item, Meta, NFCe, create_nfce_from_dict
+import importlib
+import importlib.util
+from typing import TYPE_CHECKING
+
+# Nome público -> submódulo que o define
+_LAZY = {
+    "extract_chave": "access_key",
+    "is_valid_chave": "access_key",
+    "decode_qr_from_image": "decoder",
+    "decode_multiple_qr": "decoder",
+    "detect_estado": "scraper",
+    "fetch_page": "scraper",
+    "fetch_page_async": "scraper",
+    "parse_nfce": "scraper",
+    "scrape_nfce": "scraper",
+    "scrape_nfce_async": "scraper",
+    "register_estado": "scraper",
+    "iter_nfce_xml": "xml_import",
+    "parse_nfce_xml": "xml_import",
+    "Item": "models",
+    "Meta": "models",
+    "NFCe": "models",
+    "create_nfce_from_dict": "models",
+}
+
+if TYPE_CHECKING:  # Para IDEs e checadores de tipo
+    from .access_key import extract_chave, is_valid_chave
+    from .decoder import decode_qr_from_image, decode_multiple_qr
+    from .scraper import (
+        detect_estado,
+        fetch_page,
+        fetch_page_async,
+        parse_nfce,
+        scrape_nfce,
+        scrape_nfce_async,
+        register_estado,
+    )
+    from .xml_import import iter_nfce_xml, parse_nfce_xml
+    from .models import Item, Meta, NFCe, create_nfce_from_dict
 
 __all__ = [
+    "extract_chave",
+    "is_valid_chave",
     "decode_qr_from_image",
     "decode_multiple_qr",
+    "detect_estado",
     "fetch_page",
+    "fetch_page_async",
     "parse_nfce",
     "scrape_nfce",
+    "scrape_nfce_async",
+    "iter_nfce_xml",
+    "parse_nfce_xml",
+    "register_estado",
     "Item",
     "Meta",
     "NFCe",
@@ -20,3 +68,20 @@ __all__ = [
 ]
 
 __version__ = "0.1.0"
+
+
+def __getattr__(nome: str):
+    modulo = _LAZY.get(nome)
+    if modulo is not None:
+        valor = getattr(importlib.import_module(f".{modulo}", __name__), nome)
+        globals()[nome] = valor   # Próximos acessos não passam por aqui
+        return valor
+    # nfce_reader.scraper etc. sem import explícito (como antes, quando o
+    # __init__ importava os submódulos)
+    if not nome.startswith("_") and importlib.util.find_spec(f"{__name__}.{nome}") is not None:
+        return importlib.import_module(f".{nome}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
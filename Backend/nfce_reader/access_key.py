@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo Access Key - Chave de acesso (44 dígitos) das NFC-e.
+
+A chave identifica a nota de forma única, independente da forma da URL
+do QR Code (versão do parâmetro p=, http/https, espaços). Por isso é
+usada como chave de deduplicação e de arquivo.
+
+Estrutura (Manual de Orientação do Contribuinte):
+
+    cUF(2) AAMM(2+2) CNPJ(14) mod(2) serie(3) nNF(9) tpEmis(1) cNF(8) cDV(1)
+
+O dígito verificador (cDV) é o módulo 11 dos 43 primeiros dígitos, com
+pesos 2..9 aplicados da direita para a esquerda.
+"""
+
+import re
+from typing import Optional
+
+
+CHAVE_LEN = 44
+
+# Códigos IBGE das UFs válidos como cUF
+CODIGOS_UF_VALIDOS = frozenset({
+    "11", "12", "13", "14", "15", "16", "17",
+    "21", "22", "23", "24", "25", "26", "27", "28", "29",
+    "31", "32", "33", "35",
+    "41", "42", "43",
+    "50", "51", "52", "53",
+})
+
+# Sequência de exatamente 44 dígitos (não parte de um número maior)
+_RE_CANDIDATA = re.compile(r'(?<!\d)\d{44}(?!\d)')
+
+
+def check_digit(base: str) -> int:
+    """Calcula o dígito verificador (módulo 11) dos 43 primeiros dígitos."""
+    soma = 0
+    peso = 2
+    for digito in reversed(base):
+        soma += int(digito) * peso
+        peso = 2 if peso == 9 else peso + 1
+    resto = soma % 11
+    return 0 if resto < 2 else 11 - resto
+
+
+def is_valid_chave(chave: Optional[str]) -> bool:
+    """
+    Valida formato, código da UF, mês de emissão e dígito verificador.
+    """
+    if not chave or len(chave) != CHAVE_LEN or not chave.isdigit():
+        return False
+    if chave[:2] not in CODIGOS_UF_VALIDOS:
+        return False
+    if not 1 <= int(chave[4:6]) <= 12:
+        return False
+    return check_digit(chave[:43]) == int(chave[43])
+
+
+def find_chave_candidata(url: str) -> Optional[str]:
+    """Primeira sequência de 44 dígitos da URL, válida ou não."""
+    match = _RE_CANDIDATA.search(url or "")
+    return match.group() if match else None
+
+
+def extract_chave(url: str) -> Optional[str]:
+    """
+    Extrai a chave de acesso canônica da URL do QR Code.
+
+    Aceita os formatos usados pelas SEFAZ (?p=CHAVE|2|1|..., ?chNFe=CHAVE&...).
+    Nenhuma requisição é feita: a validação é local.
+
+    Returns:
+        Chave com 44 dígitos e dígito verificador correto, ou None.
+    """
+    for match in _RE_CANDIDATA.finditer(url or ""):
+        chave = match.group()
+        if is_valid_chave(chave):
+            return chave
+    return None
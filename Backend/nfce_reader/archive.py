@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo Archive - Arquivo persistente das páginas brutas de NFC-e.
+
+Guarda o HTML baixado da SEFAZ para permitir re-parse (correções de
+parser, novos campos) sem buscar a página de novo. O scraper só arquiva
+páginas que renderam itens e regrava a chave (put) quando a cópia
+arquivada não rende itens.
+
+Layout em disco (NFCE_ARCHIVE_DIR, padrão ./arquivo_nfce):
+
+    objects/ab/abcdef...    Conteúdo comprimido (zlib), endereçado
+                            pelo SHA-256 dos bytes originais
+    index.bin               Índice append-only de registros fixos:
+                            chave de acesso (44 bytes ASCII) + SHA-256 (32 bytes)
+
+O índice é lido via mmap e resumido num dict chave -> posição do
+registro. O dict é atualizado só com os registros novos a cada remapeamento
+(o arquivo só cresce), então cada busca é O(1) e abrir um índice existente
+custa uma única leitura sequencial. Em caso de chave repetida, vale o
+registro mais recente.
+"""
+
+import hashlib
+import mmap
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Optional
+
+
+# ============================================================================
+# CONFIGURAÇÃO
+# ============================================================================
+
+ARCHIVE_DIR = os.getenv("NFCE_ARCHIVE_DIR", "./arquivo_nfce")
+ARCHIVE_ENABLED = os.getenv("NFCE_ARCHIVE_ENABLED", "1") not in ("0", "false", "False")
+COMPRESS_LEVEL = 6
+
+CHAVE_LEN = 44
+DIGEST_LEN = 32
+RECORD_LEN = CHAVE_LEN + DIGEST_LEN
+
+
+# ============================================================================
+# ARQUIVO DE PÁGINAS
+# ============================================================================
+
+class PageArchive:
+    """Armazenamento endereçado por conteúdo, indexado pela chave de acesso."""
+
+    def __init__(self, root: str = ARCHIVE_DIR):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.index_path = self.root / "index.bin"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path.touch(exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._index_file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._mapped_size = 0
+        self._posicoes: dict[int, int] = {}   # int(chave) -> offset do registro
+        self._indexado = 0                    # Bytes do índice já no dict
+
+        self.hits = 0
+        self.misses = 0
+        self.gravacoes = 0
+
+    # ------------------------------------------------------------------
+    # Índice (mmap)
+    # ------------------------------------------------------------------
+
+    def _refresh_mmap(self) -> Optional[mmap.mmap]:
+        """Remapeia o índice se outro processo/thread o aumentou."""
+        size = os.path.getsize(self.index_path)
+        if size == self._mapped_size and self._mmap is not None:
+            return self._mmap
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._index_file is None:
+            self._index_file = open(self.index_path, "rb")
+        # Ignora um registro parcial no fim (escrita concorrente em andamento)
+        usable = size - (size % RECORD_LEN)
+        if usable:
+            self._mmap = mmap.mmap(self._index_file.fileno(), usable, access=mmap.ACCESS_READ)
+            # Só os registros acrescentados desde o último remapeamento
+            for pos in range(self._indexado, usable, RECORD_LEN):
+                chave = self._mmap[pos:pos + CHAVE_LEN]
+                if chave.isdigit():
+                    self._posicoes[int(chave)] = pos
+            self._indexado = usable
+        self._mapped_size = size
+        return self._mmap
+
+    def _lookup_digest(self, chave: str) -> Optional[bytes]:
+        """Busca o digest mais recente da chave no índice."""
+        with self._lock:
+            mm = self._refresh_mmap()
+            pos = self._posicoes.get(int(chave))
+            if mm is None or pos is None:
+                return None
+            return mm[pos + CHAVE_LEN:pos + RECORD_LEN]
+
+    def _object_path(self, digest_hex: str) -> Path:
+        return self.objects_dir / digest_hex[:2] / digest_hex
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def get(self, chave: str) -> Optional[bytes]:
+        """
+        Retorna os bytes da página arquivada para a chave de acesso.
+
+        Returns:
+            Bytes originais (descomprimidos), ou None se não arquivada.
+        """
+        if not _chave_valida(chave):
+            return None
+        digest = self._lookup_digest(chave)
+        if digest is None:
+            self.misses += 1
+            return None
+        try:
+            data = zlib.decompress(self._object_path(digest.hex()).read_bytes())
+        except (OSError, zlib.error) as e:
+            print(f"[ERRO] Arquivo corrompido para chave {chave}: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, chave: str, data: bytes) -> Optional[str]:
+        """
+        Arquiva os bytes da página e associa à chave de acesso.
+
+        Conteúdo idêntico é gravado uma única vez (mesmo SHA-256).
+
+        Returns:
+            SHA-256 (hex) do conteúdo, ou None se a chave for inválida.
+        """
+        if not _chave_valida(chave):
+            return None
+        digest = hashlib.sha256(data).digest()
+        digest_hex = digest.hex()
+        path = self._object_path(digest_hex)
+
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{digest_hex}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(zlib.compress(data, COMPRESS_LEVEL))
+            os.replace(tmp, path)
+
+        if self._lookup_digest(chave) != digest:
+            # Um único write() de registro fixo com O_APPEND: seguro entre processos
+            with open(self.index_path, "ab", buffering=0) as f:
+                f.write(chave.encode("ascii") + digest)
+            self.gravacoes += 1
+
+        return digest_hex
+
+    def __contains__(self, chave: str) -> bool:
+        return _chave_valida(chave) and self._lookup_digest(chave) is not None
+
+    def stats(self) -> dict:
+        return {
+            "diretorio": str(self.root),
+            "registros": os.path.getsize(self.index_path) // RECORD_LEN,
+            "hits": self.hits,
+            "misses": self.misses,
+            "gravacoes": self.gravacoes,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            if self._index_file is not None:
+                self._index_file.close()
+                self._index_file = None
+            self._mapped_size = 0
+            self._posicoes.clear()
+            self._indexado = 0
+
+
+def _chave_valida(chave: Optional[str]) -> bool:
+    return bool(chave) and len(chave) == CHAVE_LEN and chave.isdigit()
+
+
+# ============================================================================
+# SINGLETON
+# ============================================================================
+
+_archive: Optional[PageArchive] = None
+_archive_lock = threading.Lock()
+
+
+def get_archive() -> Optional[PageArchive]:
+    """Retorna o arquivo global, ou None se desativado (NFCE_ARCHIVE_ENABLED=0)."""
+    global _archive
+    if not ARCHIVE_ENABLED:
+        return None
+    if _archive is None:
+        with _archive_lock:
+            if _archive is None:
+                try:
+                    _archive = PageArchive(ARCHIVE_DIR)
+                except OSError as e:
+                    print(f"[ERRO] Arquivo de páginas indisponível ({ARCHIVE_DIR}): {e}")
+                    return None
+    return _archive
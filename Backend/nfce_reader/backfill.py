@@ -0,0 +1,464 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo Backfill - Reprocessamento em massa das notas já gravadas.
+
+Notas antigas ficaram sem endereço/data de emissão ou foram lidas com o
+layout errado (estado fixo em RS). Este comando percorre as notas que
+casam com um filtro, baixa e refaz o parse de cada uma (estado detectado
+pela URL) e preenche os campos que estão vazios na nota gravada.
+
+- Downloads concorrentes, respeitando o limite por host da SEFAZ
+  (resilience.HostGuard); o parse roda no pool de processos.
+- Gravação em lotes: uma transação por lote de notas.
+- Checkpoint em JSON após cada lote: interrompido (Ctrl+C), o comando
+  retoma do último lote gravado ao ser executado de novo com o mesmo filtro.
+
+Campos já preenchidos (ex.: estabelecimento renomeado pelo usuário) só
+são substituídos pelo novo parse com --sobrescrever. Itens só são
+regravados com --itens: os itens da nota são trocados pelos do novo
+parse, e cada item herda a categoria do item gravado de mesmo nome (as
+categorias escolhidas pelo usuário ficam; item sem correspondente fica
+sem categoria). Correções de classificação passam para o novo item.
+
+Execute com (dentro da pasta Backend/nfce_reader):
+    python backfill.py --sem-endereco --sem-data
+    python backfill.py --estado SP --concorrencia 16
+    python backfill.py --refazer-falhas
+    python backfill.py --estado SP --sobrescrever --simular
+    python backfill.py --ids 12 40 --itens
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import or_
+
+try:
+    from . import scraper
+    from .database import CorrecaoClassificacaoDB, ItemDB, NotaFiscalDB
+    from .workers import shutdown_pools
+except ImportError:  # Execução direta dentro da pasta
+    import scraper
+    from database import CorrecaoClassificacaoDB, ItemDB, NotaFiscalDB
+    from workers import shutdown_pools
+
+
+CHECKPOINT_FILE = os.getenv("NFCE_BACKFILL_CHECKPOINT", "./backfill_checkpoint.json")
+CONCORRENCIA_PADRAO = 8
+LOTE_PADRAO = 50
+
+ESTABELECIMENTO_VAZIO = "Não identificado"
+
+
+# ============================================================================
+# FILTRO E CHECKPOINT
+# ============================================================================
+
+@dataclass
+class BackfillFiltro:
+    """Quais notas reprocessar (critérios combinados com OU; estado com E)."""
+    sem_endereco: bool = False
+    sem_data: bool = False
+    sem_estabelecimento: bool = False
+    estado: Optional[str] = None
+    ids: list[int] = field(default_factory=list)
+
+    def assinatura(self) -> str:
+        """Identifica o filtro no checkpoint: outro filtro recomeça do zero."""
+        return json.dumps(asdict(self), sort_keys=True)
+
+    def aplicar(self, query):
+        query = query.filter(NotaFiscalDB.tipo == "SCAN", ~NotaFiscalDB.url_origem.like("xml://%"))
+        if self.ids:
+            query = query.filter(NotaFiscalDB.id.in_(self.ids))
+        condicoes = []
+        if self.sem_endereco:
+            condicoes.append(NotaFiscalDB.endereco.is_(None))
+        if self.sem_data:
+            condicoes.append(NotaFiscalDB.data_emissao.is_(None))
+        if self.sem_estabelecimento:
+            condicoes.append(NotaFiscalDB.estabelecimento == ESTABELECIMENTO_VAZIO)
+        if condicoes:
+            query = query.filter(or_(*condicoes))
+        return query
+
+    def aceita(self, nota: NotaFiscalDB) -> bool:
+        """Filtro por estado (detectado pela URL, não fica no banco)."""
+        return self.estado is None or scraper.detect_estado(nota.url_origem) == self.estado
+
+
+@dataclass
+class Checkpoint:
+    """Progresso gravado após cada lote."""
+    filtro: str
+    ultimo_id: int = 0
+    falhas: list[int] = field(default_factory=list)
+    contadores: dict = field(default_factory=lambda: {
+        "processadas": 0, "atualizadas": 0, "sem_mudanca": 0, "falhas": 0
+    })
+
+    @classmethod
+    def carregar(cls, caminho: Path, filtro: str, qualquer_filtro: bool = False) -> "Checkpoint":
+        if caminho.exists():
+            try:
+                dados = json.loads(caminho.read_text(encoding="utf-8"))
+                if qualquer_filtro or dados.get("filtro") == filtro:
+                    return cls(**dados)
+                print(f"[AVISO] Checkpoint {caminho} é de outro filtro, recomeçando do início")
+            except (OSError, ValueError, TypeError) as e:
+                print(f"[AVISO] Checkpoint ilegível ({caminho}), recomeçando do início: {e}")
+        return cls(filtro=filtro)
+
+    def salvar(self, caminho: Path) -> None:
+        tmp = caminho.with_name(caminho.name + ".tmp")
+        tmp.write_text(json.dumps(asdict(self), ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, caminho)
+
+
+# ============================================================================
+# REPROCESSAMENTO
+# ============================================================================
+
+def _campo_vazio(campo: str, valor) -> bool:
+    """Campo sem valor útil na nota gravada (pode ser preenchido)."""
+    if campo == "estabelecimento":
+        return not valor or valor == ESTABELECIMENTO_VAZIO
+    return not valor
+
+
+def _campos_alterados(nota: NotaFiscalDB, dados: dict, sobrescrever: bool = False) -> dict:
+    """
+    Campos do novo parse que diferem da nota gravada.
+
+    Valores vazios do novo parse (sem endereço, total zero, nome não
+    identificado) nunca apagam o que já está no banco. Sem `sobrescrever`,
+    só campos vazios na nota são preenchidos: o usuário pode ter editado
+    os demais (ex.: renomeado o estabelecimento).
+    """
+    novos = {}
+    estabelecimento = dados.get("estabelecimento")
+    if estabelecimento and estabelecimento != ESTABELECIMENTO_VAZIO:
+        novos["estabelecimento"] = estabelecimento[:255]
+    if dados.get("endereco"):
+        novos["endereco"] = dados["endereco"][:500]
+    if dados.get("total"):
+        novos["total"] = float(dados["total"])
+    if dados.get("data_emissao"):
+        try:
+            novos["data_emissao"] = datetime.strptime(dados["data_emissao"], "%Y-%m-%d")
+        except ValueError:
+            pass
+    return {
+        campo: valor for campo, valor in novos.items()
+        if getattr(nota, campo) != valor and (sobrescrever or _campo_vazio(campo, getattr(nota, campo)))
+    }
+
+
+def _nome_item(nome: str) -> str:
+    """Nome comparável entre o parse e o banco (espaços e caixa)."""
+    return " ".join(nome.split()).upper()
+
+
+def _itens_alterados(itens_gravados: list, itens: list[dict]) -> Optional[list[dict]]:
+    """
+    Itens do novo parse para regravar na nota, ou None se não mudaram.
+
+    Cada item herda a categoria (e o id, para as correções de
+    classificação) do item gravado de mesmo nome; nomes repetidos casam na
+    ordem da nota. Um parse sem itens nunca apaga os gravados.
+
+    Returns:
+        [{"nome", "qtd", "valor", "categoria_id", "anterior"}] — anterior
+        é o id do item gravado correspondente (ou None).
+    """
+    if not itens:
+        return None
+    novos = [
+        {"nome": item["nome"][:500], "qtd": float(item.get("qtd", 1)), "valor": float(item.get("valor", 0))}
+        for item in itens
+    ]
+    atuais = [(item.nome, item.qtd, item.valor) for item in itens_gravados]
+    if atuais == [(item["nome"], item["qtd"], item["valor"]) for item in novos]:
+        return None
+
+    por_nome: dict[str, list] = {}
+    for gravado in itens_gravados:
+        por_nome.setdefault(_nome_item(gravado.nome), []).append(gravado)
+    for item in novos:
+        candidatos = por_nome.get(_nome_item(item["nome"]))
+        gravado = candidatos.pop(0) if candidatos else None
+        item["categoria_id"] = gravado.categoria_id if gravado is not None else None
+        item["anterior"] = gravado.id if gravado is not None else None
+    return novos
+
+
+def _substituir_itens(db, nota: NotaFiscalDB, novos: list[dict]) -> None:
+    """
+    Troca os itens da nota pelos de _itens_alterados.
+
+    Os novos itens são gravados antes de apagar os antigos: as correções
+    de classificação passam para o item correspondente (ou ficam sem item)
+    sem nunca apontar para um item apagado.
+    """
+    antigos = list(nota.itens)
+    criados = []
+    for item in novos:
+        criado = ItemDB(nome=item["nome"], qtd=item["qtd"], valor=item["valor"], categoria_id=item["categoria_id"])
+        nota.itens.append(criado)
+        criados.append((item["anterior"], criado))
+    db.flush()
+
+    substituto = {anterior: criado.id for anterior, criado in criados if anterior is not None}
+    ids_antigos = [item.id for item in antigos]
+    if ids_antigos:
+        for correcao in db.query(CorrecaoClassificacaoDB).filter(CorrecaoClassificacaoDB.item_id.in_(ids_antigos)):
+            correcao.item_id = substituto.get(correcao.item_id)
+        db.flush()
+    for item in antigos:
+        nota.itens.remove(item)
+
+
+async def _reprocessar(url: str, usar_arquivo: bool, sem: asyncio.Semaphore) -> Optional[dict]:
+    async with sem:
+        try:
+            return await scraper.scrape_nfce_async(url, "AUTO", usar_arquivo=usar_arquivo)
+        except scraper.HostIndisponivelError as e:
+            print(f"[AVISO] {e}")
+            return None
+
+
+async def run_backfill(
+    db,
+    filtro: BackfillFiltro,
+    checkpoint_path: str = CHECKPOINT_FILE,
+    concorrencia: int = CONCORRENCIA_PADRAO,
+    lote: int = LOTE_PADRAO,
+    limite: Optional[int] = None,
+    usar_arquivo: bool = False,
+    simular: bool = False,
+    refazer_falhas: bool = False,
+    reiniciar: bool = False,
+    sobrescrever: bool = False,
+    itens: bool = False
+) -> dict:
+    """
+    Reprocessa as notas do filtro, em ordem de id, lote a lote.
+
+    Args:
+        db: Sessão do banco.
+        filtro: Notas a reprocessar.
+        checkpoint_path: Arquivo de progresso (removido ao concluir).
+        concorrencia: Notas em processamento simultâneo (o limite por
+            host de NFCE_HOST_MAX_CONCURRENCY continua valendo).
+        lote: Notas por transação/checkpoint.
+        limite: Máximo de notas processadas nesta execução.
+        usar_arquivo: Usa a página arquivada quando existir, sem baixar.
+        simular: Só relata as mudanças, sem gravar nem salvar checkpoint.
+        refazer_falhas: Reprocessa apenas as notas que falharam antes.
+        reiniciar: Ignora o checkpoint existente.
+        sobrescrever: Substitui também campos já preenchidos (por padrão
+            só os vazios são preenchidos).
+        itens: Regrava os itens da nota com os do novo parse, mantendo a
+            categoria dos itens de mesmo nome.
+
+    Returns:
+        Contadores {"processadas", "atualizadas", "sem_mudanca", "falhas"}.
+    """
+    caminho = Path(checkpoint_path)
+    assinatura = filtro.assinatura()
+    if reiniciar:
+        cp = Checkpoint(filtro=assinatura)
+    else:
+        # As falhas pendentes valem para o filtro com que foram registradas
+        cp = Checkpoint.carregar(caminho, assinatura, qualquer_filtro=refazer_falhas)
+
+    if refazer_falhas:
+        if not cp.falhas:
+            print("Nenhuma falha registrada no checkpoint.")
+            return cp.contadores
+        filtro = BackfillFiltro(ids=list(cp.falhas))
+        pendentes_falha, cp.falhas = cp.falhas, []
+        # As notas voltam a ser contadas conforme o novo resultado
+        cp.contadores["falhas"] -= len(pendentes_falha)
+        cp.contadores["processadas"] -= len(pendentes_falha)
+        inicio_id = 0
+    else:
+        pendentes_falha = []
+        inicio_id = cp.ultimo_id
+        if inicio_id:
+            print(f"↻ Retomando após a nota {inicio_id} ({cp.contadores['processadas']} já processadas)")
+
+    sem = asyncio.Semaphore(max(1, concorrencia))
+    processadas_agora = 0
+    inicio = time.perf_counter()
+    ultimo_id = inicio_id
+
+    while limite is None or processadas_agora < limite:
+        tamanho = lote if limite is None else min(lote, limite - processadas_agora)
+        notas = (
+            filtro.aplicar(db.query(NotaFiscalDB))
+            .filter(NotaFiscalDB.id > ultimo_id)
+            .order_by(NotaFiscalDB.id)
+            .limit(tamanho)
+            .all()
+        )
+        if not notas:
+            break
+        ultimo_id = notas[-1].id
+        notas = [nota for nota in notas if filtro.aceita(nota)]
+
+        resultados = await asyncio.gather(*(_reprocessar(n.url_origem, usar_arquivo, sem) for n in notas))
+
+        atualizadas = 0
+        for nota, dados in zip(notas, resultados):
+            if not dados:
+                cp.falhas.append(nota.id)
+                cp.contadores["falhas"] += 1
+                continue
+            alterados = _campos_alterados(nota, dados, sobrescrever)
+            novos_itens = _itens_alterados(nota.itens, dados["itens"]) if itens else None
+            if not alterados and novos_itens is None:
+                cp.contadores["sem_mudanca"] += 1
+                continue
+            if simular:
+                mudancas = sorted(alterados) + ([f"itens ({len(novos_itens)})"] if novos_itens is not None else [])
+                print(f"  nota {nota.id}: {', '.join(mudancas)}")
+            else:
+                for campo, valor in alterados.items():
+                    setattr(nota, campo, valor)
+                if novos_itens is not None:
+                    _substituir_itens(db, nota, novos_itens)
+            atualizadas += 1
+
+        if simular:
+            db.rollback()
+        else:
+            try:
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"[ERRO] Falha ao gravar lote até a nota {ultimo_id}: {e}")
+                break
+        cp.contadores["atualizadas"] += atualizadas
+        cp.contadores["processadas"] += len(notas)
+        processadas_agora += len(notas)
+        if not refazer_falhas:
+            cp.ultimo_id = ultimo_id
+        if not simular:
+            cp.salvar(caminho)
+
+        decorrido = time.perf_counter() - inicio
+        print(
+            f"  lote até a nota {ultimo_id}: {atualizadas}/{len(notas)} atualizadas | "
+            f"{processadas_agora / decorrido:.1f} notas/s"
+        )
+
+    decorrido = time.perf_counter() - inicio
+    print(
+        f"⏱️  {processadas_agora} notas em {decorrido:.1f}s "
+        f"({processadas_agora / decorrido if decorrido else 0:.1f} notas/s)"
+    )
+
+    concluido = limite is None or processadas_agora < limite
+    if not simular and concluido and not cp.falhas and not pendentes_falha:
+        caminho.unlink(missing_ok=True)
+    elif not simular and cp.falhas:
+        print(f"[AVISO] {len(cp.falhas)} notas falharam; use --refazer-falhas para tentar de novo")
+    return cp.contadores
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="backfill",
+        description="Baixa e refaz o parse das notas gravadas, atualizando os campos que mudaram."
+    )
+    parser.add_argument("--sem-endereco", action="store_true", help="Notas sem endereço")
+    parser.add_argument("--sem-data", action="store_true", help="Notas sem data de emissão")
+    parser.add_argument("--sem-estabelecimento", action="store_true",
+                        help=f"Notas com estabelecimento '{ESTABELECIMENTO_VAZIO}'")
+    parser.add_argument("--estado", type=str.upper, default=None,
+                        help="Só notas deste estado (detectado pela URL)")
+    parser.add_argument("--ids", type=int, nargs="+", default=[], help="Ids específicos")
+    parser.add_argument("--concorrencia", type=int, default=CONCORRENCIA_PADRAO,
+                        help=f"Notas simultâneas (padrão: {CONCORRENCIA_PADRAO})")
+    parser.add_argument("--lote", type=int, default=LOTE_PADRAO,
+                        help=f"Notas por transação (padrão: {LOTE_PADRAO})")
+    parser.add_argument("--limite", type=int, default=None, help="Máximo de notas nesta execução")
+    parser.add_argument("--checkpoint", type=str, default=CHECKPOINT_FILE, help="Arquivo de progresso")
+    parser.add_argument("--usar-arquivo", action="store_true",
+                        help="Usa a página arquivada quando existir, sem baixar de novo")
+    parser.add_argument("--simular", action="store_true", help="Mostra as mudanças sem gravar")
+    parser.add_argument("--refazer-falhas", action="store_true",
+                        help="Reprocessa só as notas que falharam (do checkpoint)")
+    parser.add_argument("--reiniciar", action="store_true", help="Ignora o checkpoint existente")
+    parser.add_argument("--sobrescrever", action="store_true",
+                        help="Substitui também campos já preenchidos (inclusive editados pelo usuário)")
+    parser.add_argument("--itens", action="store_true",
+                        help="Regrava os itens com os do novo parse (categorias mantidas pelo nome do item)")
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = create_parser().parse_args(argv)
+    filtro = BackfillFiltro(
+        sem_endereco=args.sem_endereco,
+        sem_data=args.sem_data,
+        sem_estabelecimento=args.sem_estabelecimento,
+        estado=args.estado,
+        ids=args.ids
+    )
+
+    try:
+        from .database import SessionLocal
+    except ImportError:
+        from database import SessionLocal
+
+    async def executar() -> dict:
+        try:
+            return await run_backfill(
+                db, filtro,
+                checkpoint_path=args.checkpoint,
+                concorrencia=args.concorrencia,
+                lote=max(1, args.lote),
+                limite=args.limite,
+                usar_arquivo=args.usar_arquivo,
+                simular=args.simular,
+                refazer_falhas=args.refazer_falhas,
+                reiniciar=args.reiniciar,
+                sobrescrever=args.sobrescrever,
+                itens=args.itens
+            )
+        finally:
+            await scraper.close_async_client()
+
+    db = SessionLocal()
+    try:
+        contadores = asyncio.run(executar())
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrompido: execute de novo para retomar do último lote gravado")
+        return 130
+    finally:
+        db.close()
+        shutdown_pools()
+
+    print(
+        f"✅ {contadores['processadas']} processadas, {contadores['atualizadas']} atualizadas, "
+        f"{contadores['sem_mudanca']} sem mudança, {contadores['falhas']} com falha"
+    )
+    return 0 if contadores["falhas"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,730 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo Benchmark - Medições de desempenho do scraper e do decoder (offline).
+
+Execute com:
+    python -m nfce_reader.benchmark parsers
+    python -m nfce_reader.benchmark parsers corpus/
+    python -m nfce_reader.benchmark parsers RS:pagina_rs.html SP:pagina_sp.html
+    python -m nfce_reader.benchmark texto
+    python -m nfce_reader.benchmark corpus corpus/ --salvar-baseline baseline.json
+    python -m nfce_reader.benchmark corpus corpus/ --baseline baseline.json
+    python -m nfce_reader.benchmark qr
+    python -m nfce_reader.benchmark qr fotos/ --escada
+    python -m nfce_reader.benchmark importacao --orcamento 50
+
+O corpus é uma pasta com uma subpasta por layout de estado
+(corpus/RS/*.html, corpus/SP/*.html, ...) ou uma lista de arquivos
+no formato ESTADO:caminho. Para gravar páginas reais (anonimizadas) no
+corpus, rode o scraper com NFCE_RECORD_DIR=corpus/. Sem corpus, o
+subcomando parsers usa as páginas de Backend/tests/fixtures.
+
+O subcomando qr compara os motores de QR Code (pyzbar, OpenCV e as
+políticas fallback/race) num conjunto sintético gerado na hora ou em
+fotos reais. O subcomando importacao mede o import a frio do pacote
+(num interpretador novo) e falha se passar do orçamento ou se carregar
+OpenCV onde não é usado.
+"""
+
+import argparse
+import gc
+import hashlib
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Optional
+
+# Sem aprendizado de seletores: medições reprodutíveis e sem gravar
+# ./seletores_nfce.json (lido na importação do selector_stats)
+os.environ["NFCE_SELECTOR_LEARNING"] = "0"
+
+try:
+    from . import scraper, text_utils
+except ImportError:  # Execução direta dentro da pasta
+    import scraper
+    import text_utils
+
+
+# ============================================================================
+# CORPUS
+# ============================================================================
+
+FIXTURES = Path(__file__).resolve().parent.parent / "tests" / "fixtures"
+
+def load_corpus(entradas: list[str]) -> dict[str, list[tuple[str, str]]]:
+    """
+    Carrega páginas HTML agrupadas por estado.
+
+    Returns:
+        {estado: [(nome_arquivo, html), ...]}
+    """
+    corpus: dict[str, list[tuple[str, str]]] = {}
+
+    for entrada in entradas:
+        if ":" in entrada and not Path(entrada).exists():
+            estado, caminho = entrada.split(":", 1)
+            arquivos = [(estado.upper(), Path(caminho))]
+        else:
+            raiz = Path(entrada)
+            arquivos = [
+                (pasta.name.upper(), arquivo)
+                for pasta in sorted(p for p in raiz.iterdir() if p.is_dir())
+                for arquivo in sorted(pasta.glob("*.html"))
+            ]
+
+        for estado, arquivo in arquivos:
+            html = arquivo.read_text(encoding="utf-8", errors="replace")
+            corpus.setdefault(estado, []).append((arquivo.name, html))
+
+    return corpus
+
+
+def time_call(func: Callable[[], object], repeticoes: int) -> float:
+    """Mediana do tempo (ms) de `repeticoes` execuções de `func`."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos)
+
+
+# ============================================================================
+# BENCHMARK: BACKENDS DE PARSE
+# ============================================================================
+
+def bench_parsers(corpus: dict[str, list[tuple[str, str]]], repeticoes: int = 5) -> int:
+    """
+    Compara os backends de parse por layout de estado.
+
+    A referência é o caminho antigo: html.parser com a árvore completa.
+    Cada backend precisa extrair exatamente o mesmo resultado que ela; o
+    backend padrão também é medido com o plano de parse parcial (coluna
+    "plano": ganho do plano sobre o mesmo backend sem ele — abaixo de 1.0x
+    o plano atrasa o layout).
+
+    Returns:
+        Código de saída (0 = resultados idênticos, 1 = divergências)
+    """
+    backends = list(scraper.PARSER_BACKENDS)
+    referencia = "html.parser"
+    padrao = scraper.PARSER_PADRAO
+    divergencias = 0
+
+    def parse(html: str, estado: str, backend: str, usar_plano: bool = False) -> dict:
+        return scraper.parse_nfce(html, estado, parser=backend, usar_cache=False, usar_plano=usar_plano)
+
+    cabecalho = f"{'ESTADO':<10} {'PÁGS':>5} {'antigo ms':>12}" + "".join(f" {b + ' ms':>16}" for b in backends)
+    cabecalho += f" {'SPEEDUP':>8} {'PLANO':>7} {'DIVERG.':>8}"
+    print(cabecalho)
+    print("-" * len(cabecalho))
+
+    for estado, paginas in sorted(corpus.items()):
+        tempos = {b: 0.0 for b in backends}
+        tempo_referencia = 0.0
+        tempo_plano = 0.0
+        diverg_estado = 0
+
+        for nome, html in paginas:
+            esperado = parse(html, estado, referencia)
+            tempo_referencia += time_call(lambda: parse(html, estado, referencia), repeticoes)
+            for backend in backends:
+                tempos[backend] += time_call(lambda: parse(html, estado, backend), repeticoes)
+                if parse(html, estado, backend) != esperado:
+                    diverg_estado += 1
+                    print(f"[DIVERGÊNCIA] {estado}/{nome}: {backend} difere do caminho antigo")
+            tempo_plano += time_call(lambda: parse(html, estado, padrao, usar_plano=True), repeticoes)
+            if parse(html, estado, padrao, usar_plano=True) != esperado:
+                diverg_estado += 1
+                print(f"[DIVERGÊNCIA] {estado}/{nome}: plano de parse ({padrao}) difere do caminho antigo")
+
+        n = len(paginas)
+        mais_rapido = min(tempos.values())
+        speedup = tempo_referencia / mais_rapido if mais_rapido > 0 else 0.0
+        ganho_plano = tempos[padrao] / tempo_plano if tempo_plano > 0 else 0.0
+        linha = f"{estado:<10} {n:>5} {tempo_referencia / n:>12.2f}" + "".join(f" {tempos[b] / n:>16.2f}" for b in backends)
+        linha += f" {speedup:>7.1f}x {ganho_plano:>6.1f}x {diverg_estado:>8}"
+        print(linha)
+        divergencias += diverg_estado
+
+    return 1 if divergencias else 0
+
+
+# ============================================================================
+# BENCHMARK: CORPUS x BASELINE
+# ============================================================================
+
+def _assinatura(resultado: dict) -> str:
+    """Hash curto do resultado extraído (detecta mudança de extração)."""
+    dados = json.dumps(resultado, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(dados.encode("utf-8")).hexdigest()[:12]
+
+
+def measure_corpus(corpus: dict[str, list[tuple[str, str]]], repeticoes: int = 5) -> dict:
+    """
+    Mede o parse de cada layout de estado com cada backend.
+
+    Returns:
+        {"ESTADO/backend": {"paginas", "itens", "ms_pagina", "us_item",
+                            "pico_kb", "assinaturas": {arquivo: hash}}}
+    """
+    medidas = {}
+    for estado, paginas in sorted(corpus.items()):
+        for backend in scraper.PARSER_BACKENDS:
+            tempo_total = 0.0
+            itens = 0
+            pico = 0
+            assinaturas = {}
+
+            for nome, html in paginas:
+                parse = lambda: scraper.parse_nfce(html, estado, parser=backend, usar_cache=False)
+                tempo_total += time_call(parse, repeticoes)
+
+                # Memória medida à parte: o tracemalloc distorce o tempo.
+                # As árvores do bs4 têm ciclos: coleta antes para o pico
+                # não incluir lixo das execuções anteriores.
+                gc.collect()
+                tracemalloc.start()
+                try:
+                    resultado = parse()
+                    pico = max(pico, tracemalloc.get_traced_memory()[1])
+                finally:
+                    tracemalloc.stop()
+
+                itens += len(resultado["itens"])
+                assinaturas[nome] = _assinatura(resultado)
+
+            n = len(paginas)
+            medidas[f"{estado}/{backend}"] = {
+                "paginas": n,
+                "itens": itens,
+                "ms_pagina": round(tempo_total / n, 3),
+                "us_item": round(tempo_total * 1000 / itens, 1) if itens else None,
+                "pico_kb": round(pico / 1024, 1),
+                "assinaturas": assinaturas,
+            }
+    return medidas
+
+
+def _delta(atual: Optional[float], base: Optional[float]) -> Optional[float]:
+    if atual is None or not base:
+        return None
+    return (atual - base) / base
+
+
+def compare_baseline(medidas: dict, baseline: Optional[dict], tolerancia: float = 0.25) -> int:
+    """
+    Imprime a tabela de medidas comparada ao baseline.
+
+    Regressão: tempo por página ou pico de memória acima de
+    (1 + tolerancia) x baseline, ou resultado extraído diferente.
+
+    Returns:
+        Número de regressões encontradas.
+    """
+    base_medidas = (baseline or {}).get("medidas", {})
+    if baseline and baseline.get("parser_version") != scraper.PARSER_VERSION:
+        print(
+            f"[AVISO] Baseline gerado com PARSER_VERSION {baseline.get('parser_version')}, "
+            f"atual {scraper.PARSER_VERSION}: mudanças de extração são esperadas."
+        )
+
+    cabecalho = (
+        f"{'LAYOUT':<18} {'PÁGS':>5} {'ITENS':>6} {'MS/PÁG':>9} {'Δ':>7} "
+        f"{'µs/ITEM':>8} {'PICO KB':>9} {'Δ':>7}  STATUS"
+    )
+    print(cabecalho)
+    print("-" * len(cabecalho))
+
+    regressoes = 0
+    fmt = lambda d: f"{d:+.0%}" if d is not None else "—"
+    for chave, m in medidas.items():
+        base = base_medidas.get(chave)
+        d_tempo = _delta(m["ms_pagina"], base and base["ms_pagina"])
+        d_mem = _delta(m["pico_kb"], base and base["pico_kb"])
+
+        problemas = []
+        if d_tempo is not None and d_tempo > tolerancia:
+            problemas.append("LENTO")
+        if d_mem is not None and d_mem > tolerancia:
+            problemas.append("MEMÓRIA")
+        if base:
+            mudaram = [
+                nome for nome, h in m["assinaturas"].items()
+                if nome in base["assinaturas"] and base["assinaturas"][nome] != h
+            ]
+            if mudaram:
+                problemas.append(f"EXTRAÇÃO ({len(mudaram)} págs)")
+        status = "NOVO" if base is None else (", ".join(problemas) or "ok")
+        regressoes += len(problemas)
+
+        us_item = f"{m['us_item']:.1f}" if m["us_item"] is not None else "—"
+        print(
+            f"{chave:<18} {m['paginas']:>5} {m['itens']:>6} {m['ms_pagina']:>9.2f} {fmt(d_tempo):>7} "
+            f"{us_item:>8} {m['pico_kb']:>9.1f} {fmt(d_mem):>7}  {status}"
+        )
+
+    return regressoes
+
+
+def bench_corpus(
+    corpus: dict[str, list[tuple[str, str]]],
+    repeticoes: int,
+    baseline_path: Optional[str],
+    salvar_path: Optional[str],
+    tolerancia: float
+) -> int:
+    """
+    Mede o corpus, compara com o baseline e (opcionalmente) grava um novo.
+
+    Returns:
+        Código de saída (0 = sem regressões, 1 = regressões)
+    """
+    baseline = None
+    if baseline_path:
+        try:
+            baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"[ERRO] Baseline inválido ({baseline_path}): {e}")
+            return 1
+
+    medidas = measure_corpus(corpus, repeticoes)
+    regressoes = compare_baseline(medidas, baseline, tolerancia)
+
+    if salvar_path:
+        Path(salvar_path).write_text(
+            json.dumps({"parser_version": scraper.PARSER_VERSION, "medidas": medidas}, indent=2),
+            encoding="utf-8"
+        )
+        print(f"\n💾 Baseline salvo em {salvar_path}")
+
+    if regressoes:
+        print(f"\n❌ {regressoes} regressão(ões) acima da tolerância de {tolerancia:.0%}")
+        return 1
+    return 0
+
+
+# ============================================================================
+# BENCHMARK: UTILITÁRIOS DE TEXTO
+# ============================================================================
+# Implementações anteriores (regex compilada a cada chamada), mantidas
+# aqui como referência de resultado e de tempo.
+
+def _legacy_clean_text(text: str) -> str:
+    if not text:
+        return ""
+    text = re.sub(r'\s+', ' ', text).strip()
+    text = re.split(r'\s*\(C[óo]d', text, flags=re.IGNORECASE)[0]
+    return text.strip()
+
+
+def _legacy_parse_money(text: str) -> float:
+    if not text:
+        return 0.0
+    text = re.sub(r'[R$\s]', '', text)
+    if ',' in text and '.' in text:
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        text = text.replace(',', '.')
+    try:
+        return float(text)
+    except ValueError:
+        return 0.0
+
+
+def _legacy_parse_number(text: str) -> float:
+    if not text:
+        return 0.0
+    match = re.search(r'[\d.,]+', text)
+    if match:
+        return _legacy_parse_money(match.group())
+    return 0.0
+
+
+def _legacy_find_money_in_text(text: str) -> float:
+    for pattern in [r'R\$\s*([\d.,]+)', r'([\d]+[.,][\d]{2})\s*$', r'([\d]+[.,][\d]{3}[.,][\d]{2})']:
+        match = re.search(pattern, text)
+        if match:
+            value = _legacy_parse_money(match.group(1) if match.groups() else match.group())
+            if value > 0:
+                return value
+    return 0.0
+
+
+def _legacy_is_valid_product(nome: str) -> bool:
+    if not nome or len(nome) < 3:
+        return False
+    nome_sem_espacos = nome.replace(' ', '')
+    if nome_sem_espacos.isdigit() and len(nome_sem_espacos) > 10:
+        return False
+    if re.search(r'\d{15,}', nome_sem_espacos):
+        return False
+    return True
+
+
+# Linha típica de item: nome com metadados, quantidade, valor unitário e total
+AMOSTRA_ITEM = {
+    "nome": "  ARROZ TIPO 1 5KG\n  (Código: 7891234 )",
+    "qtd": "Qtde.:2",
+    "valor": "1.234,56",
+    "linha": "ARROZ TIPO 1 5KG (Código: 7891234 ) Qtde.:2 UN: UN Vl. Unit.: 24,90 Vl. Total 49,80",
+}
+
+
+def coluna_valores(n: int, semente: int = 7) -> list[str]:
+    """
+    Coluna de valores como nas notas: quase todos distintos, nos formatos
+    que as SEFAZ usam, com alguns repetidos ("1,00", quantidades "1").
+    """
+    aleatorio = random.Random(semente)
+    coluna = []
+    for _ in range(n):
+        sorteio = aleatorio.random()
+        if sorteio < 0.1:
+            coluna.append(aleatorio.choice(["1,00", "1", "2,00", "0,99"]))
+            continue
+        centavos = int(aleatorio.lognormvariate(8, 1.5))
+        reais, resto = divmod(centavos, 100)
+        inteiro = f"{reais:,}".replace(",", ".")
+        if sorteio < 0.6:
+            coluna.append(f"{inteiro},{resto:02d}")
+        elif sorteio < 0.8:
+            coluna.append(f"R$ {inteiro},{resto:02d}")
+        elif sorteio < 0.9:
+            coluna.append(f"{reais},{resto:02d}")
+        else:
+            coluna.append(f" {inteiro},{resto:02d} ")
+    return coluna
+
+
+def bench_texto(n: int = 20000) -> int:
+    """
+    Compara custo por item das funções de texto antigas e novas, e o
+    parse de uma coluna de valores realista (chamada a chamada e em lote).
+
+    Também confere se ambas retornam exatamente os mesmos valores.
+
+    Returns:
+        Código de saída (0 = resultados idênticos, 1 = divergências)
+    """
+    a = AMOSTRA_ITEM
+    casos = [
+        ("clean_text", _legacy_clean_text, text_utils.clean_text, a["nome"]),
+        ("parse_money", _legacy_parse_money, text_utils.parse_money, a["valor"]),
+        ("parse_number", _legacy_parse_number, text_utils.parse_number, a["qtd"]),
+        ("find_money_in_text", _legacy_find_money_in_text, text_utils.find_money_in_text, a["linha"]),
+        ("is_valid_product", _legacy_is_valid_product, text_utils.is_valid_product, "ARROZ TIPO 1 5KG"),
+    ]
+
+    print(f"{'FUNÇÃO':<22} {'ANTES µs':>10} {'DEPOIS µs':>10} {'SPEEDUP':>8}")
+    print("-" * 53)
+
+    divergencias = 0
+    total_antes = total_depois = 0.0
+    for nome, antes, depois, entrada in casos:
+        if antes(entrada) != depois(entrada):
+            divergencias += 1
+            print(f"[DIVERGÊNCIA] {nome}({entrada!r})")
+        t_antes = time_call(lambda: [antes(entrada) for _ in range(n)], 3) * 1000 / n
+        t_depois = time_call(lambda: [depois(entrada) for _ in range(n)], 3) * 1000 / n
+        total_antes += t_antes
+        total_depois += t_depois
+        print(f"{nome:<22} {t_antes:>10.2f} {t_depois:>10.2f} {t_antes / t_depois:>7.1f}x")
+
+    print("-" * 53)
+    print(f"{'POR ITEM (soma)':<22} {total_antes:>10.2f} {total_depois:>10.2f} {total_antes / total_depois:>7.1f}x")
+
+    # Coluna de valores: chamada a chamada e em lote, separadamente
+    coluna = coluna_valores(n)
+    esperado = [_legacy_parse_money(v) for v in coluna]
+    if [text_utils.parse_money(v) for v in coluna] != esperado or text_utils.parse_money_batch(coluna) != esperado:
+        divergencias += 1
+        print("[DIVERGÊNCIA] parse_money (coluna)")
+    t_antes = time_call(lambda: [_legacy_parse_money(v) for v in coluna], 3) * 1000 / len(coluna)
+    t_unico = time_call(lambda: [text_utils.parse_money(v) for v in coluna], 3) * 1000 / len(coluna)
+    t_lote = time_call(lambda: text_utils.parse_money_batch(coluna), 3) * 1000 / len(coluna)
+    print("-" * 53)
+    print(f"COLUNA: {len(coluna)} valores, {len(set(coluna))} distintos")
+    print(f"{'parse_money':<22} {t_antes:>10.2f} {t_unico:>10.2f} {t_antes / t_unico:>7.1f}x")
+    print(f"{'parse_money_batch':<22} {t_antes:>10.2f} {t_lote:>10.2f} {t_antes / t_lote:>7.1f}x")
+
+    return 1 if divergencias else 0
+
+
+# ============================================================================
+# MOTORES DE QR CODE
+# ============================================================================
+
+def amostras_qr(n: int = 24, semente: int = 7) -> list[tuple[str, Optional[str], "np.ndarray"]]:
+    """
+    Conjunto sintético de fotos de cupom: QR Code de URL de NFC-e sobre
+    papel, alternando imagem limpa, desfocada, inclinada e com ruído.
+
+    Returns:
+        Lista de (nome, url esperada, imagem em tons de cinza).
+    """
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(semente)
+    encoder = cv2.QRCodeEncoder.create()
+    distorcoes = ("limpa", "desfoque", "inclinada", "ruido")
+    amostras = []
+    for i in range(n):
+        url = f"https://www.sefaz.rs.gov.br/NFCE/NFCE-COM.aspx?p=4324{i:040d}|2|1|1|{i:040X}"
+        modulo = int(rng.integers(3, 8))
+        qr = cv2.resize(encoder.encode(url), None, fx=modulo, fy=modulo, interpolation=cv2.INTER_NEAREST)
+        qr = cv2.copyMakeBorder(qr, 4 * modulo, 4 * modulo, 4 * modulo, 4 * modulo, cv2.BORDER_CONSTANT, value=255)
+
+        imagem = np.full((1200, 1600), int(rng.integers(170, 230)), dtype=np.uint8)
+        y = int(rng.integers(0, imagem.shape[0] - qr.shape[0]))
+        x = int(rng.integers(0, imagem.shape[1] - qr.shape[1]))
+        imagem[y:y + qr.shape[0], x:x + qr.shape[1]] = np.minimum(qr, imagem[0, 0])
+
+        distorcao = distorcoes[i % len(distorcoes)]
+        if distorcao == "desfoque":
+            imagem = cv2.GaussianBlur(imagem, (0, 0), float(rng.uniform(1.0, 0.5 * modulo)))
+        elif distorcao == "inclinada":
+            altura, largura = imagem.shape
+            deslocamento = rng.uniform(-0.12, 0.12, size=(4, 2)) * (largura, altura)
+            origem = np.float32([[0, 0], [largura, 0], [largura, altura], [0, altura]])
+            matriz = cv2.getPerspectiveTransform(origem, np.float32(origem + deslocamento))
+            imagem = cv2.warpPerspective(imagem, matriz, (largura, altura), borderMode=cv2.BORDER_REPLICATE)
+        elif distorcao == "ruido":
+            ruido = rng.normal(0, 35, imagem.shape)
+            imagem = np.clip(imagem * 0.6 + 60 + ruido, 0, 255).astype(np.uint8)
+        amostras.append((f"{i:02d}-{distorcao}", url, imagem))
+    return amostras
+
+
+def load_imagens_qr(entradas: list[str]) -> list[tuple[str, Optional[str], "np.ndarray"]]:
+    """Fotos reais (pastas ou arquivos); sem URL esperada."""
+    import cv2
+
+    try:
+        from . import decoder
+    except ImportError:  # Execução direta dentro da pasta
+        import decoder
+
+    amostras = []
+    for caminho in decoder.iter_image_paths(entradas):
+        imagem = cv2.imread(caminho, cv2.IMREAD_GRAYSCALE)
+        if imagem is None:
+            print(f"[AVISO] Imagem ilegível ignorada: {caminho}")
+            continue
+        amostras.append((Path(caminho).name, None, imagem))
+    return amostras
+
+
+def bench_qr(amostras: list[tuple[str, Optional[str], "np.ndarray"]], repeticoes: int = 3,
+             escada: bool = False) -> int:
+    """
+    Taxa de leitura e ms/imagem de cada motor e política de QR Code.
+
+    Sem escada, cada motor recebe a imagem como está (compara os motores);
+    com escada, mede o caminho completo de decode_qr_from_image.
+
+    Returns:
+        Código de saída (0 = ok, 1 = nenhum motor disponível)
+    """
+    try:
+        from . import decoder
+    except ImportError:  # Execução direta dentro da pasta
+        import decoder
+
+    motores = decoder.available_engines()
+    if not motores:
+        print("[ERRO] Nenhum motor de QR Code disponível.")
+        return 1
+    # auto por último: ordena os motores pelas taxas registradas nas rodadas anteriores
+    candidatos = motores + [p for p in ("fallback", "race", "auto") if len(motores) > 1]
+
+    def ler(imagem, motor: str) -> Optional[str]:
+        if escada:
+            return decoder.decode_ladder(imagem, motor=motor)[0]
+        hits = decoder.decode_hits(imagem, politica=motor)
+        return hits[0].data if hits else None
+
+    print(f"{len(amostras)} imagens, {'escada completa' if escada else 'imagem direta'}")
+    print(f"{'MOTOR':<10} {'LIDAS':>9} {'TAXA':>6} {'ERRADAS':>8} {'MS/IMAGEM':>10}")
+    print("-" * 47)
+    for motor in candidatos:
+        lidas = erradas = 0
+        tempos = []
+        for _, esperada, imagem in amostras:
+            url = ler(imagem, motor)
+            if url is not None:
+                lidas += 1
+                erradas += int(esperada is not None and url != esperada)
+            tempos.append(time_call(lambda: ler(imagem, motor), repeticoes))
+        print(
+            f"{motor:<10} {f'{lidas}/{len(amostras)}':>9} {lidas / len(amostras):>6.0%} "
+            f"{erradas:>8} {statistics.mean(tempos):>10.1f}"
+        )
+    return 0
+
+
+# ============================================================================
+# TEMPO DE IMPORTAÇÃO
+# ============================================================================
+
+# (nome, código importado, pasta de execução, módulos que não podem carregar)
+# "pacote"/"scraper" rodam com o pacote no sys.path; "api" roda como o
+# Procfile, de dentro da pasta (imports planos).
+CENARIOS_IMPORTACAO = [
+    ("pacote", "import nfce_reader", "pai", ("cv2", "numpy", "bs4", "httpx")),
+    ("scraper", "from nfce_reader import parse_nfce", "pai", ("cv2", "numpy")),
+    ("decoder", "from nfce_reader import decode_qr_from_image", "pai", ()),
+    ("api", "import server", "pasta", ("cv2", "numpy")),
+]
+
+_MEDIR_IMPORTACAO = """
+import json, os, sys, time
+def mb():
+    try:  # Memória residente (Linux); em outros sistemas não é medida
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+antes = set(sys.modules)
+mb0 = mb()
+inicio = time.perf_counter()
+exec({codigo!r})
+ms = (time.perf_counter() - inicio) * 1000
+novos = sorted({{m.split(".")[0] for m in sys.modules if m not in antes}})
+print(json.dumps({{"ms": ms, "mb": mb() - mb0, "modulos": novos}}))
+"""
+
+
+def _importar_em_processo(codigo: str, pasta: Path) -> dict:
+    """Importa num interpretador novo (sem cache de módulos) e mede."""
+    import subprocess
+
+    saida = subprocess.run(
+        [sys.executable, "-c", _MEDIR_IMPORTACAO.format(codigo=codigo)],
+        cwd=pasta, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def bench_importacao(repeticoes: int = 5, orcamento_ms: float = 50.0) -> int:
+    """
+    Tempo a frio de `import nfce_reader` e dos usos típicos do pacote.
+
+    Falha se o import do pacote passar do orçamento ou se algum cenário
+    carregar um módulo pesado que não usa (ex.: OpenCV no scraper).
+
+    Returns:
+        Código de saída (0 = dentro do orçamento, 1 = violação)
+    """
+    pasta = Path(__file__).resolve().parent
+    violacoes = 0
+
+    print(f"{'CENÁRIO':<10} {'MS':>8} {'MB':>7}  MÓDULOS PESADOS")
+    print("-" * 60)
+    for nome, codigo, onde, proibidos in CENARIOS_IMPORTACAO:
+        try:
+            medidas = [
+                _importar_em_processo(codigo, pasta.parent if onde == "pai" else pasta)
+                for _ in range(repeticoes)
+            ]
+        except Exception as e:
+            print(f"{nome:<10} [ERRO] {e}")
+            violacoes += 1
+            continue
+        ms = statistics.median(m["ms"] for m in medidas)
+        mb = statistics.median(m["mb"] for m in medidas)
+        carregados = set(medidas[0]["modulos"])
+        pesados = [m for m in ("cv2", "numpy", "bs4", "lxml", "httpx", "requests", "sqlalchemy") if m in carregados]
+        print(f"{nome:<10} {ms:>8.1f} {mb:>7.1f}  {', '.join(pesados) or '-'}")
+
+        indevidos = carregados.intersection(proibidos)
+        if indevidos:
+            violacoes += 1
+            print(f"[ERRO] '{codigo}' carregou {', '.join(sorted(indevidos))}")
+        if nome == "pacote" and ms > orcamento_ms:
+            violacoes += 1
+            print(f"[ERRO] '{codigo}' levou {ms:.1f} ms (orçamento: {orcamento_ms:.0f} ms)")
+
+    print("-" * 60)
+    print("OK: dentro do orçamento" if not violacoes else f"{violacoes} violação(ões)")
+    return 1 if violacoes else 0
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="nfce-benchmark",
+        description="Benchmarks offline do NFC-e Reader."
+    )
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_parsers = sub.add_parser("parsers", help="Compara backends de parse HTML por estado")
+    p_parsers.add_argument("corpus", nargs="*", help="Pasta do corpus ou ESTADO:arquivo.html (padrão: fixtures dos testes)")
+    p_parsers.add_argument("-n", "--repeticoes", type=int, default=5)
+
+    p_corpus = sub.add_parser("corpus", help="Tempo/memória por layout e backend, comparado a um baseline")
+    p_corpus.add_argument("corpus", nargs="+", help="Pasta do corpus ou ESTADO:arquivo.html")
+    p_corpus.add_argument("-n", "--repeticoes", type=int, default=5)
+    p_corpus.add_argument("--baseline", help="JSON de baseline para comparar")
+    p_corpus.add_argument("--salvar-baseline", help="Grava as medidas atuais como baseline")
+    p_corpus.add_argument("--tolerancia", type=float, default=0.25, help="Piora aceita (padrão: 0.25 = 25%%)")
+
+    p_texto = sub.add_parser("texto", help="Micro-benchmark dos utilitários de texto/valores")
+    p_texto.add_argument("-n", type=int, default=20000, help="Chamadas por função")
+
+    p_qr = sub.add_parser("qr", help="Taxa de leitura e ms/imagem por motor de QR Code")
+    p_qr.add_argument("imagens", nargs="*", help="Fotos ou pastas (padrão: amostras sintéticas)")
+    p_qr.add_argument("-n", "--repeticoes", type=int, default=3)
+    p_qr.add_argument("--amostras", type=int, default=24, help="Quantidade de amostras sintéticas")
+    p_qr.add_argument("--escada", action="store_true", help="Mede a escada completa de pré-processamento")
+
+    p_imp = sub.add_parser("importacao", help="Tempo de import a frio e módulos pesados carregados")
+    p_imp.add_argument("-n", "--repeticoes", type=int, default=5)
+    p_imp.add_argument("--orcamento", type=float, default=50.0, help="ms máximos para `import nfce_reader`")
+
+    return parser
+
+
+def main() -> int:
+    args = create_parser().parse_args()
+
+    if args.comando in ("parsers", "corpus"):
+        corpus = load_corpus(args.corpus or [str(FIXTURES)])
+        if not corpus:
+            print("[ERRO] Nenhuma página HTML encontrada no corpus.")
+            return 1
+        if args.comando == "parsers":
+            return bench_parsers(corpus, args.repeticoes)
+        return bench_corpus(corpus, args.repeticoes, args.baseline, args.salvar_baseline, args.tolerancia)
+
+    if args.comando == "texto":
+        return bench_texto(args.n)
+
+    if args.comando == "qr":
+        amostras = load_imagens_qr(args.imagens) if args.imagens else amostras_qr(args.amostras)
+        if not amostras:
+            print("[ERRO] Nenhuma imagem encontrada.")
+            return 1
+        return bench_qr(amostras, args.repeticoes, args.escada)
+
+    if args.comando == "importacao":
+        return bench_importacao(args.repeticoes, args.orcamento)
+
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,7 @@ orquestrar o pipeline de decodificação e extração.
 import argparse
 import json
 import sys
+import time
 from pathlib import Path
 from typing import Optional
 
@@ -29,8 +30,12 @@ Exemplos de uso:
   python -m nfce_reader.main nota.jpg
   python -m nfce_reader.main foto_qr.png --output minha_compra.json
   python -m nfce_reader.main imagem.jpg --estado RS
+  python -m nfce_reader.main fotos/ --lote --processos 8
+  python -m nfce_reader.main cupons.mp4 --video
+  python -m nfce_reader.main folha_a4.png --folha
 
 Estados suportados com seletores específicos: RS, SP, RJ
+Por padrão (AUTO) o estado é detectado pelo endereço da SEFAZ na URL.
 Use --estado GENERICO para tentativa de extração automática.
         """
     )
@@ -38,7 +43,8 @@ Use --estado GENERICO para tentativa de extração automática.
     parser.add_argument(
         "image_path",
         type=str,
-        help="Caminho para a imagem do QR Code (jpg, png)"
+        nargs="+",
+        help="Caminho para a imagem do QR Code (jpg, png); com --lote, imagens e/ou pastas"
     )
     
     parser.add_argument(
@@ -51,9 +57,9 @@ Use --estado GENERICO para tentativa de extração automática.
     parser.add_argument(
         "-e", "--estado",
         type=str,
-        default="GENERICO",
-        choices=["RS", "SP", "RJ", "GENERICO"],
-        help="Sigla do estado para usar seletores CSS específicos (padrão: GENERICO)"
+        default="AUTO",
+        choices=["AUTO", "RS", "SP", "RJ", "GENERICO"],
+        help="Sigla do estado para usar seletores CSS específicos (padrão: AUTO)"
     )
     
     parser.add_argument(
@@ -62,6 +68,31 @@ Use --estado GENERICO para tentativa de extração automática.
         help="Apenas extrair e exibir a URL do QR Code, sem fazer scraping"
     )
     
+    parser.add_argument(
+        "--lote",
+        action="store_true",
+        help="Decodifica várias imagens/pastas em paralelo e lista as URLs (sem scraping)"
+    )
+    
+    parser.add_argument(
+        "--video",
+        action="store_true",
+        help="Lê um vídeo (mp4, mov...) e lista cada URL de NFC-e encontrada uma única vez"
+    )
+    
+    parser.add_argument(
+        "--folha",
+        action="store_true",
+        help="Imagem com vários cupons (ex.: folha A4 escaneada): lista cada QR Code e sua posição"
+    )
+    
+    parser.add_argument(
+        "--processos",
+        type=int,
+        default=None,
+        help="Processos para --lote (padrão: um por núcleo, ou NFCE_DECODE_PROCESSES)"
+    )
+    
     parser.add_argument(
         "-v", "--verbose",
         action="store_true",
@@ -152,9 +183,15 @@ def run_pipeline(
         return 0
     
     # Passo 2: Fazer scraping
+    if estado == "AUTO":
+        estado = scraper.detect_estado(url)
     print(f"\n[2/3] Acessando página da NFC-e... (Estado: {estado})")
     
-    data = scraper.scrape_nfce(url, estado)
+    try:
+        data = scraper.scrape_nfce(url, estado)
+    except scraper.HostIndisponivelError as e:
+        print(f"[ERRO] {e}")
+        return 1
     
     if data is None:
         print("[ERRO] Falha ao acessar a página da nota fiscal.")
@@ -185,13 +222,119 @@ def run_pipeline(
     return 0
 
 
+def run_batch(image_paths: list[str], processes: Optional[int] = None) -> int:
+    """
+    Decodifica um lote de imagens em paralelo, listando a URL de cada uma.
+    
+    Returns:
+        Código de saída (0 = todas decodificadas, 1 = alguma falhou)
+    """
+    print_header()
+    
+    inicio = time.perf_counter()
+    total = falhas = 0
+    ultimos: dict[int, decoder.DecodeResult] = {}   # Último resultado de cada processo
+    for resultado in decoder.decode_batch(decoder.iter_image_paths(image_paths), processes):
+        total += 1
+        ultimos[resultado.pid] = resultado
+        if resultado.erro:
+            falhas += 1
+            print(f"[ERRO] {resultado.path}: {resultado.erro}")
+        elif resultado.url is None:
+            falhas += 1
+            print(f"[AVISO] {resultado.path}: nenhum QR Code encontrado")
+        else:
+            print(f"[OK]   {resultado.path}\t{resultado.url}")
+    
+    decorrido = time.perf_counter() - inicio
+    taxa = total / decorrido if decorrido > 0 else 0.0
+    print(f"\n{total - falhas}/{total} imagens decodificadas em {decorrido:.1f}s ({taxa:.1f} imagens/s)")
+    print_decode_stats(decoder.batch_stats(ultimos.values()).stats())
+    return 0 if total and falhas == 0 else 1
+
+
+def print_decode_stats(stats: dict) -> None:
+    """Tentativas, sucessos e ms médio por estágio da escada e por motor."""
+    for titulo, grupo in (("ESTÁGIO", stats["estagios"]), ("MOTOR", stats["motores"])):
+        if not grupo:
+            continue
+        print(f"\n  {titulo:<10} {'TENTATIVAS':>10} {'SUCESSOS':>9} {'TAXA':>6} {'MS MÉDIO':>9}")
+        for nome, d in grupo.items():
+            print(
+                f"  {nome:<10} {d['tentativas']:>10} {d['sucessos']:>9} "
+                f"{d['taxa_sucesso']:>6.0%} {d['ms_medio']:>9.1f}"
+            )
+
+
+def run_video(video_path: str) -> int:
+    """
+    Lê um vídeo e lista as URLs distintas encontradas.
+    
+    Returns:
+        Código de saída (0 = ao menos uma URL, 1 = nenhuma / erro)
+    """
+    print_header()
+    print(f"Lendo vídeo: {video_path}\n")
+    
+    estatisticas: dict = {}
+    encontradas = 0
+    try:
+        for hit in decoder.decode_video(video_path, estatisticas=estatisticas):
+            encontradas += 1
+            print(f"[OK]   {hit.tempo_s:>7.2f}s  {hit.url}")
+    except ValueError as e:
+        print(f"[ERRO] {e}")
+        return 1
+    
+    segundos = estatisticas["tempo_ms"] / 1000
+    print(
+        f"\n{encontradas} URLs em {estatisticas['quadros']} quadros "
+        f"({estatisticas['analisados']} analisados, {estatisticas['repetidos']} repetidos) "
+        f"em {segundos:.1f}s"
+    )
+    return 0 if encontradas else 1
+
+
+def run_sheet(image_path: str) -> int:
+    """
+    Decodifica todos os QR Codes de uma folha com vários cupons.
+    
+    Returns:
+        Código de saída (0 = ao menos um QR Code, 1 = nenhum / erro)
+    """
+    print_header()
+    
+    inicio = time.perf_counter()
+    try:
+        hits = decoder.decode_multiple_qr_tiled(image_path)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"[ERRO] {e}")
+        return 1
+    
+    for hit in hits:
+        x, y, largura, altura = hit.box
+        print(f"[OK]   ({x}, {y}, {largura}x{altura})  {hit.data}")
+    
+    print(f"\n{len(hits)} QR Codes em {time.perf_counter() - inicio:.1f}s")
+    return 0 if hits else 1
+
+
 def main() -> int:
     """Ponto de entrada principal do CLI."""
     parser = create_parser()
     args = parser.parse_args()
     
+    if args.lote:
+        return run_batch(args.image_path, args.processos)
+    if len(args.image_path) > 1:
+        parser.error("várias imagens só com --lote")
+    if args.video:
+        return run_video(args.image_path[0])
+    if args.folha:
+        return run_sheet(args.image_path[0])
+    
     return run_pipeline(
-        image_path=args.image_path,
+        image_path=args.image_path[0],
         output=args.output,
         estado=args.estado,
         url_only=args.url_only,
@@ -9,9 +9,14 @@ Lê DATABASE_URL de variável de ambiente, com fallback para SQLite.
 import os
 from datetime import datetime
 from typing import Optional, List
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Text, or_
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship, Session
 
+try:
+    from .access_key import extract_chave
+except ImportError:  # Execução direta dentro da pasta (ex.: uvicorn server:app)
+    from access_key import extract_chave
+
 # Carregar variáveis de ambiente
 from dotenv import load_dotenv
 load_dotenv()
@@ -70,6 +75,54 @@ def run_migrations():
                 print("✅ Migração: coluna 'tipo' já existe")
     except Exception as e:
         print(f"⚠️ Migração: erro ao verificar/adicionar coluna tipo - {e}")
+    
+    try:
+        with engine.connect() as conn:
+            # Verificar se coluna 'chave_acesso' existe na tabela notas_fiscais
+            result = conn.execute(text("""
+                SELECT column_name FROM information_schema.columns 
+                WHERE table_name = 'notas_fiscais' AND column_name = 'chave_acesso'
+            """))
+            
+            if result.fetchone() is None:
+                conn.execute(text("""
+                    ALTER TABLE notas_fiscais 
+                    ADD COLUMN chave_acesso VARCHAR(44)
+                """))
+                conn.execute(text("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS ix_notas_fiscais_chave_acesso
+                    ON notas_fiscais (chave_acesso)
+                """))
+                conn.commit()
+                print("✅ Migração: coluna 'chave_acesso' adicionada à tabela notas_fiscais")
+            else:
+                print("✅ Migração: coluna 'chave_acesso' já existe")
+            
+            # Preencher a chave das notas já escaneadas (a mais antiga fica com a chave)
+            rows = conn.execute(text("""
+                SELECT id, url_origem FROM notas_fiscais
+                WHERE chave_acesso IS NULL AND tipo = 'SCAN'
+                ORDER BY id
+            """)).fetchall()
+            usadas = {
+                row[0] for row in conn.execute(text(
+                    "SELECT chave_acesso FROM notas_fiscais WHERE chave_acesso IS NOT NULL"
+                ))
+            }
+            preenchidas = 0
+            for nota_id, url in rows:
+                chave = extract_chave(url)
+                if chave and chave not in usadas:
+                    conn.execute(
+                        text("UPDATE notas_fiscais SET chave_acesso = :chave WHERE id = :id"),
+                        {"chave": chave, "id": nota_id}
+                    )
+                    usadas.add(chave)
+                    preenchidas += 1
+            conn.commit()
+            print(f"✅ Migração: chave de acesso preenchida em {preenchidas} notas")
+    except Exception as e:
+        print(f"⚠️ Migração: erro ao verificar/adicionar coluna chave_acesso - {e}")
 
 # NÃO rodar automaticamente na inicialização para evitar conflitos de workers
 # A migração já foi executada com sucesso anteriormente
@@ -90,6 +143,7 @@ class NotaFiscalDB(Base):
     data_emissao = Column(DateTime, nullable=True)
     data_leitura = Column(DateTime, default=datetime.utcnow)
     url_origem = Column(Text, unique=True, nullable=False, index=True)
+    chave_acesso = Column(String(44), unique=True, nullable=True, index=True)  # NULL em notas manuais
     tipo = Column(String(10), nullable=False, default='SCAN')  # SCAN ou MANUAL
     
     # Relacionamento com itens
@@ -101,7 +155,8 @@ class NotaFiscalDB(Base):
             "id": self.id,
             "meta": {
                 "data_leitura": self.data_leitura.strftime("%Y-%m-%d %H:%M:%S") if self.data_leitura else None,
-                "url_origem": self.url_origem
+                "url_origem": self.url_origem,
+                "chave_acesso": self.chave_acesso
             },
             "estabelecimento": self.estabelecimento,
             "endereco": self.endereco,
@@ -252,6 +307,27 @@ def get_nota_by_url(db: Session, url: str) -> Optional[NotaFiscalDB]:
     return db.query(NotaFiscalDB).filter(NotaFiscalDB.url_origem == url).first()
 
 
+def get_nota_by_chave(db: Session, chave: str, url: Optional[str] = None) -> Optional[NotaFiscalDB]:
+    """
+    Busca uma nota fiscal pela chave de acesso.
+    
+    A mesma nota lida por URLs diferentes (versão do QR, http/https)
+    tem a mesma chave, então esta é a busca usada para deduplicar scans.
+    
+    Args:
+        db: Sessão do banco.
+        chave: Chave de acesso (44 dígitos).
+        url: URL original, para notas gravadas antes da coluna chave_acesso.
+    
+    Returns:
+        NotaFiscalDB se encontrada, None caso contrário.
+    """
+    filtro = NotaFiscalDB.chave_acesso == chave
+    if url:
+        filtro = or_(filtro, NotaFiscalDB.url_origem == url)
+    return db.query(NotaFiscalDB).filter(filtro).first()
+
+
 def create_nota(
     db: Session,
     url: str,
@@ -259,7 +335,8 @@ def create_nota(
     total: float,
     itens: List[dict],
     data_emissao: Optional[str] = None,
-    endereco: Optional[str] = None
+    endereco: Optional[str] = None,
+    chave_acesso: Optional[str] = None
 ) -> NotaFiscalDB:
     """
     Cria uma nova nota fiscal no banco.
@@ -272,6 +349,7 @@ def create_nota(
         itens: Lista de dicionários com nome, qtd, valor.
         data_emissao: Data de emissão no formato YYYY-MM-DD.
         endereco: Endereço do estabelecimento.
+        chave_acesso: Chave de acesso (44 dígitos). Padrão: extraída da URL.
     
     Returns:
         NotaFiscalDB criada.
@@ -287,6 +365,7 @@ def create_nota(
     # Criar nota
     nota = NotaFiscalDB(
         url_origem=url,
+        chave_acesso=chave_acesso or extract_chave(url),
         estabelecimento=estabelecimento,
         endereco=endereco,
         total=total,
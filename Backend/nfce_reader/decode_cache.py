@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo Decode Cache - URLs já decodificadas de fotos repetidas.
+
+A mesma foto costuma chegar várias vezes (reenvio pelo usuário, retentativa
+do app), às vezes recomprimida ou redimensionada pelo mensageiro. Cada
+envio pagaria o carregamento da imagem inteira e a escada de decode.
+
+Dois níveis de acerto:
+    - exato: hash (BLAKE2b) do conteúdo do arquivo. O mesmo arquivo
+      reenviado é respondido sem carregar a imagem.
+    - perceptual: dHash de 64 bits + miniatura 128x128 comparada bloco a
+      bloco (calculados com o JPEG decodificado já reduzido 8x). Acha a
+      foto parecida já lida, mas não responde por ela: fotos de cupons
+      diferentes são quase idênticas em escala reduzida (papel claro, QR
+      Code na mesma região). A candidata só fornece a região onde estava o
+      QR Code; o decoder decodifica essa região da foto nova (bem mais
+      barato que a escada inteira) e a URL devolvida é sempre a lida nos
+      pixels da foto atual.
+
+Só URLs encontradas são guardadas: uma foto sem QR Code volta a passar
+pela escada (um erro de leitura não fica preso no cache).
+
+Configuração por variáveis de ambiente:
+    NFCE_DECODE_CACHE_SIZE: fotos em memória, 0 desativa (padrão: 256)
+    NFCE_DECODE_CACHE_DISTANCE: distância máxima entre dHashes (padrão: 6)
+    NFCE_DECODE_CACHE_TOLERANCE: maior diferença média de um bloco (padrão: 12)
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+# ============================================================================
+# CONFIGURAÇÃO
+# ============================================================================
+
+CACHE_SIZE = int(os.getenv("NFCE_DECODE_CACHE_SIZE", "256"))
+CACHE_DISTANCE = int(os.getenv("NFCE_DECODE_CACHE_DISTANCE", "6"))
+CACHE_TOLERANCE = float(os.getenv("NFCE_DECODE_CACHE_TOLERANCE", "12"))
+
+LADO_MINIATURA = 128    # Miniatura guardada por foto (16 KB)
+LADO_BLOCO = 8          # Blocos comparados na confirmação (16x16 blocos)
+PROPORCAO_TOLERANCIA = 0.05
+
+
+# ============================================================================
+# IMPRESSÃO
+# ============================================================================
+
+# Região do QR Code na foto: (x0, y0, x1, y1) em fração da largura/altura
+Regiao = tuple[float, float, float, float]
+
+
+@dataclass
+class Impressao:
+    """Hash do conteúdo + dHash e miniatura de uma foto."""
+    conteudo: str
+    dhash: int
+    miniatura: np.ndarray
+    proporcao: float    # largura / altura da foto
+
+
+@dataclass
+class Acerto:
+    """
+    Resultado da consulta. exato=True: mesmo arquivo, a URL vale. Senão é
+    só uma dica: a região do QR Code a decodificar primeiro na foto nova.
+    """
+    url: str
+    regiao: Optional[Regiao]
+    exato: bool
+
+
+def content_hash(dados) -> str:
+    """Hash do conteúdo do arquivo (bytes, memoryview ou np.ndarray)."""
+    return hashlib.blake2b(dados, digest_size=16).hexdigest()
+
+
+def fingerprint(gray: np.ndarray, conteudo: str) -> Optional[Impressao]:
+    """
+    Impressão de uma imagem em tons de cinza (de preferência já reduzida).
+
+    Args:
+        conteudo: content_hash do arquivo de origem.
+
+    Returns:
+        A impressão, ou None se a imagem for pequena demais.
+    """
+    altura, largura = gray.shape[:2]
+    if altura < LADO_BLOCO or largura < LADO_BLOCO:
+        return None
+    # dHash: cada bit diz se o pixel é mais claro que o vizinho da esquerda
+    pequena = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = np.packbits(pequena[:, 1:] > pequena[:, :-1])
+    miniatura = cv2.resize(gray, (LADO_MINIATURA, LADO_MINIATURA), interpolation=cv2.INTER_AREA)
+    return Impressao(conteudo, int.from_bytes(bits.tobytes(), "big"), miniatura, largura / altura)
+
+
+def diferenca(a: np.ndarray, b: np.ndarray) -> float:
+    """Maior diferença média absoluta entre blocos correspondentes."""
+    blocos = LADO_MINIATURA // LADO_BLOCO
+    delta = cv2.absdiff(a, b).astype(np.float32)
+    return float(delta.reshape(blocos, LADO_BLOCO, blocos, LADO_BLOCO).mean(axis=(1, 3)).max())
+
+
+# ============================================================================
+# CACHE LRU
+# ============================================================================
+
+class DecodeCache:
+    """
+    LRU limitado de foto → (URL, região do QR Code), com busca exata pelo
+    hash do conteúdo e por vizinhança pela impressão perceptual.
+    """
+
+    def __init__(self, max_entradas: int = CACHE_SIZE, distancia: int = CACHE_DISTANCE,
+                 tolerancia: float = CACHE_TOLERANCE):
+        self.max_entradas = max(0, max_entradas)
+        self.distancia = distancia
+        self.tolerancia = tolerancia
+        self._lru: "OrderedDict[str, tuple[Impressao, str, Optional[Regiao]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits_exatos = 0
+        self.hits_verificados = 0   # Região da candidata decodificou a mesma URL
+        self.rejeitadas = 0         # Candidata perceptual desmentida pela foto nova
+        self.misses = 0
+
+    @property
+    def ativo(self) -> bool:
+        return self.max_entradas > 0
+
+    def get(self, impressao: Optional[Impressao]) -> Optional[Acerto]:
+        """
+        Consulta o cache.
+
+        Returns:
+            Acerto exato (mesmo arquivo), dica perceptual (foto parecida
+            com região conhecida, a verificar) ou None.
+        """
+        if impressao is None or not self.ativo:
+            return None
+        with self._lock:
+            entrada = self._lru.get(impressao.conteudo)
+            if entrada is not None:
+                self._lru.move_to_end(impressao.conteudo)
+                self.hits_exatos += 1
+                return Acerto(entrada[1], entrada[2], exato=True)
+
+            melhor = None
+            for chave, (guardada, url, regiao) in self._lru.items():
+                if regiao is None:
+                    continue   # Sem região não há como verificar
+                distancia = (guardada.dhash ^ impressao.dhash).bit_count()
+                if distancia > self.distancia:
+                    continue
+                if abs(guardada.proporcao - impressao.proporcao) > PROPORCAO_TOLERANCIA * impressao.proporcao:
+                    continue
+                delta = diferenca(guardada.miniatura, impressao.miniatura)
+                if delta <= self.tolerancia and (melhor is None or delta < melhor[0]):
+                    melhor = (delta, url, regiao)
+            if melhor is None:
+                self.misses += 1
+                return None
+            return Acerto(melhor[1], melhor[2], exato=False)
+
+    def registrar(
+        self,
+        impressao: Optional[Impressao],
+        dica: Optional[Acerto],
+        url: Optional[str],
+        regiao: Optional[Regiao]
+    ) -> None:
+        """
+        Registra o decode de uma foto que não teve acerto exato: confere a
+        dica perceptual (se houve) e guarda a URL lida.
+        """
+        if dica is not None and not dica.exato:
+            with self._lock:
+                if url == dica.url:
+                    self.hits_verificados += 1
+                else:
+                    self.rejeitadas += 1
+        if url is not None:
+            self.put(impressao, url, regiao)
+
+    def put(self, impressao: Optional[Impressao], url: str, regiao: Optional[Regiao] = None) -> None:
+        if impressao is None or not self.ativo:
+            return
+        with self._lock:
+            self._lru[impressao.conteudo] = (impressao, url, regiao)
+            self._lru.move_to_end(impressao.conteudo)
+            while len(self._lru) > self.max_entradas:
+                self._lru.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.hits_exatos + self.hits_verificados
+            consultas = hits + self.rejeitadas + self.misses
+            return {
+                "entradas": len(self._lru),
+                "max_entradas": self.max_entradas,
+                "hits": hits,
+                "hits_exatos": self.hits_exatos,
+                "hits_verificados": self.hits_verificados,
+                "misses": self.misses,
+                "rejeitadas": self.rejeitadas,
+                "taxa_acerto": round(hits / consultas, 3) if consultas else 0.0,
+            }
+
+
+# ============================================================================
+# SINGLETON
+# ============================================================================
+
+_cache: Optional[DecodeCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_decode_cache() -> DecodeCache:
+    """Retorna o cache global de decodificação (por processo)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DecodeCache()
+    return _cache
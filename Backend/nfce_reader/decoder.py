@@ -2,24 +2,485 @@
 """
 Módulo Decoder - Responsável por decodificar QR Codes de imagens.
 
-Este módulo utiliza OpenCV (cv2) para carregar imagens e pyzbar
-para decodificar QR Codes, extraindo URLs de Notas Fiscais Eletrônicas.
+Este módulo utiliza OpenCV (cv2) para carregar imagens e pyzbar ou o
+QRCodeDetector do OpenCV para decodificar QR Codes, extraindo URLs de
+Notas Fiscais Eletrônicas.
 """
 
+import abc
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterable, Iterator, Optional, Union
 
 import cv2
-from pyzbar import pyzbar
-from pyzbar.pyzbar import Decoded
+import numpy as np
 
+try:
+    from .decode_cache import Acerto, Impressao, Regiao, content_hash, fingerprint, get_decode_cache
+except ImportError:  # Execução direta dentro da pasta
+    from decode_cache import Acerto, Impressao, Regiao, content_hash, fingerprint, get_decode_cache
 
-def decode_qr_from_image(image_path: str) -> Optional[str]:
+
+# Processos para decodificação em lote (0 = um por núcleo)
+DECODE_PROCESSES = int(os.getenv("NFCE_DECODE_PROCESSES", "0")) or (os.cpu_count() or 1)
+
+# Maior lado da imagem no primeiro estágio (fotos de 12 MP têm ~4000 px)
+DECODE_MAX_SIDE = int(os.getenv("NFCE_DECODE_MAX_SIDE", "1600"))
+
+EXTENSOES_IMAGEM = frozenset({".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"})
+
+
+# ============================================================================
+# MOTORES DE LEITURA
+# ============================================================================
+# Cada motor recebe uma imagem (cinza ou BGR) e devolve os QR Codes achados.
+# pyzbar (libzbar) é o padrão; o QRCodeDetector do OpenCV não precisa de
+# biblioteca nativa extra e se sai melhor em algumas fotos tremidas ou
+# inclinadas. NFCE_QR_ENGINE escolhe como combiná-los:
+#   auto      fallback em ordem de taxa de acerto recente (padrão)
+#   fallback  cada motor na ordem de registro, até um achar QR Code
+#   race      todos em paralelo (threads), vale o primeiro com resultado
+#   pyzbar / opencv  só o motor indicado
+
+QR_ENGINE = os.getenv("NFCE_QR_ENGINE", "auto").lower()
+POLITICAS = ("auto", "fallback", "race")
+
+
+@dataclass
+class QRHit:
+    """Um QR Code e sua posição (x, y, largura, altura) em px."""
+    data: str
+    box: tuple[int, int, int, int]
+
+
+def _decode_data(data: bytes) -> str:
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        # Tentar latin-1 como fallback
+        return data.decode("latin-1", errors="replace")
+
+
+class QREngine(abc.ABC):
+    """Interface de um motor de leitura de QR Code."""
+
+    nome = ""
+
+    def disponivel(self) -> bool:
+        return True
+
+    @abc.abstractmethod
+    def decode(self, image: np.ndarray, multiplos: bool = False) -> list[QRHit]:
+        """QR Codes da imagem (com multiplos=False basta o primeiro)."""
+
+
+class PyzbarEngine(QREngine):
+    """pyzbar/libzbar, importado só no primeiro uso."""
+
+    nome = "pyzbar"
+
+    def __init__(self):
+        self._pyzbar = None
+        self._erro: Optional[Exception] = None
+
+    def _carregar(self):
+        if self._pyzbar is None and self._erro is None:
+            try:
+                from pyzbar import pyzbar
+                self._pyzbar = pyzbar
+            except ImportError as e:   # Também quando falta a libzbar
+                self._erro = e
+                print(f"[AVISO] pyzbar indisponível: {e}")
+        return self._pyzbar
+
+    def disponivel(self) -> bool:
+        return self._carregar() is not None
+
+    def decode(self, image: np.ndarray, multiplos: bool = False) -> list[QRHit]:
+        pyzbar = self._carregar()
+        if pyzbar is None:
+            return []
+        return [
+            QRHit(_decode_data(obj.data), tuple(obj.rect))
+            for obj in pyzbar.decode(image) if obj.type == "QRCODE"
+        ]
+
+
+class OpenCVEngine(QREngine):
+    """cv2.QRCodeDetector: detectAndDecode ou detectAndDecodeMulti."""
+
+    nome = "opencv"
+
+    def __init__(self):
+        self._local = threading.local()   # O detector não é thread-safe
+
+    def _detector(self) -> "cv2.QRCodeDetector":
+        detector = getattr(self._local, "detector", None)
+        if detector is None:
+            detector = self._local.detector = cv2.QRCodeDetector()
+        return detector
+
+    def decode(self, image: np.ndarray, multiplos: bool = False) -> list[QRHit]:
+        detector = self._detector()
+        try:
+            if multiplos:
+                ok, textos, pontos, _ = detector.detectAndDecodeMulti(image)
+                if not ok or pontos is None:
+                    return []
+            else:
+                texto, pontos, _ = detector.detectAndDecode(image)
+                if not texto or pontos is None:
+                    return []
+                textos, pontos = [texto], pontos.reshape(1, -1, 2)
+        except cv2.error:
+            return []
+        return [
+            QRHit(texto, tuple(int(v) for v in cv2.boundingRect(quad.reshape(-1, 2).astype(np.float32))))
+            for texto, quad in zip(textos, pontos) if texto
+        ]
+
+
+_engines: dict[str, QREngine] = {}
+
+# Últimos resultados (achou/não achou) de cada motor, para a política auto
+AUTO_JANELA = 500           # Tentativas lembradas por motor
+AUTO_MIN_TENTATIVAS = 20    # Tentativas antes de um motor ser reordenado
+_resultados: dict[str, deque] = {}
+_resultados_lock = threading.Lock()
+
+
+def register_engine(engine: QREngine) -> None:
+    """Registra um motor (a ordem de registro é a ordem do fallback)."""
+    _engines[engine.nome] = engine
+
+
+register_engine(PyzbarEngine())
+register_engine(OpenCVEngine())
+
+
+def available_engines() -> list[str]:
+    """Nomes dos motores que podem ser usados neste ambiente."""
+    return [nome for nome, engine in _engines.items() if engine.disponivel()]
+
+
+def _tentar(engine: QREngine, image: np.ndarray, multiplos: bool) -> list[QRHit]:
+    """Roda um motor e registra se ele achou algum QR Code."""
+    inicio = time.perf_counter()
+    hits = engine.decode(image, multiplos)
+    _decode_stats.registrar_motor(engine.nome, bool(hits), (time.perf_counter() - inicio) * 1000)
+    with _resultados_lock:
+        janela = _resultados.get(engine.nome)
+        if janela is None:
+            janela = _resultados[engine.nome] = deque(maxlen=AUTO_JANELA)
+        janela.append(bool(hits))
+    return hits
+
+
+def engine_stats() -> dict:
+    """
+    Tentativas e taxa de acerto recentes (últimas AUTO_JANELA) de cada
+    motor: as taxas que a política auto usa para ordenar os motores.
+    """
+    with _resultados_lock:
+        return {
+            nome: {"tentativas": len(janela), "taxa_acerto": round(sum(janela) / len(janela), 3)}
+            for nome, janela in _resultados.items() if janela
+        }
+
+
+def _ordem_auto(engines: list[QREngine]) -> list[QREngine]:
+    """
+    Motores pela taxa de acerto recente, maior primeiro. Motores com
+    poucas tentativas registradas vêm antes (na ordem de registro), até
+    terem amostras suficientes.
+    """
+    with _resultados_lock:
+        taxas = {
+            nome: sum(janela) / len(janela)
+            for nome, janela in _resultados.items() if len(janela) >= AUTO_MIN_TENTATIVAS
+        }
+    return sorted(engines, key=lambda engine: -taxas.get(engine.nome, 2.0))
+
+
+def _race(engines: list[QREngine], image: np.ndarray, multiplos: bool) -> list[QRHit]:
+    """Roda os motores em paralelo; devolve o primeiro resultado não vazio."""
+    # Um executor por chamada: um motor lento que perdeu a corrida termina
+    # na própria thread, sem ocupar um pool compartilhado com as próximas
+    executor = ThreadPoolExecutor(max_workers=len(engines), thread_name_prefix="qr-race")
+    try:
+        futuros = [executor.submit(_tentar, engine, image, multiplos) for engine in engines]
+        for futuro in as_completed(futuros):
+            try:
+                hits = futuro.result()
+            except Exception as e:
+                print(f"[AVISO] Motor de QR falhou: {e}")
+                continue
+            if hits:
+                return hits
+        return []
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def decode_hits(image: np.ndarray, multiplos: bool = False, politica: Optional[str] = None) -> list[QRHit]:
+    """
+    Decodifica a imagem com os motores escolhidos pela política.
+    
+    Args:
+        image: Imagem em tons de cinza ou BGR.
+        multiplos: Procurar todos os QR Codes (senão basta o primeiro).
+        politica: Nome de um motor ou de uma política (ver POLITICAS).
+            Padrão: NFCE_QR_ENGINE.
+    """
+    politica = (politica or QR_ENGINE).lower()
+    if politica in _engines:
+        return _tentar(_engines[politica], image, multiplos)
+    if politica not in POLITICAS:
+        raise ValueError(f"Motor de QR desconhecido: {politica}")
+    
+    engines = [engine for engine in _engines.values() if engine.disponivel()]
+    if politica == "race" and len(engines) > 1:
+        return _race(engines, image, multiplos)
+    if politica == "auto":
+        engines = _ordem_auto(engines)
+    for engine in engines:
+        hits = _tentar(engine, image, multiplos)
+        if hits:
+            return hits
+    return []
+
+
+# ============================================================================
+# ESCADA DE PRÉ-PROCESSAMENTO
+# ============================================================================
+# A imagem passa por estágios cada vez mais caros; o próximo só roda se
+# o anterior não achou QR Code. A maioria das fotos decodifica no
+# primeiro (cinza + reduzida), que custa uma fração do decode na
+# resolução original.
+
+ANGULOS_ROTACAO = (15, -15, 45)
+MARGEM_RECORTE = 0.15       # Fração do lado do QR somada ao redor do recorte
+
+
+class DecodeStats:
+    """
+    Tentativas, sucessos e tempo acumulado por estágio da escada e por
+    motor de QR Code (thread-safe).
+
+    Os contadores são do processo: processos filhos (decode_batch, pool de
+    /decode/imagem) têm os seus; contadores() e somar() juntam os de vários.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._estagios: dict[str, dict] = {}
+        self._motores: dict[str, dict] = {}
+        self.imagens = 0
+        self.sem_qr = 0
+
+    def registrar(self, estagio: str, sucesso: bool, ms: float) -> None:
+        with self._lock:
+            dados = self._estagios.setdefault(estagio, {"tentativas": 0, "sucessos": 0, "ms": 0.0})
+            dados["tentativas"] += 1
+            dados["sucessos"] += int(sucesso)
+            dados["ms"] += ms
+
+    def registrar_motor(self, motor: str, sucesso: bool, ms: float) -> None:
+        with self._lock:
+            dados = self._motores.setdefault(motor, {"tentativas": 0, "sucessos": 0, "ms": 0.0})
+            dados["tentativas"] += 1
+            dados["sucessos"] += int(sucesso)
+            dados["ms"] += ms
+
+    def registrar_imagem(self, decodificada: bool) -> None:
+        with self._lock:
+            self.imagens += 1
+            self.sem_qr += int(not decodificada)
+
+    def contadores(self) -> dict:
+        """Cópia dos contadores brutos (para somar() em outro processo)."""
+        with self._lock:
+            return {
+                "imagens": self.imagens,
+                "sem_qr": self.sem_qr,
+                "estagios": {nome: dict(d) for nome, d in self._estagios.items()},
+                "motores": {nome: dict(d) for nome, d in self._motores.items()},
+            }
+
+    def somar(self, contadores: dict) -> None:
+        """Acumula os contadores() de outro processo."""
+        with self._lock:
+            self.imagens += contadores["imagens"]
+            self.sem_qr += contadores["sem_qr"]
+            for grupo, destino in (("estagios", self._estagios), ("motores", self._motores)):
+                for nome, d in contadores[grupo].items():
+                    dados = destino.setdefault(nome, {"tentativas": 0, "sucessos": 0, "ms": 0.0})
+                    for campo in dados:
+                        dados[campo] += d[campo]
+
+    def stats(self) -> dict:
+        def resumo(grupo: dict[str, dict]) -> dict:
+            return {
+                nome: {
+                    "tentativas": d["tentativas"],
+                    "sucessos": d["sucessos"],
+                    "taxa_sucesso": round(d["sucessos"] / d["tentativas"], 3),
+                    "ms_medio": round(d["ms"] / d["tentativas"], 2),
+                }
+                for nome, d in grupo.items()
+            }
+
+        with self._lock:
+            return {
+                "imagens": self.imagens,
+                "sem_qr": self.sem_qr,
+                "estagios": resumo(self._estagios),
+                "motores": resumo(self._motores),
+            }
+
+
+_decode_stats = DecodeStats()
+
+
+def get_decode_stats() -> DecodeStats:
+    """Estatísticas da escada neste processo."""
+    return _decode_stats
+
+
+def _to_gray(image: np.ndarray) -> np.ndarray:
+    if image.ndim == 2:
+        return image
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def _reduzir(gray: np.ndarray, max_lado: int) -> tuple[np.ndarray, float]:
+    """Reduz para que o maior lado seja max_lado; retorna (imagem, escala)."""
+    maior = max(gray.shape[:2])
+    if max_lado <= 0 or maior <= max_lado:
+        return gray, 1.0
+    escala = max_lado / maior
+    return cv2.resize(gray, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA), escala
+
+
+def _limiar(gray: np.ndarray) -> Iterator[np.ndarray]:
+    """Limiar adaptativo: sombra/reflexo irregular sobre o papel térmico."""
+    bloco = max(15, (min(gray.shape[:2]) // 40) | 1)
+    yield cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, bloco, 5)
+
+
+def _nitidez(gray: np.ndarray) -> Iterator[np.ndarray]:
+    """Unsharp mask: foto tremida / fora de foco."""
+    borrada = cv2.GaussianBlur(gray, (0, 0), 3)
+    yield cv2.addWeighted(gray, 1.8, borrada, -0.8, 0)
+
+
+def _rotacionar(gray: np.ndarray) -> Iterator[np.ndarray]:
+    """Rotações intermediárias (QR muito inclinado em relação à foto)."""
+    altura, largura = gray.shape[:2]
+    centro = (largura / 2, altura / 2)
+    for angulo in ANGULOS_ROTACAO:
+        matriz = cv2.getRotationMatrix2D(centro, angulo, 1.0)
+        yield cv2.warpAffine(gray, matriz, (largura, altura), borderMode=cv2.BORDER_REPLICATE)
+
+
+def _recortar(gray: np.ndarray, original: np.ndarray, escala: float) -> Iterator[np.ndarray]:
+    """
+    Localiza os padrões de posição na imagem reduzida e decodifica o
+    recorte correspondente na resolução original (QR pequeno na foto).
+    """
+    try:
+        encontrado, pontos = cv2.QRCodeDetector().detect(gray)
+    except cv2.error:
+        return
+    if not encontrado or pontos is None:
+        return
+    pontos = pontos.reshape(-1, 2) / escala
+    x0, y0 = pontos.min(axis=0)
+    x1, y1 = pontos.max(axis=0)
+    margem = MARGEM_RECORTE * max(x1 - x0, y1 - y0)
+    altura, largura = original.shape[:2]
+    x0, y0 = max(0, int(x0 - margem)), max(0, int(y0 - margem))
+    x1, y1 = min(largura, int(x1 + margem)), min(altura, int(y1 + margem))
+    if x1 - x0 < 8 or y1 - y0 < 8:
+        return
+    recorte = original[y0:y1, x0:x1]
+    yield recorte
+    yield from _limiar(recorte)
+
+
+def _decode_first(image: np.ndarray, motor: Optional[str] = None) -> Optional[str]:
+    """Primeiro QR Code da imagem, ou None."""
+    hits = decode_hits(image, politica=motor)
+    return hits[0].data if hits else None
+
+
+def decode_ladder(
+    image: np.ndarray,
+    max_lado: int = DECODE_MAX_SIDE,
+    motor: Optional[str] = None
+) -> tuple[Optional[str], Optional[str]]:
+    """
+    Decodifica o QR Code de uma imagem já carregada, pela escada de estágios.
+    
+    Args:
+        image: Imagem BGR, BGRA ou em tons de cinza.
+        max_lado: Maior lado do primeiro estágio (0 = sem redução).
+        motor: Motor ou política de leitura (padrão: NFCE_QR_ENGINE).
+    
+    Returns:
+        (url, estágio que decodificou) ou (None, None).
+    """
+    original = _to_gray(image)
+    reduzida, escala = _reduzir(original, max_lado)
+    
+    estagios: list[tuple[str, Callable[[], Iterable[np.ndarray]]]] = [
+        ("reduzida", lambda: (reduzida,)),
+        ("limiar", lambda: _limiar(reduzida)),
+        ("nitidez", lambda: _nitidez(reduzida)),
+        ("rotacao", lambda: _rotacionar(reduzida)),
+        ("recorte", lambda: _recortar(reduzida, original, escala)),
+        # Último recurso: o decode antigo, na resolução original
+        ("original", lambda: (original,) if escala < 1.0 else ()),
+    ]
+    for nome, candidatas in estagios:
+        inicio = time.perf_counter()
+        url = candidata = None
+        for candidata in candidatas():
+            url = _decode_first(candidata, motor)
+            if url is not None:
+                break
+        else:
+            if candidata is None:
+                continue   # Estágio sem candidatas (ex.: imagem já pequena)
+        _decode_stats.registrar(nome, url is not None, (time.perf_counter() - inicio) * 1000)
+        if url is not None:
+            _decode_stats.registrar_imagem(True)
+            return url, nome
+    
+    _decode_stats.registrar_imagem(False)
+    return None, None
+
+
+def decode_qr_from_image(image_path: str, usar_cache: bool = True) -> Optional[str]:
     """
     Lê uma imagem e extrai a URL contida no QR Code.
     
+    O mesmo arquivo já decodificado é respondido pelo cache, sem carregar
+    a imagem. Numa foto parecida com outra já lida (cópia recomprimida),
+    a região onde estava o QR Code é decodificada antes da escada.
+    
     Args:
         image_path: Caminho para o arquivo de imagem (jpg, png).
+        usar_cache: Consultar/alimentar o cache de decodificação.
     
     Returns:
         A URL extraída do QR Code, ou None se não encontrado.
@@ -28,6 +489,95 @@ def decode_qr_from_image(image_path: str) -> Optional[str]:
         FileNotFoundError: Se o arquivo de imagem não existir.
         ValueError: Se o arquivo não puder ser lido como imagem.
     """
+    cache = get_decode_cache()
+    impressao = image_fingerprint(image_path) if usar_cache else None
+    dica = cache.get(impressao)
+    if dica is not None and dica.exato:
+        return dica.url
+    
+    url, regiao = _decode_com_dica(_load_image(image_path), dica)
+    cache.registrar(impressao, dica, url, regiao)
+    return url
+
+
+def _decode_com_dica(image: np.ndarray, dica: Optional[Acerto]) -> tuple[Optional[str], Optional[Regiao]]:
+    """
+    Decodifica a região da dica (foto parecida já lida) e, sem leitura
+    ali, a imagem inteira pela escada.
+    
+    Returns:
+        (url, região do QR Code para o cache) ou (None, None).
+    """
+    gray = _to_gray(image)
+    if dica is not None and dica.regiao is not None:
+        url = _decode_regiao(gray, dica.regiao)
+        if url is not None:
+            return url, dica.regiao
+    
+    # Decodificar pela escada: cinza reduzida primeiro, tratamentos depois
+    url, _ = decode_ladder(gray)
+    return url, (_localizar(gray, url) if url is not None else None)
+
+
+def _decode_regiao(gray: np.ndarray, regiao: Regiao) -> Optional[str]:
+    """Primeiro QR Code dentro da região (com margem), ou None."""
+    altura, largura = gray.shape[:2]
+    x0, y0, x1, y1 = regiao
+    margem = max(x1 - x0, y1 - y0) * MARGEM_RECORTE
+    recorte = gray[
+        int(max(0.0, y0 - margem) * altura):int(min(1.0, y1 + margem) * altura),
+        int(max(0.0, x0 - margem) * largura):int(min(1.0, x1 + margem) * largura),
+    ]
+    if min(recorte.shape[:2]) < 21:   # Menor que um QR Code versão 1
+        return None
+    return _decode_first(_reduzir(recorte, DECODE_MAX_SIDE)[0])
+
+
+def _localizar(gray: np.ndarray, url: str) -> Optional[Regiao]:
+    """Região (relativa) do QR Code com esta URL, se achado na imagem reduzida."""
+    reduzida, _ = _reduzir(gray, DECODE_MAX_SIDE)
+    altura, largura = reduzida.shape[:2]
+    for hit in decode_hits(reduzida, multiplos=True):
+        x, y, w, h = hit.box
+        if hit.data == url and w > 0 and h > 0:
+            return (x / largura, y / altura, (x + w) / largura, (y + h) / altura)
+    return None
+
+
+def image_fingerprint(source: Union[str, Path, "ImageBuffer"]) -> Optional[Impressao]:
+    """
+    Impressão da imagem para o cache de decodificação: hash do conteúdo
+    e impressão perceptual.
+    
+    O JPEG é decodificado já reduzido 8x (IMREAD_REDUCED_GRAYSCALE_8):
+    custa uma fração do carregamento completo.
+    
+    Returns:
+        A impressão, ou None se o cache estiver desativado ou a imagem
+        não puder ser lida (o erro aparece depois, no carregamento).
+    """
+    if not get_decode_cache().ativo:
+        return None
+    if isinstance(source, np.ndarray) and source.ndim in (2, 3):
+        pixels = np.ascontiguousarray(source)
+        return fingerprint(_to_gray(pixels), content_hash(pixels) + f"-{pixels.shape}")
+    if isinstance(source, (str, Path)):
+        try:
+            source = Path(source).read_bytes()
+        except OSError:
+            return None
+    buffer = source if isinstance(source, np.ndarray) else np.frombuffer(source, dtype=np.uint8)
+    if buffer.size == 0:
+        return None
+    buffer = buffer.view(np.uint8)
+    miniatura = cv2.imdecode(buffer, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if miniatura is None:
+        return None
+    return fingerprint(miniatura, content_hash(buffer))
+
+
+def _load_image(image_path: str) -> np.ndarray:
+    """Valida o caminho e carrega a imagem já em tons de cinza."""
     # Validar existência do arquivo
     path = Path(image_path)
     if not path.exists():
@@ -36,32 +586,15 @@ def decode_qr_from_image(image_path: str) -> Optional[str]:
     if not path.is_file():
         raise ValueError(f"Caminho não é um arquivo: {image_path}")
     
-    # Carregar imagem com OpenCV
-    image = cv2.imread(str(path))
+    # Carregar imagem com OpenCV (o JPEG é decodificado direto em cinza)
+    image = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
     
     if image is None:
         raise ValueError(
             f"Não foi possível ler a imagem: {image_path}. "
             "Verifique se o arquivo é uma imagem válida (jpg, png)."
         )
-    
-    # Decodificar QR Codes na imagem
-    decoded_objects: list[Decoded] = pyzbar.decode(image)
-    
-    if not decoded_objects:
-        return None
-    
-    # Retornar o primeiro QR Code encontrado
-    for obj in decoded_objects:
-        if obj.type == "QRCODE":
-            try:
-                url = obj.data.decode("utf-8")
-                return url
-            except UnicodeDecodeError:
-                # Tentar latin-1 como fallback
-                return obj.data.decode("latin-1", errors="replace")
-    
-    return None
+    return image
 
 
 def decode_multiple_qr(image_path: str) -> list[str]:
@@ -83,15 +616,454 @@ def decode_multiple_qr(image_path: str) -> list[str]:
     if image is None:
         raise ValueError(f"Não foi possível ler a imagem: {image_path}")
     
-    decoded_objects = pyzbar.decode(image)
+    return _decode_all(image)
+
+
+def _decode_all(image: np.ndarray) -> list[str]:
+    """Todos os QR Codes da imagem, na resolução recebida."""
+    return [hit.data for hit in decode_hits(image, multiplos=True)]
+
+
+# ============================================================================
+# DECODIFICAÇÃO EM MEMÓRIA (UPLOAD)
+# ============================================================================
+
+ImageBuffer = Union[bytes, bytearray, memoryview, np.ndarray]
+
+
+def _imdecode(data: ImageBuffer) -> np.ndarray:
+    """
+    Decodifica o arquivo de imagem (jpg, png...) já em memória.
+    
+    bytes/bytearray/memoryview viram um array uint8 sem cópia
+    (np.frombuffer) antes do cv2.imdecode. Um np.ndarray 2D/3D é tratado
+    como imagem já decodificada (pixels) e usado diretamente.
     
-    results = []
-    for obj in decoded_objects:
-        if obj.type == "QRCODE":
-            try:
-                data = obj.data.decode("utf-8")
-            except UnicodeDecodeError:
-                data = obj.data.decode("latin-1", errors="replace")
-            results.append(data)
+    Raises:
+        ValueError: Se o conteúdo não for uma imagem válida.
+    """
+    if isinstance(data, np.ndarray) and data.ndim in (2, 3):
+        return data
+    buffer = data if isinstance(data, np.ndarray) else np.frombuffer(data, dtype=np.uint8)
+    if buffer.size == 0:
+        raise ValueError("Imagem vazia.")
+    if buffer.dtype != np.uint8:
+        buffer = buffer.view(np.uint8)
+    image = cv2.imdecode(buffer, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError("Não foi possível ler a imagem. Verifique se o arquivo é uma imagem válida (jpg, png).")
+    return image
+
+
+def decode_qr_from_bytes(data: ImageBuffer, usar_cache: bool = True) -> Optional[str]:
+    """
+    Extrai a URL do QR Code de uma imagem em memória (ex.: upload HTTP).
+    
+    Args:
+        data: Conteúdo do arquivo (bytes, memoryview, np.ndarray 1D) ou
+            imagem já decodificada (np.ndarray 2D/3D).
+        usar_cache: Consultar/alimentar o cache de decodificação.
+    
+    Returns:
+        A URL extraída do QR Code, ou None se não encontrado.
+    
+    Raises:
+        ValueError: Se o conteúdo não for uma imagem válida.
+    """
+    cache = get_decode_cache()
+    impressao = image_fingerprint(data) if usar_cache else None
+    dica = cache.get(impressao)
+    if dica is not None and dica.exato:
+        return dica.url
+    
+    url, regiao = _decode_com_dica(_imdecode(data), dica)
+    cache.registrar(impressao, dica, url, regiao)
+    return url
+
+
+def decode_qr_with_hint(data: ImageBuffer, dica: Optional[Acerto] = None) -> tuple[Optional[str], Optional[Regiao]]:
+    """
+    Decode sem cache para processos do pool: o processo pai consulta o
+    cache, envia a dica perceptual e registra o resultado.
+    
+    Returns:
+        (url, região do QR Code) ou (None, None).
+    
+    Raises:
+        ValueError: Se o conteúdo não for uma imagem válida.
+    """
+    return _decode_com_dica(_imdecode(data), dica)
+
+
+def decode_multiple_qr_from_bytes(data: ImageBuffer) -> list[str]:
+    """Versão em memória de `decode_multiple_qr`."""
+    return _decode_all(_imdecode(data))
+
+
+# ============================================================================
+# FOLHAS COM VÁRIOS CUPONS (BLOCOS)
+# ============================================================================
+# Scanner de mesa: dezenas de cupons numa folha A4 em alta resolução.
+# Um decode único na folha inteira é lento e perde QR Codes pequenos. A
+# folha é dividida em blocos sobrepostos (a sobreposição deve ser maior
+# que o maior QR Code, para que cada um caiba inteiro em algum bloco),
+# decodificados em paralelo; o mesmo QR achado em dois blocos vira uma
+# única entrada.
+
+BLOCO_LADO = 1200           # Lado do bloco em px
+BLOCO_SOBREPOSICAO = 400    # Sobreposição entre blocos vizinhos em px
+
+
+def _blocos(altura: int, largura: int, lado: int, sobreposicao: int) -> list[tuple[int, int]]:
+    """Origens (x, y) dos blocos cobrindo a imagem inteira."""
+    passo = max(1, lado - sobreposicao)
+    
+    def origens(total: int) -> list[int]:
+        if total <= lado:
+            return [0]
+        pontos = list(range(0, total - lado, passo))
+        pontos.append(total - lado)   # Último bloco encostado na borda
+        return pontos
+    
+    return [(x, y) for y in origens(altura) for x in origens(largura)]
+
+
+def _decode_bloco(image: np.ndarray, x: int, y: int, escala: float = 1.0) -> list[QRHit]:
+    hits = []
+    for hit in decode_hits(image, multiplos=True):
+        esquerda, topo, largura, altura = hit.box
+        box = (
+            int(esquerda / escala) + x, int(topo / escala) + y,
+            int(largura / escala), int(altura / escala),
+        )
+        hits.append(QRHit(hit.data, box))
+    return hits
+
+
+def _intersecta(a: tuple[int, int, int, int], b: tuple[int, int, int, int]) -> bool:
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+def _mesclar(hits: Iterable[QRHit]) -> list[QRHit]:
+    """Junta o mesmo QR achado em blocos sobrepostos (fica a maior caixa)."""
+    unicos: list[QRHit] = []
+    for hit in hits:
+        for i, existente in enumerate(unicos):
+            if existente.data == hit.data and _intersecta(existente.box, hit.box):
+                if hit.box[2] * hit.box[3] > existente.box[2] * existente.box[3]:
+                    unicos[i] = hit
+                break
+        else:
+            unicos.append(hit)
+    return unicos
+
+
+def decode_multiple_qr_tiled(
+    source: Union[str, Path, ImageBuffer],
+    lado: int = BLOCO_LADO,
+    sobreposicao: int = BLOCO_SOBREPOSICAO,
+    workers: Optional[int] = None
+) -> list[QRHit]:
+    """
+    Decodifica todos os QR Codes de uma folha com vários cupons.
+    
+    Os blocos são views da imagem (sem cópia) decodificados em threads:
+    pyzbar e OpenCV liberam o GIL durante a leitura. Uma passada extra na folha
+    reduzida encontra QR Codes maiores que a sobreposição.
+    
+    Args:
+        source: Caminho da imagem ou conteúdo em memória (ver decode_qr_from_bytes).
+        lado: Lado do bloco em px.
+        sobreposicao: Sobreposição entre blocos em px (> maior QR Code).
+        workers: Threads de decodificação. Padrão: uma por núcleo.
+    
+    Returns:
+        Um QRHit por QR Code, ordenados de cima para baixo, da esquerda
+        para a direita.
+    """
+    if isinstance(source, (str, Path)):
+        image = _load_image(str(source))
+    else:
+        image = _to_gray(_imdecode(source))
+    altura, largura = image.shape[:2]
+    sobreposicao = min(max(0, sobreposicao), lado - 1)
+    
+    tarefas = [(image[y:y + lado, x:x + lado], x, y, 1.0) for x, y in _blocos(altura, largura, lado, sobreposicao)]
+    if len(tarefas) > 1:
+        reduzida, escala = _reduzir(image, lado)
+        tarefas.append((reduzida, 0, 0, escala))
+    
+    workers = workers or DECODE_PROCESSES
+    if workers <= 1 or len(tarefas) == 1:
+        resultados = [_decode_bloco(*tarefa) for tarefa in tarefas]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            resultados = list(executor.map(lambda tarefa: _decode_bloco(*tarefa), tarefas))
+    
+    hits = _mesclar(hit for bloco in resultados for hit in bloco)
+    return sorted(hits, key=lambda hit: (hit.box[1], hit.box[0]))
+
+
+# ============================================================================
+# DECODIFICAÇÃO EM LOTE
+# ============================================================================
+
+@dataclass
+class DecodeResult:
+    """Resultado de uma imagem do lote: url ou erro (ambos None = sem QR Code)."""
+    path: str
+    url: Optional[str] = None
+    erro: Optional[str] = None
+    estagio: Optional[str] = None   # Estágio da escada que decodificou
+    ms: float = 0.0
+    pid: int = 0
+    estatisticas: Optional[dict] = None   # DecodeStats.contadores() do processo que decodificou
+
+
+def iter_image_paths(caminhos: Iterable[Union[str, Path]]) -> Iterator[str]:
+    """Expande pastas em imagens (ordem alfabética); arquivos passam direto."""
+    for caminho in map(Path, caminhos):
+        if caminho.is_dir():
+            for arquivo in sorted(caminho.rglob("*")):
+                if arquivo.suffix.lower() in EXTENSOES_IMAGEM and arquivo.is_file():
+                    yield str(arquivo)
+        else:
+            yield str(caminho)
+
+
+def _init_worker() -> None:
+    # Um processo por núcleo: as threads internas do OpenCV só disputariam CPU
+    cv2.setNumThreads(1)
+
+
+def _decode_one(image_path: str) -> DecodeResult:
+    inicio = time.perf_counter()
+    try:
+        url, estagio = decode_ladder(_load_image(image_path))
+        resultado = DecodeResult(image_path, url=url, estagio=estagio, ms=(time.perf_counter() - inicio) * 1000)
+    except (FileNotFoundError, ValueError) as e:
+        resultado = DecodeResult(image_path, erro=str(e))
+    except Exception as e:  # Imagem corrompida não pode derrubar o lote
+        resultado = DecodeResult(image_path, erro=f"{type(e).__name__}: {e}")
+    # Contadores acumulados do processo: o pai fica com o último de cada pid
+    resultado.pid = os.getpid()
+    resultado.estatisticas = _decode_stats.contadores()
+    return resultado
+
+
+def decode_batch(
+    image_paths: Iterable[str],
+    processes: Optional[int] = None,
+    chunksize: int = 4
+) -> Iterator[DecodeResult]:
+    """
+    Decodifica várias imagens em paralelo (um processo por núcleo).
+    
+    Os resultados saem em streaming, na mesma ordem da entrada, à medida
+    que ficam prontos; erros de uma imagem viram DecodeResult.erro em vez
+    de interromper o lote.
+    
+    Args:
+        image_paths: Caminhos das imagens (ex.: iter_image_paths([pasta])).
+        processes: Número de processos. Padrão: NFCE_DECODE_PROCESSES.
+        chunksize: Imagens enviadas por vez a cada processo.
     
-    return results
+    Yields:
+        DecodeResult(path, url, erro) para cada imagem. `estatisticas` traz
+        os contadores da escada do processo que a decodificou (ver
+        batch_stats).
+    """
+    processes = processes or DECODE_PROCESSES
+    if processes <= 1:
+        for image_path in image_paths:
+            yield _decode_one(image_path)
+        return
+    
+    # spawn: o processo filho não herda threads/estado do OpenCV do pai
+    contexto = multiprocessing.get_context("spawn")
+    with contexto.Pool(processes, initializer=_init_worker) as pool:
+        yield from pool.imap(_decode_one, image_paths, chunksize=max(1, chunksize))
+
+
+def batch_stats(resultados: Iterable[DecodeResult]) -> DecodeStats:
+    """
+    Estatísticas da escada e dos motores de um lote: soma o último
+    contador de cada processo que decodificou.
+    """
+    ultimos = {r.pid: r.estatisticas for r in resultados if r.estatisticas is not None}
+    stats = DecodeStats()
+    for contadores in ultimos.values():
+        stats.somar(contadores)
+    return stats
+
+
+# ============================================================================
+# VÍDEO E SEQUÊNCIA DE QUADROS
+# ============================================================================
+# Vídeos do celular passando por vários cupons: a maioria dos quadros é
+# igual ao anterior (câmera parada) ou borrada pelo movimento. Os quadros
+# são amostrados a uma taxa base; quando o QR Code lido por último continua
+# no mesmo lugar, o quadro não é decodificado e o intervalo dobra (até
+# VIDEO_PASSO_MAX_S, quando o quadro é decodificado mesmo assim).
+#
+# A comparação usa só a região do último QR Code lido com sucesso: um
+# quadro parecido com um quadro sem leitura (borrado, cupom entrando) nunca
+# é pulado, e a troca de um QR Code por outro num cupom quase igual muda
+# a região mesmo quando a foto inteira reduzida quase não muda.
+
+VIDEO_AMOSTRAS_S = 6.0      # Quadros analisados por segundo com a cena mudando
+VIDEO_PASSO_MAX_S = 1.0     # Maior intervalo entre quadros decodificados (cena parada)
+VIDEO_MAX_SIDE = 1280       # Maior lado do quadro decodificado
+VIDEO_DIFF_LIMIAR = 3.0     # Diferença média (0-255) da região do QR abaixo da qual o quadro é repetido
+LADO_RECORTE = 48           # Lado da miniatura da região do QR Code comparada
+VIDEO_MARGEM_REGIAO = 0.1   # Margem em volta da região (fração do lado)
+
+
+@dataclass
+class VideoHit:
+    """Uma URL encontrada no vídeo (emitida só na primeira aparição)."""
+    url: str
+    quadro: int
+    tempo_s: float
+
+
+def _regiao_qr(hits: list[QRHit], forma: tuple[int, ...]) -> Optional[tuple[int, int, int, int]]:
+    """Retângulo (x0, y0, x1, y1) que cobre os QR Codes lidos, com margem."""
+    caixas = [hit.box for hit in hits if hit.box[2] > 0 and hit.box[3] > 0]
+    if not caixas:
+        return None
+    x0 = min(x for x, _, _, _ in caixas)
+    y0 = min(y for _, y, _, _ in caixas)
+    x1 = max(x + w for x, _, w, _ in caixas)
+    y1 = max(y + h for _, y, _, h in caixas)
+    margem = int(max(x1 - x0, y1 - y0) * VIDEO_MARGEM_REGIAO)
+    altura, largura = forma[:2]
+    x0, y0 = max(0, x0 - margem), max(0, y0 - margem)
+    x1, y1 = min(largura, x1 + margem), min(altura, y1 + margem)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1, y1
+
+
+def _recorte(gray: np.ndarray, regiao: tuple[int, int, int, int]) -> np.ndarray:
+    x0, y0, x1, y1 = regiao
+    return cv2.resize(
+        gray[y0:y1, x0:x1], (LADO_RECORTE, LADO_RECORTE), interpolation=cv2.INTER_AREA
+    ).astype(np.int16)
+
+
+class _Quadros:
+    """Quadros de um vídeo (OpenCV) ou de um iterável, com avanço barato."""
+
+    def __init__(self, source: Union[str, Path, Iterable[np.ndarray]]):
+        self._captura = None
+        self._iterador = None
+        self.fps = None
+        if isinstance(source, (str, Path)):
+            self._captura = cv2.VideoCapture(str(source))
+            if not self._captura.isOpened():
+                raise ValueError(f"Não foi possível abrir o vídeo: {source}")
+            self.fps = self._captura.get(cv2.CAP_PROP_FPS) or None
+        else:
+            self._iterador = iter(source)
+
+    def proximo(self, analisar: bool) -> Optional[np.ndarray]:
+        """
+        Avança um quadro. Quadros que não serão analisados são só
+        avançados (grab), sem conversão de cor. Fim do vídeo: StopIteration.
+        """
+        if self._iterador is not None:
+            return next(self._iterador)
+        if not analisar:
+            if not self._captura.grab():
+                raise StopIteration
+            return None
+        ok, frame = self._captura.read()
+        if not ok:
+            raise StopIteration
+        return frame
+
+    def close(self) -> None:
+        if self._captura is not None:
+            self._captura.release()
+
+
+def decode_video(
+    source: Union[str, Iterable[np.ndarray]],
+    fps: Optional[float] = None,
+    estatisticas: Optional[dict] = None
+) -> Iterator[VideoHit]:
+    """
+    Decodifica os QR Codes de um vídeo ou de uma sequência de quadros.
+    
+    Args:
+        source: Caminho do vídeo (qualquer formato do OpenCV) ou iterável
+            de quadros (np.ndarray BGR ou cinza), ex.: câmera ao vivo.
+        fps: Quadros por segundo da sequência. Padrão: o do arquivo, ou 30.
+        estatisticas: Dict preenchido com os contadores da leitura
+            (quadros, analisados, repetidos, tempo_ms).
+    
+    Yields:
+        VideoHit na primeira vez que cada URL aparece.
+    
+    Raises:
+        ValueError: Se o vídeo não puder ser aberto.
+    """
+    quadros = _Quadros(source)
+    fps = fps or quadros.fps or 30.0
+    passo_base = max(1, round(fps / VIDEO_AMOSTRAS_S))
+    passo_max = max(passo_base, round(fps * VIDEO_PASSO_MAX_S))
+    
+    stats = estatisticas if estatisticas is not None else {}
+    stats.update({"quadros": 0, "analisados": 0, "repetidos": 0, "tempo_ms": 0.0})
+    inicio = time.perf_counter()
+    
+    vistas: set[str] = set()
+    # Região e recorte do último quadro com leitura; None depois de um
+    # quadro analisado sem nenhum QR Code
+    regiao: Optional[tuple[int, int, int, int]] = None
+    referencia: Optional[np.ndarray] = None
+    forma: tuple[int, ...] = ()
+    passo = passo_base
+    proximo_analise = 0
+    
+    try:
+        for indice in itertools.count():
+            try:
+                frame = quadros.proximo(analisar=indice >= proximo_analise)
+            except StopIteration:
+                break
+            stats["quadros"] += 1
+            if frame is None or indice < proximo_analise:
+                continue
+            
+            reduzida, _ = _reduzir(_to_gray(frame), VIDEO_MAX_SIDE)
+            if (
+                referencia is not None and passo < passo_max
+                and reduzida.shape[:2] == forma
+                and float(np.abs(_recorte(reduzida, regiao) - referencia).mean()) < VIDEO_DIFF_LIMIAR
+            ):
+                # O mesmo QR Code parado no lugar: não decodifica e espaça a amostragem
+                stats["repetidos"] += 1
+                passo = min(passo * 2, passo_max)
+                proximo_analise = indice + passo
+                continue
+            
+            stats["analisados"] += 1
+            hits = decode_hits(reduzida, multiplos=True)
+            novas = [hit.data for hit in hits if hit.data not in vistas]
+            forma = reduzida.shape[:2]
+            regiao = _regiao_qr(hits, forma)
+            referencia = _recorte(reduzida, regiao) if regiao is not None else None
+            # Só a decodificação periódica da cena parada (mesmo QR Code de
+            # antes) mantém o intervalo máximo
+            if referencia is None or novas or passo < passo_max:
+                passo = passo_base
+            proximo_analise = indice + passo
+            
+            for url in dict.fromkeys(novas):
+                vistas.add(url)
+                yield VideoHit(url=url, quadro=indice, tempo_s=round(indice / fps, 2))
+    finally:
+        quadros.close()
+        stats["tempo_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
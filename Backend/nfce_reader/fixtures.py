@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo Fixtures - Gravação de páginas reais para o corpus de benchmark.
+
+Com NFCE_RECORD_DIR definido, cada página baixada por fetch_page /
+fetch_page_async é salva anonimizada em NFCE_RECORD_DIR/<ESTADO>/*.html.
+Essa pasta é o corpus usado por `benchmark.py corpus`.
+
+A anonimização troca dígitos de dados pessoais e identificadores da nota
+(CPF do consumidor, chave de acesso, protocolo) por zeros, mantendo o
+tamanho e a estrutura do HTML: o parse continua exercitando o mesmo layout.
+"""
+
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import Optional
+
+
+RECORD_DIR = os.getenv("NFCE_RECORD_DIR", "")
+
+
+# ============================================================================
+# ANONIMIZAÇÃO
+# ============================================================================
+
+# CPF formatado (123.456.789-00) ou após o rótulo "CPF"
+_RE_CPF = re.compile(r'\d{3}\.\d{3}\.\d{3}-\d{2}|(?<=CPF)([^\d<]{0,30})(\d{11})(?!\d)', re.IGNORECASE)
+# Chave de acesso, corrida ou em grupos de 4 dígitos
+_RE_CHAVE = re.compile(r'(?<!\d)\d{4}(?:\s?\d{4}){10}(?!\d)')
+# Protocolo de autorização (15 dígitos)
+_RE_PROTOCOLO = re.compile(r'(?<=Protocolo)([^\d<]{0,40})(\d{15})', re.IGNORECASE)
+# Nome do consumidor: "Consumidor: NOME" / "Nome: NOME"
+_RE_CONSUMIDOR = re.compile(r'((?:Consumidor|Nome)\s*:\s*)([^<\n]{3,80})', re.IGNORECASE)
+
+
+def _zerar(texto: str) -> str:
+    return re.sub(r'\d', '0', texto)
+
+
+def anonymize_html(html: str) -> str:
+    """Remove dados pessoais e identificadores mantendo o layout da página."""
+    html = _RE_CPF.sub(lambda m: _zerar(m.group()), html)
+    html = _RE_CHAVE.sub(lambda m: _zerar(m.group()), html)
+    html = _RE_PROTOCOLO.sub(lambda m: m.group(1) + _zerar(m.group(2)), html)
+    html = _RE_CONSUMIDOR.sub(lambda m: m.group(1) + "CONSUMIDOR", html)
+    return html
+
+
+# ============================================================================
+# GRAVAÇÃO
+# ============================================================================
+
+def record_page(url: str, html: str, estado: str, destino: Optional[str] = None) -> Optional[Path]:
+    """
+    Salva a página anonimizada no corpus (só se NFCE_RECORD_DIR ou destino).
+
+    O nome do arquivo é um hash da URL, então regravar a mesma nota
+    sobrescreve a fixture em vez de duplicá-la.
+
+    Returns:
+        Caminho gravado, ou None se a gravação estiver desativada/falhar.
+    """
+    destino = destino or RECORD_DIR
+    if not destino:
+        return None
+    nome = hashlib.blake2b(url.strip().encode("utf-8"), digest_size=8).hexdigest()
+    caminho = Path(destino) / estado.upper() / f"{nome}.html"
+    try:
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        caminho.write_text(anonymize_html(html), encoding="utf-8")
+    except OSError as e:
+        print(f"[AVISO] Falha ao gravar fixture {caminho}: {e}")
+        return None
+    return caminho
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo Parse Cache - Memoização do resultado de parse_nfce.
+
+A mesma página é reprocessada com frequência (nota reenviada após falha
+ao gravar no banco, execuções repetidas do CLI, re-parse do arquivo).
+O resultado é guardado num LRU em memória, com uma cópia opcional em
+disco (SQLite) que sobrevive a reinícios.
+
+A chave é um hash de (HTML, estado, backend, versão do parser): ao mudar
+a versão do parser (scraper.PARSER_VERSION) as entradas antigas deixam
+de ser encontradas, sem precisar limpar o cache.
+
+Configuração por variáveis de ambiente:
+    NFCE_PARSE_CACHE_SIZE: entradas em memória, 0 desativa (padrão: 256)
+    NFCE_PARSE_CACHE_FILE: arquivo SQLite para persistir (padrão: vazio = só memória)
+    NFCE_PARSE_CACHE_MAX_DISK: entradas mantidas em disco (padrão: 10000)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+# ============================================================================
+# CONFIGURAÇÃO
+# ============================================================================
+
+CACHE_SIZE = int(os.getenv("NFCE_PARSE_CACHE_SIZE", "256"))
+CACHE_FILE = os.getenv("NFCE_PARSE_CACHE_FILE", "")
+CACHE_MAX_DISK = int(os.getenv("NFCE_PARSE_CACHE_MAX_DISK", "10000"))
+
+
+def make_key(html: str, estado: str, parser: str, versao: str) -> str:
+    """Hash do conteúdo + parâmetros que influenciam o resultado do parse."""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{versao}\0{parser}\0{estado.upper()}\0".encode("utf-8"))
+    h.update(html.encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+
+def _copiar(resultado: dict) -> dict:
+    """Cópia rasa do resultado + itens (o chamador pode alterar o dict)."""
+    copia = dict(resultado)
+    copia["itens"] = [dict(item) for item in resultado.get("itens", [])]
+    return copia
+
+
+# ============================================================================
+# CACHE LRU (+ PERSISTÊNCIA OPCIONAL)
+# ============================================================================
+
+class ParseCache:
+    """LRU limitado em memória, com segundo nível opcional em SQLite."""
+
+    def __init__(self, max_entradas: int = CACHE_SIZE, arquivo: str = CACHE_FILE,
+                 max_disco: int = CACHE_MAX_DISK):
+        self.max_entradas = max(0, max_entradas)
+        self.max_disco = max(1, max_disco)
+        self._lru: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._gravacoes_disco = 0
+
+        self.hits = 0
+        self.hits_disco = 0
+        self.misses = 0
+
+        if arquivo:
+            try:
+                self._db = sqlite3.connect(arquivo, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS parse_cache ("
+                    " chave TEXT PRIMARY KEY, resultado TEXT NOT NULL, usado_em REAL NOT NULL)"
+                )
+            except sqlite3.Error as e:
+                print(f"[ERRO] Cache de parse em disco indisponível ({arquivo}): {e}")
+                self._db = None
+
+    @property
+    def ativo(self) -> bool:
+        return self.max_entradas > 0 or self._db is not None
+
+    def get(self, chave: str) -> Optional[dict]:
+        """Retorna uma cópia do resultado guardado, ou None."""
+        with self._lock:
+            resultado = self._lru.get(chave)
+            if resultado is not None:
+                self._lru.move_to_end(chave)
+                self.hits += 1
+                return _copiar(resultado)
+
+            if self._db is not None:
+                try:
+                    linha = self._db.execute(
+                        "SELECT resultado FROM parse_cache WHERE chave = ?", (chave,)
+                    ).fetchone()
+                    if linha is not None:
+                        self._db.execute(
+                            "UPDATE parse_cache SET usado_em = ? WHERE chave = ?", (time.time(), chave)
+                        )
+                        resultado = json.loads(linha[0])
+                        self._guardar_memoria(chave, resultado)
+                        self.hits_disco += 1
+                        return _copiar(resultado)
+                except sqlite3.Error as e:
+                    print(f"[AVISO] Falha ao ler cache de parse: {e}")
+
+            self.misses += 1
+            return None
+
+    def put(self, chave: str, resultado: dict) -> None:
+        """Guarda uma cópia do resultado (memória e, se configurado, disco)."""
+        resultado = _copiar(resultado)
+        with self._lock:
+            self._guardar_memoria(chave, resultado)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO parse_cache (chave, resultado, usado_em) VALUES (?, ?, ?)",
+                    (chave, json.dumps(resultado, ensure_ascii=False), time.time())
+                )
+                self._gravacoes_disco += 1
+                # Poda periódica das entradas menos usadas
+                if self._gravacoes_disco % 100 == 0:
+                    self._db.execute(
+                        "DELETE FROM parse_cache WHERE chave IN ("
+                        " SELECT chave FROM parse_cache ORDER BY usado_em DESC LIMIT -1 OFFSET ?)",
+                        (self.max_disco,)
+                    )
+            except sqlite3.Error as e:
+                print(f"[AVISO] Falha ao gravar cache de parse: {e}")
+
+    def _guardar_memoria(self, chave: str, resultado: dict) -> None:
+        if self.max_entradas == 0:
+            return
+        self._lru[chave] = resultado
+        self._lru.move_to_end(chave)
+        while len(self._lru) > self.max_entradas:
+            self._lru.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM parse_cache")
+
+    def stats(self) -> dict:
+        with self._lock:
+            consultas = self.hits + self.hits_disco + self.misses
+            return {
+                "entradas": len(self._lru),
+                "max_entradas": self.max_entradas,
+                "persistente": self._db is not None,
+                "hits": self.hits,
+                "hits_disco": self.hits_disco,
+                "misses": self.misses,
+                "taxa_acerto": round((self.hits + self.hits_disco) / consultas, 3) if consultas else 0.0,
+            }
+
+
+# ============================================================================
+# SINGLETON
+# ============================================================================
+
+_cache: Optional[ParseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_parse_cache() -> ParseCache:
+    """Retorna o cache global de resultados de parse."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ParseCache()
+    return _cache
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo Resilience - Proteções para acesso aos portais da SEFAZ.
+
+Cada hostname recebe um "guarda" com:
+- Limite de requisições simultâneas (em voo) por host
+- Retentativas com backoff exponencial e jitter (só timeouts e 5xx)
+- Circuit breaker: após falhas seguidas o host é marcado como fora do ar
+  e as próximas chamadas falham imediatamente até o tempo de reset
+
+Configuração por variáveis de ambiente:
+    NFCE_HOST_MAX_CONCURRENCY: requisições simultâneas por host (padrão: 4)
+    NFCE_RETRY_MAX:            retentativas após a 1ª tentativa (padrão: 2)
+    NFCE_RETRY_BASE_S:         atraso base do backoff em segundos (padrão: 0.5)
+    NFCE_RETRY_MAX_S:          atraso máximo do backoff (padrão: 8)
+    NFCE_BREAKER_THRESHOLD:    falhas seguidas para abrir o circuito (padrão: 5)
+    NFCE_BREAKER_RESET_S:      tempo com circuito aberto (padrão: 30)
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Awaitable, Callable
+from urllib.parse import urlparse
+
+
+# ============================================================================
+# CONFIGURAÇÃO
+# ============================================================================
+
+HOST_MAX_CONCURRENCY = int(os.getenv("NFCE_HOST_MAX_CONCURRENCY", "4"))
+RETRY_MAX = int(os.getenv("NFCE_RETRY_MAX", "2"))
+RETRY_BASE_S = float(os.getenv("NFCE_RETRY_BASE_S", "0.5"))
+RETRY_MAX_S = float(os.getenv("NFCE_RETRY_MAX_S", "8"))
+BREAKER_THRESHOLD = int(os.getenv("NFCE_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET_S = float(os.getenv("NFCE_BREAKER_RESET_S", "30"))
+
+# Classificação de erros (retornada pela função `classificar` do chamador)
+RETENTAVEL = "retentavel"      # Timeout / 5xx: tenta de novo e conta falha
+FALHA_HOST = "falha_host"      # Ex.: conexão recusada: conta falha, não repete
+NAO_CONTA = "nao_conta"        # Ex.: 404: erro do pedido, host está saudável
+
+# Estados do circuit breaker
+FECHADO = "fechado"
+ABERTO = "aberto"
+MEIO_ABERTO = "meio_aberto"
+
+
+class HostIndisponivelError(Exception):
+    """Circuito aberto: o host está marcado como fora do ar."""
+
+    def __init__(self, host: str, retry_after: float):
+        self.host = host
+        self.retry_after = retry_after
+        super().__init__(
+            f"SEFAZ indisponível ({host}). Tente novamente em {retry_after:.0f}s."
+        )
+
+
+# ============================================================================
+# CIRCUIT BREAKER
+# ============================================================================
+
+class CircuitBreaker:
+    """
+    Circuit breaker clássico (fechado -> aberto -> meio aberto).
+
+    No estado meio aberto apenas uma requisição de teste é liberada;
+    se ela funcionar o circuito fecha, se falhar volta a abrir.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, reset_s: float = BREAKER_RESET_S):
+        self.threshold = max(1, threshold)
+        self.reset_s = reset_s
+        self.estado = FECHADO
+        self.falhas_seguidas = 0
+        self.aberturas = 0
+        self._aberto_em = 0.0
+        self._teste_em_andamento = False
+        self._lock = threading.Lock()
+
+    def permitir(self) -> None:
+        """Libera a requisição ou levanta HostIndisponivelError."""
+        with self._lock:
+            if self.estado == FECHADO:
+                return
+            restante = self._aberto_em + self.reset_s - time.monotonic()
+            if self.estado == ABERTO and restante <= 0:
+                self.estado = MEIO_ABERTO
+                self._teste_em_andamento = False
+            if self.estado == MEIO_ABERTO and not self._teste_em_andamento:
+                self._teste_em_andamento = True
+                return
+            raise HostIndisponivelError("", max(restante, 1.0))
+
+    def registrar_sucesso(self) -> None:
+        with self._lock:
+            self.estado = FECHADO
+            self.falhas_seguidas = 0
+            self._teste_em_andamento = False
+
+    def registrar_falha(self) -> None:
+        with self._lock:
+            self.falhas_seguidas += 1
+            if self.estado == MEIO_ABERTO or self.falhas_seguidas >= self.threshold:
+                if self.estado != ABERTO:
+                    self.aberturas += 1
+                self.estado = ABERTO
+                self._aberto_em = time.monotonic()
+                self._teste_em_andamento = False
+
+    def liberar_teste(self) -> None:
+        """Libera o slot de teste se a tentativa terminou sem veredito."""
+        with self._lock:
+            self._teste_em_andamento = False
+
+
+# ============================================================================
+# GUARDA POR HOST
+# ============================================================================
+
+class HostGuard:
+    """Limite de concorrência, retentativas e circuit breaker de um host."""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.max_concurrency = max(1, HOST_MAX_CONCURRENCY)
+        self.breaker = CircuitBreaker()
+        self._sem = threading.BoundedSemaphore(self.max_concurrency)
+        self._async_sems: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+        self.em_voo = 0
+        self.requisicoes = 0
+        self.retentativas = 0
+        self.falhas = 0
+        self.rejeitadas = 0
+
+    # ------------------------------------------------------------------
+    # Slots de concorrência
+    # ------------------------------------------------------------------
+
+    def _incrementar(self, campo: str, delta: int = 1) -> None:
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + delta)
+
+    @contextmanager
+    def _slot(self):
+        with self._sem:
+            self._incrementar("em_voo")
+            try:
+                yield
+            finally:
+                self._incrementar("em_voo", -1)
+
+    @asynccontextmanager
+    async def _slot_async(self):
+        loop = asyncio.get_running_loop()
+        sem = self._async_sems.get(loop)
+        if sem is None:
+            sem = self._async_sems.setdefault(loop, asyncio.Semaphore(self.max_concurrency))
+        async with sem:
+            self._incrementar("em_voo")
+            try:
+                yield
+            finally:
+                self._incrementar("em_voo", -1)
+
+    # ------------------------------------------------------------------
+    # Execução com retentativas
+    # ------------------------------------------------------------------
+
+    def _permitir(self) -> None:
+        try:
+            self.breaker.permitir()
+        except HostIndisponivelError as e:
+            self._incrementar("rejeitadas")
+            raise HostIndisponivelError(self.host, e.retry_after) from None
+
+    def _registrar_erro(self, exc: Exception, classificar: Callable[[Exception], str]) -> str:
+        tipo = classificar(exc)
+        if tipo == NAO_CONTA:
+            self.breaker.liberar_teste()
+        else:
+            self._incrementar("falhas")
+            self.breaker.registrar_falha()
+        return tipo
+
+    def call(self, tentativa: Callable[[], Any], classificar: Callable[[Exception], str]) -> Any:
+        """
+        Executa `tentativa` (síncrona) sob o limite do host.
+
+        Exceções não retentáveis (ou a última após esgotar as
+        retentativas) são propagadas para o chamador.
+        """
+        for n in range(RETRY_MAX + 1):
+            self._permitir()
+            self._incrementar("requisicoes")
+            try:
+                with self._slot():
+                    resultado = tentativa()
+            except Exception as exc:
+                tipo = self._registrar_erro(exc, classificar)
+                if tipo != RETENTAVEL or n == RETRY_MAX:
+                    raise
+                self._incrementar("retentativas")
+                time.sleep(backoff_delay(n))
+                continue
+            self.breaker.registrar_sucesso()
+            return resultado
+
+    async def acall(
+        self,
+        tentativa: Callable[[], Awaitable[Any]],
+        classificar: Callable[[Exception], str]
+    ) -> Any:
+        """Versão assíncrona de `call`."""
+        for n in range(RETRY_MAX + 1):
+            self._permitir()
+            self._incrementar("requisicoes")
+            try:
+                async with self._slot_async():
+                    resultado = await tentativa()
+            except asyncio.CancelledError:
+                self.breaker.liberar_teste()
+                raise
+            except Exception as exc:
+                tipo = self._registrar_erro(exc, classificar)
+                if tipo != RETENTAVEL or n == RETRY_MAX:
+                    raise
+                self._incrementar("retentativas")
+                await asyncio.sleep(backoff_delay(n))
+                continue
+            self.breaker.registrar_sucesso()
+            return resultado
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "circuito": self.breaker.estado,
+                "falhas_seguidas": self.breaker.falhas_seguidas,
+                "aberturas": self.breaker.aberturas,
+                "em_voo": self.em_voo,
+                "max_concorrencia": self.max_concurrency,
+                "requisicoes": self.requisicoes,
+                "retentativas": self.retentativas,
+                "falhas": self.falhas,
+                "rejeitadas": self.rejeitadas,
+            }
+
+
+# ============================================================================
+# REGISTRO DE HOSTS
+# ============================================================================
+
+_guards: dict[str, HostGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def backoff_delay(tentativa: int) -> float:
+    """Atraso exponencial com jitter para a tentativa `n` (0 = primeira)."""
+    teto = min(RETRY_MAX_S, RETRY_BASE_S * (2 ** tentativa))
+    return random.uniform(teto / 2, teto)
+
+
+def get_host_guard(url: str) -> HostGuard:
+    """Retorna (criando se necessário) o guarda do host da URL."""
+    host = (urlparse(url.strip()).hostname or "").lower()
+    guard = _guards.get(host)
+    if guard is None:
+        with _guards_lock:
+            guard = _guards.setdefault(host, HostGuard(host))
+    return guard
+
+
+def get_host_stats() -> dict[str, dict]:
+    """Snapshot de estado/contadores de todos os hosts já acessados."""
+    with _guards_lock:
+        guards = list(_guards.values())
+    return {guard.host: guard.stats() for guard in guards}
@@ -6,15 +6,77 @@ Este módulo utiliza requests para buscar HTML e BeautifulSoup para
 fazer o parse e extrair informações de Notas Fiscais Eletrônicas.
 
 Os seletores CSS são configuráveis para suportar diferentes estados
-(SEFAZ de cada estado tem layouts diferentes).
+(SEFAZ de cada estado tem layouts diferentes). O estado é detectado pelo
+host da URL ou pelo código da UF da chave de acesso (ver register_estado).
 """
 
+import asyncio
+import codecs
+import os
 import re
-from typing import Optional
+import threading
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Optional
+from urllib.parse import urlparse
 from dataclasses import dataclass
 
+import httpx
 import requests
+import soupsieve
 from bs4 import BeautifulSoup, Tag
+from bs4.filter import ElementFilter
+
+try:
+    import h2  # noqa: F401 - presença habilita HTTP/2 no cliente assíncrono
+    _HTTP2_DISPONIVEL = True
+except ImportError:
+    _HTTP2_DISPONIVEL = False
+
+try:
+    from .resilience import (
+        HostIndisponivelError,
+        get_host_guard,
+        RETENTAVEL,
+        FALHA_HOST,
+        NAO_CONTA,
+    )
+    from .access_key import extract_chave
+    from .archive import get_archive
+    from .fixtures import RECORD_DIR, record_page
+    from .parse_cache import get_parse_cache, make_key
+    from .selector_stats import ITENS_ESTADO, ITENS_GENERICO, get_selector_stats, layout_key
+    from .workers import get_parse_pool
+    from .text_utils import (
+        clean_text as _clean_text,
+        is_valid_product as _is_valid_product,
+        parse_money as _parse_money,
+        parse_money_batch,
+        parse_number as _parse_number,
+        find_money_in_text as _find_money_in_text,
+    )
+except ImportError:  # Execução direta dentro da pasta (ex.: uvicorn server:app)
+    from resilience import (
+        HostIndisponivelError,
+        get_host_guard,
+        RETENTAVEL,
+        FALHA_HOST,
+        NAO_CONTA,
+    )
+    from access_key import extract_chave
+    from archive import get_archive
+    from fixtures import RECORD_DIR, record_page
+    from parse_cache import get_parse_cache, make_key
+    from selector_stats import ITENS_ESTADO, ITENS_GENERICO, get_selector_stats, layout_key
+    from workers import get_parse_pool
+    from text_utils import (
+        clean_text as _clean_text,
+        is_valid_product as _is_valid_product,
+        parse_money as _parse_money,
+        parse_money_batch,
+        parse_number as _parse_number,
+        find_money_in_text as _find_money_in_text,
+    )
 
 
 # ============================================================================
@@ -37,6 +99,9 @@ class EstadoSelectors:
     item_nome: str
     item_qtd: str
     item_valor: str
+    # Blocos extras (além dos seletores acima) com endereço e data de emissão,
+    # usados pelo plano de parse. Vazio = sem plano (parse completo sempre).
+    plano_extra: tuple[str, ...] = (".txtCenter", ".text", "#infos", "#totalNota")
 
 
 # Seletores conhecidos por estado
@@ -79,11 +144,86 @@ SELETORES_ESTADO: dict[str, EstadoSelectors] = {
         itens_container="table tr, ul li",
         item_nome="",
         item_qtd="",
-        item_valor=""
+        item_valor="",
+        plano_extra=()
     )
 }
 
 
+# ============================================================================
+# DETECÇÃO DO ESTADO (HOST / cUF)
+# ============================================================================
+# O layout da página é definido pelo portal que a serve, então o host da
+# URL do QR Code tem prioridade. Para hosts desconhecidos usa-se o código
+# da UF (cUF, dois primeiros dígitos da chave de acesso).
+
+# Hostname (ou sufixo de domínio) do portal de consulta -> estado
+HOSTS_ESTADO: dict[str, str] = {
+    "sefaz.rs.gov.br": "RS",
+    "svrs.rs.gov.br": "RS",
+    "fazenda.sp.gov.br": "SP",
+    "fazenda.rj.gov.br": "RJ",
+}
+
+# Código IBGE da UF (cUF da chave de acesso) -> estado
+CODIGOS_UF: dict[str, str] = {
+    "43": "RS",
+    "35": "SP",
+    "33": "RJ",
+}
+
+
+def register_estado(
+    selectors: EstadoSelectors,
+    hosts: tuple[str, ...] = (),
+    codigos_uf: tuple[str, ...] = ()
+) -> None:
+    """
+    Registra (ou substitui) os seletores de um estado.
+    
+    Args:
+        selectors: Seletores do layout (selectors.nome é a sigla).
+        hosts: Hostnames ou sufixos de domínio do portal de consulta.
+        codigos_uf: Códigos IBGE da UF que usam esse layout.
+    """
+    estado = selectors.nome.upper()
+    SELETORES_ESTADO[estado] = selectors
+    for host in hosts:
+        HOSTS_ESTADO[host.lower().strip(".")] = estado
+    for codigo in codigos_uf:
+        CODIGOS_UF[codigo] = estado
+
+
+def detect_estado(url: str) -> str:
+    """
+    Descobre o layout de estado pela URL do QR Code.
+    
+    Returns:
+        Sigla com seletores registrados, ou "GENERICO".
+    """
+    host = (urlparse((url or "").strip()).hostname or "").lower()
+    
+    # Host exato ou qualquer domínio pai (www.sefaz.rs.gov.br -> sefaz.rs.gov.br)
+    partes = host.split(".")
+    for i in range(len(partes) - 1):
+        estado = HOSTS_ESTADO.get(".".join(partes[i:]))
+        if estado in SELETORES_ESTADO:
+            return estado
+    
+    chave = extract_chave(url)
+    if chave:
+        estado = CODIGOS_UF.get(chave[:2])
+        if estado in SELETORES_ESTADO:
+            return estado
+    
+    return "GENERICO"
+
+
+def _resolver_estado(url: str, estado: str) -> str:
+    """Resolve estado "AUTO" pela URL; outros valores passam direto."""
+    return detect_estado(url) if estado.upper() == "AUTO" else estado
+
+
 # ============================================================================
 # HEADERS HTTP
 # ============================================================================
@@ -101,26 +241,369 @@ HEADERS = {
 }
 
 
+# ============================================================================
+# BACKENDS DE PARSE HTML
+# ============================================================================
+# O tree builder do BeautifulSoup domina o custo de CPU por scan.
+# Todos os backends produzem uma árvore BeautifulSoup, então as funções
+# _extract_* funcionam igual em qualquer um. Escolha via NFCE_PARSER ou
+# pelo argumento `parser` de parse_nfce.
+
+def _lxml_disponivel() -> bool:
+    try:
+        import lxml  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+# nome -> feature do tree builder do BeautifulSoup
+PARSER_BACKENDS: dict[str, str] = {
+    "html.parser": "html.parser",   # Puro Python (mais lento, sem dependências)
+}
+if _lxml_disponivel():
+    PARSER_BACKENDS["lxml"] = "lxml"  # libxml2 (C), várias vezes mais rápido
+
+PARSER_PADRAO = os.getenv("NFCE_PARSER", "lxml" if "lxml" in PARSER_BACKENDS else "html.parser")
+
+
+def register_parser_backend(nome: str, feature: str) -> None:
+    """
+    Registra um novo backend de parse (qualquer tree builder instalado
+    no BeautifulSoup, ex.: "html5lib").
+    """
+    PARSER_BACKENDS[nome] = feature
+
+
+def _make_soup(
+    html: str,
+    parser: Optional[str] = None,
+    parse_only: Optional[ElementFilter] = None
+) -> BeautifulSoup:
+    """Cria a árvore com o backend pedido (ou o padrão configurado)."""
+    nome = parser or PARSER_PADRAO
+    feature = PARSER_BACKENDS.get(nome)
+    if feature is None:
+        print(f"[AVISO] Backend de parse '{nome}' indisponível, usando html.parser")
+        feature = "html.parser"
+    return BeautifulSoup(html, feature, parse_only=parse_only)
+
+
+# ============================================================================
+# PLANOS DE PARSE POR ESTADO
+# ============================================================================
+# Páginas da SEFAZ trazem scripts e grandes blocos ocultos que não interessam.
+# O plano de parse de um estado só materializa as subárvores que algum
+# seletor da extração pode ler: os do estado e todas as cadeias de fallback
+# (estabelecimento, total, endereço, data). Se o resultado do plano estiver
+# incompleto (sem itens, algum campo do cabeçalho faltando) ou não for
+# garantidamente igual ao do parse completo, parse_nfce refaz o parse completo.
+#
+# Desligado por padrão: os fallbacks só de tag ("li", "div", "td", "span")
+# mantêm quase a página inteira no plano e, quando ele não basta, a página é
+# lida duas vezes. Só ligar (NFCE_PARSE_PLAN=1) se `benchmark.py parsers`
+# mostrar ganho da coluna "plano" em todos os layouts.
+
+USAR_PLANO_PARSE = os.getenv("NFCE_PARSE_PLAN", "0") not in ("0", "false", "False")
+
+# Composto simples: tag, #id, .classes e um [class*='trecho'] opcional
+_RE_COMPOSTO = re.compile(r"([a-zA-Z][\w-]*)?((?:[#.][\w-]+)*)(?:\[class\*=['\"]([^'\"]+)['\"]\])?")
+_RE_COMBINADOR = re.compile(r'\s*([>+~])\s*')
+
+
+class ParsePlan(ElementFilter):
+    """
+    Filtro de parse: aceita apenas elementos de nível superior que casem
+    com alguma regra (tag, id, classes); a subárvore deles vem inteira.
+    """
+    
+    def __init__(
+        self,
+        regras: list[tuple[Optional[str], Optional[str], frozenset, Optional[str]]],
+        irmaos: list[str]
+    ):
+        super().__init__()
+        self.regras = regras
+        # Compostos à esquerda de "+"/"~": no nível superior do plano, os
+        # vizinhos não são os mesmos da página inteira
+        self.irmaos = [_compile_matcher(sel) for sel in irmaos]
+    
+    def allow_tag_creation(self, nsprefix: Optional[str], name: str, attrs: Optional[dict]) -> bool:
+        attrs = attrs or {}
+        classes = attrs.get("class") or ()
+        if isinstance(classes, str):
+            classes = classes.split()
+        ident = attrs.get("id")
+        for nome, id_regra, classes_regra, trecho in self.regras:
+            if nome and nome != name:
+                continue
+            if id_regra and id_regra != ident:
+                continue
+            if classes_regra and not classes_regra.issubset(classes):
+                continue
+            if trecho and trecho not in " ".join(classes):
+                continue
+            return True
+        return False
+    
+    def allow_string_creation(self, string: str) -> bool:
+        # Textos fora das subárvores escolhidas são descartados
+        return False
+
+
+_planos: dict[str, tuple[EstadoSelectors, Optional[ParsePlan]]] = {}
+
+
+def _get_parse_plan(selectors: EstadoSelectors) -> Optional[ParsePlan]:
+    """
+    Compila (e guarda) o plano de parse de um estado.
+    
+    O plano cobre todos os seletores que a extração consulta: os do estado
+    e as cadeias de fallback (FALLBACK_*, SELETORES_ENDERECO, SELETORES_DATA).
+    A regra de cada seletor é o seu primeiro composto (o ancestral mais
+    externo): "#tabResult tr" -> #tabResult, ".linhaShade .txtMax" -> .linhaShade;
+    o composto depois de "+"/"~" também vira regra (não está na subárvore
+    do primeiro). Retorna None se algum seletor não puder ser convertido.
+    """
+    cache = _planos.get(selectors.nome)
+    if cache is not None and cache[0] is selectors:
+        return cache[1]
+    
+    plano = None
+    if selectors.plano_extra:
+        fontes = [selectors.estabelecimento, selectors.total, selectors.itens_container]
+        fontes += list(selectors.plano_extra)
+        fontes += FALLBACK_ESTABELECIMENTO + FALLBACK_TOTAL + SELETORES_ENDERECO + SELETORES_DATA
+        regras: Optional[list] = []
+        irmaos = []
+        for fonte in fontes:
+            for parte in filter(None, (p.strip() for p in fonte.split(","))):
+                tokens = _RE_COMBINADOR.sub(r" \1 ", parte).split()
+                compostos = [tokens[0]]
+                for i, token in enumerate(tokens[1:-1], start=1):
+                    if token in "+~":
+                        compostos.append(tokens[i + 1])
+                        irmaos.append(tokens[i - 1])
+                for composto in compostos:
+                    regra = _regra_plano(composto)
+                    if regra is None:
+                        regras = None
+                        break
+                    regras.append(regra)
+                if regras is None:
+                    break
+            if regras is None:
+                break
+        if regras:
+            plano = ParsePlan(regras, irmaos)
+    
+    _planos[selectors.nome] = (selectors, plano)
+    return plano
+
+
+def _regra_plano(composto: str) -> Optional[tuple[Optional[str], Optional[str], frozenset, Optional[str]]]:
+    """(tag, id, classes, trecho de classe) de um composto simples, ou None."""
+    match = _RE_COMPOSTO.fullmatch(composto)
+    if not match or not composto:
+        return None
+    nome, resto, trecho = match.groups()
+    ids = re.findall(r'#([\w-]+)', resto)
+    return nome, ids[0] if ids else None, frozenset(re.findall(r'\.([\w-]+)', resto)), trecho
+
+
+def _plano_completo(result: dict, soup: BeautifulSoup, plano: ParsePlan) -> bool:
+    """
+    O resultado do plano é igual ao do parse completo?
+    
+    Todo elemento que um seletor pode casar existe no plano, na mesma ordem,
+    com a subárvore inteira. Ficam de fora o texto solto da página (fallback
+    de endereço/data sobre o texto inteiro) e os vizinhos no nível superior
+    do plano: nesses casos, ou se faltar algum campo, o parse é refeito.
+    """
+    if not result["itens"] or result["estabelecimento"] == "Não identificado" or not result["total"]:
+        return False
+    if result["endereco"] is None or result["data_emissao"] is None:
+        return False
+    if plano.irmaos:
+        for node in soup.children:
+            if isinstance(node, Tag) and any(matcher(node) for matcher in plano.irmaos):
+                return False
+    return True
+
+
+# ============================================================================
+# POOL DE CONEXÕES
+# ============================================================================
+# Conexões reutilizadas (keep-alive) por host da SEFAZ, evitando pagar
+# DNS + TCP + TLS a cada nota lida.
+
+POOL_MAX_CONEXOES = int(os.getenv("NFCE_HTTP_POOL_SIZE", "20"))
+POOL_KEEPALIVE_S = float(os.getenv("NFCE_HTTP_KEEPALIVE", "60"))
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+# Cliente assíncrono vinculado ao event loop que o criou
+_async_client: Optional[httpx.AsyncClient] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_session() -> requests.Session:
+    """Retorna a Session compartilhada (API síncrona / CLI)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.headers.update(HEADERS)
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=POOL_MAX_CONEXOES,
+                    pool_maxsize=POOL_MAX_CONEXOES
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    """
+    Retorna o cliente httpx compartilhado do event loop atual.
+    
+    Usa HTTP/2 quando o pacote `h2` está instalado (várias requisições
+    multiplexadas na mesma conexão com a SEFAZ).
+    """
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client.is_closed or _async_client_loop is not loop:
+        _async_client = httpx.AsyncClient(
+            headers=HEADERS,
+            http2=_HTTP2_DISPONIVEL,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=POOL_MAX_CONEXOES,
+                max_keepalive_connections=POOL_MAX_CONEXOES,
+                keepalive_expiry=POOL_KEEPALIVE_S
+            )
+        )
+        _async_client_loop = loop
+    return _async_client
+
+
+async def close_async_client() -> None:
+    """Fecha o cliente assíncrono compartilhado (shutdown da aplicação)."""
+    global _async_client, _async_client_loop
+    if _async_client is not None:
+        await _async_client.aclose()
+    _async_client = None
+    _async_client_loop = None
+
+
+# ============================================================================
+# DOWNLOAD LIMITADO E CHARSET
+# ============================================================================
+# O corpo é lido em blocos até NFCE_MAX_PAGE_BYTES (memória por download
+# limitada). O charset vem do header ou da <meta> da página; detecção
+# estatística só em último caso e só sobre um prefixo do conteúdo.
+
+MAX_PAGE_BYTES = int(os.getenv("NFCE_MAX_PAGE_BYTES", str(5 * 1024 * 1024)))
+CHUNK_BYTES = 64 * 1024
+DETECT_PREFIX_BYTES = 32 * 1024
+META_PREFIX_BYTES = 4096
+
+# Candidatos da detecção estatística: páginas em português que não são UTF-8
+CHARSETS_LEGADOS = ["cp1252", "latin_1", "iso8859_15"]
+
+_RE_CHARSET_HEADER = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+_RE_CHARSET_META = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+
+class PaginaGrandeError(Exception):
+    """Corpo da resposta maior que NFCE_MAX_PAGE_BYTES."""
+
+    def __init__(self, url: str, limite: int):
+        self.url = url
+        self.limite = limite
+        super().__init__(f"Página maior que {limite} bytes: {url}")
+
+
+def _check_content_length(headers, url: str, limite: int) -> None:
+    """Recusa antes de baixar quando o servidor já informa o tamanho."""
+    tamanho = headers.get("content-length")
+    if tamanho and tamanho.isdigit() and int(tamanho) > limite:
+        raise PaginaGrandeError(url, limite)
+
+
+def _charset_valido(nome: Optional[str]) -> Optional[str]:
+    if not nome:
+        return None
+    try:
+        return codecs.lookup(nome.strip().lower()).name
+    except LookupError:
+        return None
+
+
+def _decode_body(body: bytes, content_type: Optional[str]) -> str:
+    """
+    Decodifica o HTML baixado.
+    
+    Ordem: BOM -> charset do header -> <meta charset> -> UTF-8 estrito ->
+    detecção estatística sobre os primeiros DETECT_PREFIX_BYTES.
+    """
+    if body.startswith(codecs.BOM_UTF8):
+        return body[len(codecs.BOM_UTF8):].decode("utf-8", errors="replace")
+    
+    match = _RE_CHARSET_HEADER.search(content_type or "")
+    encoding = _charset_valido(match.group(1)) if match else None
+    
+    if encoding is None:
+        match = _RE_CHARSET_META.search(body, 0, META_PREFIX_BYTES)
+        encoding = _charset_valido(match.group(1).decode("ascii")) if match else None
+    
+    if encoding is None:
+        try:
+            return body.decode("utf-8")
+        except UnicodeDecodeError:
+            from charset_normalizer import from_bytes
+            best = from_bytes(body[:DETECT_PREFIX_BYTES], cp_isolation=CHARSETS_LEGADOS).best()
+            encoding = _charset_valido(best.encoding if best else None) or "utf-8"
+    
+    return body.decode(encoding, errors="replace")
+
+
 # ============================================================================
 # FUNÇÕES PRINCIPAIS
 # ============================================================================
 
-def fetch_page(url: str, timeout: int = 30) -> Optional[str]:
+def fetch_page(url: str, timeout: int = 30, record_dir: Optional[str] = None) -> Optional[str]:
     """
     Busca o conteúdo HTML de uma URL.
     
     Args:
         url: URL da página a ser buscada.
         timeout: Timeout em segundos para a requisição.
+        record_dir: Modo gravação: salva a página anonimizada no corpus
+            de benchmark. Padrão: NFCE_RECORD_DIR (vazio = desligado).
     
     Returns:
         Conteúdo HTML da página, ou None se falhar.
+    
+    Raises:
+        HostIndisponivelError: Se o circuito do host estiver aberto.
     """
+    def tentativa() -> str:
+        with _get_session().get(url, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            _check_content_length(response.headers, url, MAX_PAGE_BYTES)
+            body = bytearray()
+            for bloco in response.iter_content(CHUNK_BYTES):
+                body += bloco
+                if len(body) > MAX_PAGE_BYTES:
+                    raise PaginaGrandeError(url, MAX_PAGE_BYTES)
+            return _decode_body(bytes(body), response.headers.get("content-type"))
+    
     try:
-        response = requests.get(url, headers=HEADERS, timeout=timeout)
-        response.raise_for_status()
-        response.encoding = response.apparent_encoding or "utf-8"
-        return response.text
+        html = get_host_guard(url).call(tentativa, _classificar_erro)
     except requests.Timeout:
         print(f"[ERRO] Timeout ao acessar: {url}")
         return None
@@ -133,198 +616,713 @@ def fetch_page(url: str, timeout: int = 30) -> Optional[str]:
     except requests.RequestException as e:
         print(f"[ERRO] Erro ao acessar URL: {e}")
         return None
+    except PaginaGrandeError as e:
+        print(f"[ERRO] {e}")
+        return None
+    
+    if record_dir or RECORD_DIR:
+        record_page(url, html, detect_estado(url), record_dir)
+    return html
+
+
+async def fetch_page_async(url: str, timeout: int = 30, record_dir: Optional[str] = None) -> Optional[str]:
+    """
+    Versão assíncrona de `fetch_page`, sobre o cliente httpx compartilhado.
+    
+    Args:
+        url: URL da página a ser buscada.
+        timeout: Timeout em segundos para a requisição.
+        record_dir: Modo gravação (ver fetch_page).
+    
+    Returns:
+        Conteúdo HTML da página, ou None se falhar.
+    
+    Raises:
+        HostIndisponivelError: Se o circuito do host estiver aberto.
+    """
+    async def tentativa() -> str:
+        async with _get_async_client().stream("GET", url, timeout=timeout) as response:
+            response.raise_for_status()
+            _check_content_length(response.headers, url, MAX_PAGE_BYTES)
+            body = bytearray()
+            async for bloco in response.aiter_bytes(CHUNK_BYTES):
+                body += bloco
+                if len(body) > MAX_PAGE_BYTES:
+                    raise PaginaGrandeError(url, MAX_PAGE_BYTES)
+        return _decode_body(bytes(body), response.headers.get("content-type"))
+    
+    try:
+        html = await get_host_guard(url).acall(tentativa, _classificar_erro)
+    except httpx.TimeoutException:
+        print(f"[ERRO] Timeout ao acessar: {url}")
+        return None
+    except httpx.ConnectError:
+        print(f"[ERRO] Falha de conexão ao acessar: {url}")
+        return None
+    except httpx.HTTPStatusError as e:
+        print(f"[ERRO] Erro HTTP {e.response.status_code}: {url}")
+        return None
+    except httpx.HTTPError as e:
+        print(f"[ERRO] Erro ao acessar URL: {e}")
+        return None
+    except PaginaGrandeError as e:
+        print(f"[ERRO] {e}")
+        return None
+    
+    if record_dir or RECORD_DIR:
+        await asyncio.to_thread(record_page, url, html, detect_estado(url), record_dir)
+    return html
+
+
+def _classificar_erro(exc: Exception) -> str:
+    """
+    Classifica uma falha de download para o guarda do host.
+    
+    Só timeouts e respostas 5xx são repetidos; falhas de conexão contam
+    para o circuit breaker mas não são repetidas; o resto (ex.: 404)
+    é problema da URL, não do host.
+    """
+    if isinstance(exc, (requests.Timeout, httpx.TimeoutException)):
+        return RETENTAVEL
+    if isinstance(exc, (requests.HTTPError, httpx.HTTPStatusError)):
+        status = exc.response.status_code if exc.response is not None else 0
+        return RETENTAVEL if status >= 500 else NAO_CONTA
+    if isinstance(exc, (requests.ConnectionError, httpx.TransportError)):
+        return FALHA_HOST
+    return NAO_CONTA
 
 
-def parse_nfce(html: str, estado: str = "GENERICO") -> dict:
+# Versão da lógica de extração. Incrementar sempre que uma mudança no
+# parse alterar o resultado para a mesma página: invalida o cache de parse.
+PARSER_VERSION = "4"
+
+
+def parse_nfce(
+    html: str,
+    estado: str = "GENERICO",
+    parser: Optional[str] = None,
+    usar_plano: bool = USAR_PLANO_PARSE,
+    usar_cache: bool = True,
+    origem: Optional[str] = None
+) -> dict:
     """
     Faz o parse do HTML de uma NFC-e e extrai os dados.
     
     Args:
         html: Conteúdo HTML da página.
         estado: Sigla do estado (RS, SP, RJ) ou GENERICO.
+        parser: Backend de parse ("lxml", "html.parser"). Padrão: NFCE_PARSER.
+        usar_plano: Se True, tenta antes o parse parcial do plano do estado.
+        usar_cache: Se True, reaproveita o resultado de uma página idêntica.
+        origem: URL da nota; o host separa layouts diferentes do mesmo
+            estado no aprendizado da ordem dos seletores.
     
     Returns:
         Dicionário com 'estabelecimento', 'total', 'itens' e 'data_emissao'.
     """
-    soup = BeautifulSoup(html, "html.parser")
+    stats, layout, dicas = _consultar_dicas(estado, origem)
+    cache, chave, result = _consultar_cache(html, estado, parser, usar_cache, dicas)
+    if result is None:
+        result, vencedores = _parse_nfce(html, estado, parser, usar_plano, dicas)
+        _registrar_vencedores(stats, layout, vencedores)
+        if cache is not None:
+            cache.put(chave, result)
+    return result
+
+
+async def parse_nfce_async(
+    html: str, estado: str = "GENERICO", parser: Optional[str] = None, origem: Optional[str] = None
+) -> dict:
+    """
+    Versão assíncrona de `parse_nfce` para o servidor.
+    
+    Sem acerto no cache, o parse roda no pool de processos
+    (NFCE_PARSE_PROCESSES): só os bytes do HTML vão para o processo e só
+    o dicionário do resultado volta.
+    """
+    stats, layout, dicas = _consultar_dicas(estado, origem)
+    cache, chave, result = _consultar_cache(html, estado, parser, True, dicas)
+    if result is not None:
+        return result
+    
+    pool = get_parse_pool()
+    if pool is None:
+        result, vencedores = await asyncio.to_thread(_parse_nfce, html, estado, parser, USAR_PLANO_PARSE, dicas)
+    else:
+        result, vencedores = await pool.run(
+            parse_nfce_bytes, html.encode("utf-8", "surrogatepass"), estado, parser, dicas,
+            *_registros_do_job(estado, parser)
+        )
+    _registrar_vencedores(stats, layout, vencedores)
+    
+    if cache is not None:
+        cache.put(chave, result)
+    return result
+
+
+def parse_nfce_batch(paginas: list[tuple], parser: Optional[str] = None) -> list[dict]:
+    """
+    Parse de várias páginas (jobs em lote) usando o pool de processos.
+    
+    Args:
+        paginas: Lista de (html, estado) ou (html, estado, origem).
+    
+    Returns:
+        Resultados na mesma ordem da entrada.
+    """
+    pool = get_parse_pool()
+    if pool is None or len(paginas) < 2:
+        return [parse_nfce(html, estado, parser, origem=resto[0] if resto else None)
+                for html, estado, *resto in paginas]
+    
+    resultados: list[Optional[dict]] = []
+    pendentes = []
+    for i, (html, estado, *resto) in enumerate(paginas):
+        stats, layout, dicas = _consultar_dicas(estado, resto[0] if resto else None)
+        cache, chave, result = _consultar_cache(html, estado, parser, True, dicas)
+        resultados.append(result)
+        if result is None:
+            pendentes.append((i, html, estado, chave, layout, dicas))
+    
+    if pendentes:
+        registros = [_registros_do_job(p[2], parser) for p in pendentes]
+        novos = pool.map(
+            parse_nfce_bytes,
+            [p[1].encode("utf-8", "surrogatepass") for p in pendentes],
+            [p[2] for p in pendentes],
+            [parser] * len(pendentes),
+            [p[5] for p in pendentes],
+            [r[0] for r in registros],
+            [r[1] for r in registros]
+        )
+        for (i, _, _, chave, layout, _), (result, vencedores) in zip(pendentes, novos):
+            resultados[i] = result
+            _registrar_vencedores(stats, layout, vencedores)
+            if cache is not None:
+                cache.put(chave, result)
+    
+    return resultados
+
+
+def parse_nfce_bytes(
+    html: bytes,
+    estado: str,
+    parser: Optional[str] = None,
+    dicas: Optional[dict] = None,
+    selectors: Optional[EstadoSelectors] = None,
+    backend: Optional[tuple[str, str]] = None
+) -> tuple[dict, dict]:
+    """
+    Ponto de entrada dos processos do pool de parse.
+    
+    Sem cache nem estatísticas: o processo pai consulta o cache, envia a
+    ordem aprendida (dicas) e registra os vencedores devolvidos.
+    
+    Os processos são criados com "spawn" e só conhecem os estados e
+    backends registrados na importação do módulo. Por isso o pai envia os
+    seletores do estado e o backend (nome, feature) de cada job, e eles
+    são registrados aqui se faltarem ou estiverem diferentes.
+    """
+    if selectors is not None and SELETORES_ESTADO.get(selectors.nome.upper()) != selectors:
+        register_estado(selectors)
+    if backend is not None and PARSER_BACKENDS.get(backend[0]) != backend[1]:
+        register_parser_backend(*backend)
+    return _parse_nfce(html.decode("utf-8", "surrogatepass"), estado, parser, USAR_PLANO_PARSE, dicas)
+
+
+def _registros_do_job(
+    estado: str, parser: Optional[str]
+) -> tuple[Optional[EstadoSelectors], Optional[tuple[str, str]]]:
+    """Seletores do estado e backend de parse a enviar com um job do pool."""
+    nome = parser or PARSER_PADRAO
+    feature = PARSER_BACKENDS.get(nome)
+    return SELETORES_ESTADO.get(estado.upper()), ((nome, feature) if feature else None)
+
+
+def _consultar_cache(
+    html: str, estado: str, parser: Optional[str], usar_cache: bool, dicas: Optional[dict] = None
+) -> tuple[Any, Optional[str], Optional[dict]]:
+    """
+    Retorna (cache, chave, resultado guardado ou None); cache None = desativado.
+    
+    A ordem aprendida das cadeias de fallback entra na chave: dois
+    fallbacks podem achar valores diferentes na mesma página.
+    """
+    cache = get_parse_cache() if usar_cache else None
+    if cache is None or not cache.ativo:
+        return None, None, None
+    chave = make_key(html, estado, parser or PARSER_PADRAO, PARSER_VERSION + _assinatura_dicas(dicas))
+    return cache, chave, cache.get(chave)
+
+
+def _assinatura_dicas(dicas: Optional[dict]) -> str:
+    """Ordem efetiva dos fallbacks (o seletor do estado é sempre o primeiro)."""
+    if not dicas:
+        return ""
+    partes = []
+    for campo in ("estabelecimento", "total"):
+        ordem = [rotulo for rotulo in dicas.get(campo) or () if rotulo != ROTULO_ESTADO]
+        partes.append(",".join(ordem))
+    return "" if not any(partes) else "+" + "|".join(partes)
+
+
+def _consultar_dicas(estado: str, origem: Optional[str]) -> tuple[Any, Optional[str], Optional[dict]]:
+    """Retorna (stats, layout, ordem aprendida); stats None = aprendizado desativado."""
+    stats = get_selector_stats()
+    if stats is None:
+        return None, None, None
+    host = urlparse(origem).hostname if origem and "://" in origem else origem
+    layout = layout_key(estado, host)
+    return stats, layout, stats.hints(layout)
+
+
+def _registrar_vencedores(stats: Any, layout: Optional[str], vencedores: dict) -> None:
+    if stats is not None:
+        stats.record(layout, vencedores)
+
+
+def _parse_nfce(
+    html: str, estado: str, parser: Optional[str], usar_plano: bool, dicas: Optional[dict] = None
+) -> tuple[dict, dict]:
+    """
+    Parse sem cache (ver parse_nfce).
     
+    Returns:
+        (resultado, vencedores) — vencedores indica o seletor que deu cada
+        campo e se os itens vieram dos seletores do estado ou do fallback
+        genérico, para selector_stats.
+    """
     # Tentar usar seletores específicos do estado
     selectors = SELETORES_ESTADO.get(estado.upper(), SELETORES_ESTADO["GENERICO"])
+    fallback_generico = estado.upper() != "GENERICO"
     
-    result = {
-        "estabelecimento": _extract_estabelecimento(soup, selectors),
-        "endereco": _extract_endereco(soup),
-        "total": _extract_total(soup, selectors),
-        "itens": _extract_itens(soup, selectors),
-        "data_emissao": _extract_data_emissao(soup)
-    }
+    # Layout onde os seletores do estado nunca acham itens: o plano (que só
+    # aceita itens do estado) falharia, então vai direto ao parse completo.
+    # A ordem de extração não muda: estado primeiro, genérico depois.
+    if fallback_generico and dicas and dicas.get("generico_primeiro"):
+        return _parse_soup(_make_soup(html, parser), selectors, "generico", dicas)
+    
+    plano = _get_parse_plan(selectors) if usar_plano else None
+    if plano is not None:
+        soup = _make_soup(html, parser, plano)
+        result, vencedores = _parse_soup(soup, selectors, None, dicas, texto_pagina=False)
+        if _plano_completo(result, soup, plano):
+            return result, vencedores
+    
+    soup = _make_soup(html, parser)
+    return _parse_soup(soup, selectors, "generico" if fallback_generico else None, dicas)
+
+
+def _parse_soup(
+    soup: BeautifulSoup, selectors: EstadoSelectors, fallback_generico: Optional[str],
+    dicas: Optional[dict] = None, texto_pagina: bool = True
+) -> tuple[dict, dict]:
+    """
+    Extrai os campos da NFC-e de uma árvore já construída.
+    
+    fallback_generico: None (só seletores do estado) ou "generico"
+    (genérico se o estado não achar itens).
+    texto_pagina: False na árvore parcial do plano (ver _extract_campos).
+    """
+    campos, vencedores = _extract_campos(soup, selectors, dicas, texto_pagina)
     
+    itens = _extract_itens(soup, selectors)
+    vencedores["itens"] = ITENS_ESTADO if itens else None
     # Se não encontrou itens com seletores específicos, tenta fallback genérico
-    if not result["itens"] and estado.upper() != "GENERICO":
-        result["itens"] = _extract_itens_generico(soup)
+    if not itens and fallback_generico:
+        itens = _extract_itens_generico(soup)
+        vencedores["itens"] = ITENS_GENERICO if itens else None
     
-    return result
+    result = {
+        "estabelecimento": campos["estabelecimento"],
+        "endereco": campos["endereco"],
+        "total": campos["total"],
+        "itens": itens,
+        "data_emissao": campos["data_emissao"]
+    }
+    return result, vencedores
 
 
-def scrape_nfce(url: str, estado: str = "GENERICO") -> Optional[dict]:
+def scrape_nfce(url: str, estado: str = "AUTO", usar_arquivo: bool = True) -> Optional[dict]:
     """
     Pipeline completo: busca HTML e extrai dados da NFC-e.
     
+    Páginas já arquivadas (pela chave de acesso da URL) são lidas do
+    disco; páginas novas são baixadas e arquivadas só se o parse achar
+    itens (a SEFAZ responde 200 com páginas de erro ou "em processamento").
+    Uma cópia arquivada sem itens é ignorada: a página é baixada de novo e
+    substitui a cópia.
+    
     Args:
         url: URL da nota fiscal eletrônica.
-        estado: Sigla do estado para usar seletores específicos.
+        estado: Sigla do estado para usar seletores específicos, ou "AUTO"
+            para detectar pelo host / código da UF da URL.
+        usar_arquivo: Se False, ignora a cópia arquivada e baixa de novo.
     
     Returns:
         Dicionário com dados extraídos, ou None se falhar.
     """
+    estado = _resolver_estado(url, estado)
+    chave = extract_chave(url)
+    html = _read_archived(chave) if usar_arquivo else None
+    if html is not None:
+        result = parse_nfce(html, estado, origem=url)
+        if result["itens"]:
+            return result
+    
     html = fetch_page(url)
     if html is None:
         return None
+    result = parse_nfce(html, estado, origem=url)
+    if result["itens"]:
+        _archive_page(chave, html)
+    return result
+
+
+async def scrape_nfce_async(url: str, estado: str = "AUTO", usar_arquivo: bool = True) -> Optional[dict]:
+    """
+    Versão assíncrona de `scrape_nfce`.
     
-    return parse_nfce(html, estado)
+    O download usa conexões reaproveitadas do pool; leitura/gravação do
+    arquivo roda em uma thread e o parse (CPU) no pool de processos,
+    para não bloquear o event loop. Arquiva só páginas com itens, como
+    `scrape_nfce`.
+    
+    Args:
+        url: URL da nota fiscal eletrônica.
+        estado: Sigla do estado para usar seletores específicos, ou "AUTO"
+            para detectar pelo host / código da UF da URL.
+        usar_arquivo: Se False, ignora a cópia arquivada e baixa de novo.
+    
+    Returns:
+        Dicionário com dados extraídos, ou None se falhar.
+    """
+    estado = _resolver_estado(url, estado)
+    chave = extract_chave(url)
+    html = await asyncio.to_thread(_read_archived, chave) if usar_arquivo else None
+    if html is not None:
+        result = await parse_nfce_async(html, estado, origem=url)
+        if result["itens"]:
+            return result
+    
+    html = await fetch_page_async(url)
+    if html is None:
+        return None
+    result = await parse_nfce_async(html, estado, origem=url)
+    if result["itens"]:
+        await asyncio.to_thread(_archive_page, chave, html)
+    return result
 
 
 # ============================================================================
-# FUNÇÕES AUXILIARES DE EXTRAÇÃO
+# ARQUIVO DE PÁGINAS
 # ============================================================================
 
-def _extract_estabelecimento(soup: BeautifulSoup, selectors: EstadoSelectors) -> str:
-    """Extrai o nome do estabelecimento."""
-    if selectors.estabelecimento:
-        elem = soup.select_one(selectors.estabelecimento)
-        if elem:
-            return _clean_text(elem.get_text())
+def _read_archived(chave: Optional[str]) -> Optional[str]:
+    """Lê a página arquivada da chave, se existir."""
+    archive = get_archive()
+    if archive is None or chave is None:
+        return None
+    data = archive.get(chave)
+    return data.decode("utf-8") if data is not None else None
+
+
+def _archive_page(chave: Optional[str], html: str) -> None:
+    """
+    Arquiva a página baixada (falhas de disco não interrompem o scan).
     
-    # Fallback: procurar padrões comuns
-    for pattern in [".txtTopo", "#u20", ".emit", ".razao", "[class*='emitente']"]:
-        elem = soup.select_one(pattern)
-        if elem:
-            text = _clean_text(elem.get_text())
-            if len(text) > 3:
-                return text
-    
-    return "Não identificado"
-
-
-def _extract_endereco(soup: BeautifulSoup) -> Optional[str]:
-    """
-    Extrai o endereço do estabelecimento.
-    
-    Procura por padrões típicos de endereço brasileiro:
-    - Palavras como Rua, Av, Avenida, Travessa
-    - Padrões de CEP (00000-000)
-    """
-    # Padrões para identificar endereço
-    endereco_patterns = [
-        r'(?:Rua|R\.|Av\.|Avenida|Travessa|Tv\.|Alameda|Al\.|Praça|Pç\.)\s+[^,\n]+',
-        r'\d{5}-?\d{3}',  # CEP
-    ]
-    
-    # Seletores comuns para endereço
-    selectors_endereco = [
-        "[class*='endereco']",
-        "[class*='address']",
-        ".txtTit + div",
-        ".inf-adic",
-        "li",
-        "div"
-    ]
-    
-    for selector in selectors_endereco:
-        for elem in soup.select(selector):
-            text = elem.get_text()
-            # Verificar se parece endereço
-            if re.search(r'(Rua|R\.|Av\.|Avenida|Travessa)', text, re.IGNORECASE):
-                # Limpar e extrair só o endereço relevante
-                endereco = _clean_text(text)
-                if len(endereco) > 10 and len(endereco) < 200:
-                    return endereco
-    
-    # Fallback: buscar no texto todo
-    full_text = soup.get_text()
-    match = re.search(r'((?:Rua|R\.|Av\.|Avenida)\s+[^\n]{10,80})', full_text, re.IGNORECASE)
+    Uma chave já arquivada passa a apontar para a página nova.
+    """
+    archive = get_archive()
+    if archive is None or chave is None:
+        return
+    try:
+        archive.put(chave, html.encode("utf-8"))
+    except OSError as e:
+        print(f"[ERRO] Falha ao arquivar página {chave}: {e}")
+
+
+# ============================================================================
+# EXTRAÇÃO EM PASSADA ÚNICA
+# ============================================================================
+# Estabelecimento, endereço, total e data de emissão são extraídos numa
+# única varredura da árvore. Cada campo tem uma cadeia de seletores em
+# ordem de prioridade; a varredura para assim que todos os campos estão
+# decididos.
+
+# Cadeias de fallback (usadas depois do seletor específico do estado).
+# A ordem efetiva é aprendida por layout (selector_stats): o rótulo
+# ROTULO_ESTADO representa o seletor específico do estado na cadeia.
+ROTULO_ESTADO = "estado"
+FALLBACK_ESTABELECIMENTO = [".txtTopo", "#u20", ".emit", ".razao", "[class*='emitente']"]
+FALLBACK_TOTAL = [".txtMax", ".totalNumb", ".total", "[class*='total']", "#totalNota"]
+
+# Elementos candidatos a conter endereço / data (ordem = prioridade)
+SELETORES_ENDERECO = [
+    "[class*='endereco']",
+    "[class*='address']",
+    ".txtTit + div",
+    ".inf-adic",
+    "li",
+    "div"
+]
+SELETORES_DATA = [
+    "[class*='data']",
+    "[class*='emissao']",
+    ".infNFe",
+    "#infNFe",
+    "li",
+    "td",
+    "span"
+]
+
+_RE_ENDERECO = re.compile(r'(Rua|R\.|Av\.|Avenida|Travessa)', re.IGNORECASE)
+_RE_ENDERECO_TEXTO = re.compile(r'((?:Rua|R\.|Av\.|Avenida)\s+[^\n]{10,80})', re.IGNORECASE)
+_RE_DATA = re.compile(r'(\d{2})[/.-](\d{2})[/.-](\d{2,4})')
+
+# Resultado de um avaliador quando o elemento não serve para o campo
+_REJEITADO = object()
+
+
+@lru_cache(maxsize=256)
+def _compile_matcher(selector: str) -> Callable[[Tag], bool]:
+    """
+    Converte um seletor CSS em um teste `elemento -> bool`.
+    
+    Seletores simples (tag, .classe, #id, [class*='x']) viram comparações
+    diretas; os demais usam o soupsieve, filtrando antes pelo nome da tag.
+    """
+    if re.fullmatch(r'[a-z][a-z0-9]*', selector):
+        return lambda tag: tag.name == selector
+    
+    match = re.fullmatch(r'\.([\w-]+)', selector)
     if match:
-        return _clean_text(match.group(1))
+        classe = match.group(1)
+        return lambda tag: classe in (tag.get("class") or ())
     
-    return None
+    match = re.fullmatch(r'#([\w-]+)', selector)
+    if match:
+        ident = match.group(1)
+        return lambda tag: tag.get("id") == ident
+    
+    match = re.fullmatch(r"\[class\*=['\"]([^'\"]+)['\"]\]", selector)
+    if match:
+        trecho = match.group(1)
+        return lambda tag: trecho in " ".join(tag.get("class") or ())
+    
+    compilado = soupsieve.compile(selector)
+    match = re.search(r'(?:^|[\s>+~])([a-z][a-z0-9]*)$', selector)
+    if match:
+        nome = match.group(1)
+        return lambda tag: tag.name == nome and compilado.match(tag)
+    return compilado.match
 
 
-def _extract_total(soup: BeautifulSoup, selectors: EstadoSelectors) -> float:
-    """Extrai o valor total da nota."""
-    if selectors.total:
-        elem = soup.select_one(selectors.total)
-        if elem:
-            return _parse_money(elem.get_text())
+class _Campo:
+    """
+    Um campo extraído por uma cadeia de seletores em ordem de prioridade.
     
-    # Fallback: procurar padrões comuns
-    for pattern in [".txtMax", ".totalNumb", ".total", "[class*='total']", "#totalNota"]:
-        elem = soup.select_one(pattern)
-        if elem:
-            value = _parse_money(elem.get_text())
-            if value > 0:
-                return value
+    Cada seletor ("slot") é decidido no primeiro elemento que casar
+    (`primeiro=True`, equivalente a select_one) ou no primeiro elemento
+    que casar E passar no avaliador. O valor do campo é o do primeiro
+    slot resolvido cujos anteriores falharam.
+    """
+    
+    __slots__ = ("slots", "estados", "valores", "decidido", "valor", "vencedor")
+    
+    def __init__(self, slots: list[tuple[str, Callable[[str], Any], bool]]):
+        # slots: (seletor, avaliador(texto) -> valor | _REJEITADO, primeiro)
+        self.slots = [(_compile_matcher(sel), avaliar, primeiro) for sel, avaliar, primeiro in slots]
+        self.estados = [None] * len(self.slots)   # None=pendente, True=resolvido, False=falhou
+        self.valores = [None] * len(self.slots)
+        self.decidido = not self.slots
+        self.valor = None
+        self.vencedor: Optional[int] = None   # Índice do slot que deu o valor
+    
+    def visitar(self, tag: Tag, texto: list) -> None:
+        """Aplica o elemento aos slots pendentes (texto é calculado sob demanda)."""
+        mudou = False
+        for i, (matcher, avaliar, primeiro) in enumerate(self.slots):
+            if self.estados[i] is not None or not matcher(tag):
+                continue
+            if texto[0] is None:
+                texto[0] = tag.get_text()
+            valor = avaliar(texto[0])
+            if valor is not _REJEITADO:
+                self.estados[i] = True
+                self.valores[i] = valor
+                mudou = True
+            elif primeiro:
+                self.estados[i] = False
+                mudou = True
+        if mudou:
+            self._atualizar()
     
-    return 0.0
+    def _atualizar(self) -> None:
+        for i, (estado, valor) in enumerate(zip(self.estados, self.valores)):
+            if estado is None:
+                return
+            if estado:
+                self.decidido = True
+                self.valor = valor
+                self.vencedor = i
+                return
+        self.decidido = True   # Todos falharam
+    
+    def finalizar(self) -> None:
+        """Fim da varredura: slots ainda pendentes falharam."""
+        self.estados = [False if e is None else e for e in self.estados]
+        self._atualizar()
+
+
+def _ordenar_cadeia(cadeia: list[tuple[str, tuple]], preferidos: Optional[list[str]]) -> list[tuple[str, tuple]]:
+    """
+    Reordena os fallbacks (rótulo, slot) pela ordem aprendida; rótulos
+    desconhecidos mantêm a ordem original, depois dos aprendidos. O seletor
+    do estado continua sempre em primeiro.
+    """
+    if not preferidos:
+        return cadeia
+    posicao = {rotulo: i for i, rotulo in enumerate(r for r in preferidos if r != ROTULO_ESTADO)}
+    estado = [item for item in cadeia if item[0] == ROTULO_ESTADO]
+    fallbacks = [item for item in cadeia if item[0] != ROTULO_ESTADO]
+    return estado + sorted(fallbacks, key=lambda item: posicao.get(item[0], len(posicao)))
 
 
-def _extract_data_emissao(soup: BeautifulSoup) -> Optional[str]:
+def _extract_campos(
+    soup: BeautifulSoup, selectors: EstadoSelectors, dicas: Optional[dict] = None,
+    texto_pagina: bool = True
+) -> tuple[dict, dict]:
     """
-    Extrai a data de emissão da nota fiscal.
+    Extrai estabelecimento, endereço, total e data de emissão em uma
+    única varredura da árvore, com saída antecipada.
     
-    Procura por padrões de data no formato dd/mm/aaaa no HTML.
+    Args:
+        dicas: Ordem aprendida das cadeias (selector_stats.SelectorStats.hints).
+        texto_pagina: Procurar endereço/data no texto da árvore inteira
+            quando nenhum seletor achar. Desligado na árvore parcial do
+            plano, que não tem o texto solto da página.
     
     Returns:
-        Data no formato ISO (YYYY-MM-DD) ou None se não encontrar.
-    """
-    from datetime import datetime
-    
-    # Padrões de data brasileira: dd/mm/aaaa ou dd/mm/aa
-    date_pattern = r'(\d{2})[/.-](\d{2})[/.-](\d{2,4})'
-    
-    # Procurar em elementos comuns que contêm data
-    selectors_data = [
-        "[class*='data']",
-        "[class*='emissao']",
-        ".infNFe",
-        "#infNFe",
-        "li",
-        "td",
-        "span"
-    ]
-    
-    for selector in selectors_data:
-        for elem in soup.select(selector):
-            text = elem.get_text()
-            match = re.search(date_pattern, text)
+        (campos, vencedores) — vencedores traz o rótulo do seletor que deu
+        o estabelecimento e o total ("estado" = seletor do estado).
+    """
+    dicas = dicas or {}
+    
+    cadeia_estab = []
+    if selectors.estabelecimento:
+        cadeia_estab.append((ROTULO_ESTADO, (selectors.estabelecimento, lambda t: _clean_text(t), True)))
+    cadeia_estab += [(sel, (sel, _avaliar_estabelecimento, True)) for sel in FALLBACK_ESTABELECIMENTO]
+    cadeia_estab = _ordenar_cadeia(cadeia_estab, dicas.get("estabelecimento"))
+    
+    cadeia_total = []
+    if selectors.total:
+        cadeia_total.append((ROTULO_ESTADO, (selectors.total, lambda t: _parse_money(t), True)))
+    cadeia_total += [(sel, (sel, _avaliar_total, True)) for sel in FALLBACK_TOTAL]
+    cadeia_total = _ordenar_cadeia(cadeia_total, dicas.get("total"))
+    
+    campos = {
+        "estabelecimento": _Campo([slot for _, slot in cadeia_estab]),
+        "endereco": _Campo([(sel, _avaliar_endereco, False) for sel in SELETORES_ENDERECO]),
+        "total": _Campo([slot for _, slot in cadeia_total]),
+        "data_emissao": _Campo([(sel, _parse_data_br_or_reject, False) for sel in SELETORES_DATA]),
+    }
+    pendentes = list(campos.values())
+    
+    for node in soup.descendants:
+        if not isinstance(node, Tag):
+            continue
+        texto = [None]
+        for campo in pendentes:
+            campo.visitar(node, texto)
+        if any(campo.decidido for campo in pendentes):
+            pendentes = [campo for campo in pendentes if not campo.decidido]
+            if not pendentes:
+                break
+    
+    for campo in pendentes:
+        campo.finalizar()
+    
+    vencedores = {
+        nome: cadeia[campos[nome].vencedor][0] if campos[nome].vencedor is not None else None
+        for nome, cadeia in (("estabelecimento", cadeia_estab), ("total", cadeia_total))
+    }
+    
+    estabelecimento = campos["estabelecimento"].valor
+    endereco = campos["endereco"].valor
+    total = campos["total"].valor
+    data_emissao = campos["data_emissao"].valor
+    
+    # Fallbacks sobre o texto da página inteira (calculado uma única vez)
+    if texto_pagina and (endereco is None or data_emissao is None):
+        full_text = soup.get_text()
+        if endereco is None:
+            match = _RE_ENDERECO_TEXTO.search(full_text)
             if match:
-                dia, mes, ano = match.groups()
-                
-                # Converter ano de 2 dígitos para 4
-                if len(ano) == 2:
-                    ano = "20" + ano if int(ano) < 50 else "19" + ano
-                
-                try:
-                    dt = datetime(int(ano), int(mes), int(dia))
-                    return dt.strftime("%Y-%m-%d")
-                except ValueError:
-                    continue
+                endereco = _clean_text(match.group(1))
+        if data_emissao is None:
+            data_emissao = _parse_data_br(full_text)
     
-    # Fallback: procurar no texto inteiro da página
-    full_text = soup.get_text()
-    match = re.search(date_pattern, full_text)
-    if match:
-        dia, mes, ano = match.groups()
-        if len(ano) == 2:
-            ano = "20" + ano if int(ano) < 50 else "19" + ano
-        try:
-            dt = datetime(int(ano), int(mes), int(dia))
-            return dt.strftime("%Y-%m-%d")
-        except ValueError:
-            pass
+    return {
+        "estabelecimento": estabelecimento if estabelecimento is not None else "Não identificado",
+        "endereco": endereco,
+        "total": total if total is not None else 0.0,
+        "data_emissao": data_emissao,
+    }, vencedores
+
+
+def _avaliar_estabelecimento(texto: str) -> Any:
+    nome = _clean_text(texto)
+    return nome if len(nome) > 3 else _REJEITADO
+
+
+def _avaliar_total(texto: str) -> Any:
+    valor = _parse_money(texto)
+    return valor if valor > 0 else _REJEITADO
+
+
+def _avaliar_endereco(texto: str) -> Any:
+    """
+    Aceita textos com padrões típicos de endereço brasileiro
+    (Rua, Av, Avenida, Travessa) e tamanho plausível.
+    """
+    if not _RE_ENDERECO.search(texto):
+        return _REJEITADO
+    endereco = _clean_text(texto)
+    return endereco if 10 < len(endereco) < 200 else _REJEITADO
+
+
+def _parse_data_br(texto: str) -> Optional[str]:
+    """
+    Converte a primeira data dd/mm/aaaa (ou dd/mm/aa) do texto para ISO.
+    
+    Returns:
+        Data no formato YYYY-MM-DD, ou None se não houver data válida.
+    """
+    match = _RE_DATA.search(texto)
+    if not match:
+        return None
+    dia, mes, ano = match.groups()
+    
+    # Converter ano de 2 dígitos para 4
+    if len(ano) == 2:
+        ano = "20" + ano if int(ano) < 50 else "19" + ano
     
-    return None
+    try:
+        return datetime(int(ano), int(mes), int(dia)).strftime("%Y-%m-%d")
+    except ValueError:
+        return None
 
 
+def _parse_data_br_or_reject(texto: str) -> Any:
+    data = _parse_data_br(texto)
+    return data if data is not None else _REJEITADO
+
+
+# ============================================================================
+# FUNÇÕES AUXILIARES DE EXTRAÇÃO
+# ============================================================================
+
 def _extract_itens(soup: BeautifulSoup, selectors: EstadoSelectors) -> list[dict]:
     """Extrai a lista de itens usando seletores específicos do estado."""
     itens = []
@@ -332,21 +1330,39 @@ def _extract_itens(soup: BeautifulSoup, selectors: EstadoSelectors) -> list[dict
     if not selectors.itens_container:
         return itens
     
-    rows = soup.select(selectors.itens_container)
+    linhas = []
+    for row in soup.select(selectors.itens_container):
+        linha = _read_item_row(row, selectors)
+        if linha and _is_valid_product(linha[1]):
+            linhas.append(linha)
     
-    for row in rows:
-        item = _extract_item_from_row(row, selectors)
-        if item and _is_valid_product(item["nome"]):
-            itens.append(item)
+    # Coluna de valores convertida de uma vez
+    valores = parse_money_batch(texto_valor for _, _, _, texto_valor in linhas)
+    
+    for (row, nome, qtd, _), valor in zip(linhas, valores):
+        if valor == 0:
+            # Tentar encontrar valor no texto da linha
+            valor = _find_money_in_text(row.get_text())
+        
+        itens.append({
+            "nome": nome,
+            "qtd": qtd if qtd > 0 else 1.0,
+            "valor": valor
+        })
     
     return itens
 
 
-def _extract_item_from_row(row: Tag, selectors: EstadoSelectors) -> Optional[dict]:
-    """Extrai dados de um único item de uma linha da tabela."""
+def _read_item_row(row: Tag, selectors: EstadoSelectors) -> Optional[tuple[Tag, str, float, str]]:
+    """
+    Lê nome, quantidade e o texto do valor de uma linha da tabela.
+    
+    Returns:
+        (linha, nome, qtd, texto_valor), ou None se a linha não tiver nome.
+    """
     nome = ""
     qtd = 1.0
-    valor = 0.0
+    texto_valor = ""
     
     # Extrair nome
     if selectors.item_nome:
@@ -369,21 +1385,13 @@ def _extract_item_from_row(row: Tag, selectors: EstadoSelectors) -> Optional[dic
         if elem:
             qtd = _parse_number(elem.get_text())
     
-    # Extrair valor
+    # Extrair texto do valor (convertido em lote por _extract_itens)
     if selectors.item_valor:
         elem = row.select_one(selectors.item_valor)
         if elem:
-            valor = _parse_money(elem.get_text())
-    
-    if valor == 0:
-        # Tentar encontrar valor no texto da linha
-        valor = _find_money_in_text(row.get_text())
+            texto_valor = elem.get_text()
     
-    return {
-        "nome": nome,
-        "qtd": qtd if qtd > 0 else 1.0,
-        "valor": valor
-    }
+    return row, nome, qtd, texto_valor
 
 
 def _extract_itens_generico(soup: BeautifulSoup) -> list[dict]:
@@ -430,120 +1438,3 @@ def _extract_itens_generico(soup: BeautifulSoup) -> list[dict]:
                     })
     
     return itens
-
-
-# ============================================================================
-# UTILITÁRIOS DE PARSING
-# ============================================================================
-
-def _clean_text(text: str) -> str:
-    """
-    Limpa o texto removendo espaços extras e metadados técnicos da nota.
-    
-    Transforma: "PRODUTO X (Código: 123) Qtd..." -> "PRODUTO X"
-    """
-    if not text:
-        return ""
-    
-    # 1. Normaliza espaços (transforma quebras de linha e tabs em um espaço só)
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    # 2. Corta o texto onde começa a parte técnica "(Código:" ou "(Cód."
-    # O regex procura por parenteses seguido de Codigo ou Cod
-    split_pattern = r'\s*\(C[óo]d'
-    text = re.split(split_pattern, text, flags=re.IGNORECASE)[0]
-    
-    return text.strip()
-
-
-def _is_valid_product(nome: str) -> bool:
-    """
-    Valida se o nome representa um produto real.
-    
-    Retorna False se:
-    - O nome for composto apenas por dígitos e espaços (chave de acesso da nota)
-    - O nome tiver mais de 10 caracteres numéricos consecutivos
-    - O nome estiver vazio ou muito curto
-    
-    Args:
-        nome: Nome do produto a ser validado.
-    
-    Returns:
-        True se for um produto válido, False caso contrário.
-    """
-    if not nome or len(nome) < 3:
-        return False
-    
-    # Remover espaços para verificar se é apenas números
-    nome_sem_espacos = nome.replace(' ', '')
-    
-    # Se for apenas dígitos e tiver mais de 10 caracteres, é chave de acesso
-    if nome_sem_espacos.isdigit() and len(nome_sem_espacos) > 10:
-        return False
-    
-    # Verificar se há sequência de mais de 15 dígitos (padrão de chave NFC-e)
-    if re.search(r'\d{15,}', nome_sem_espacos):
-        return False
-    
-    return True
-
-
-def _parse_money(text: str) -> float:
-    """
-    Converte texto com valor monetário para float.
-    Suporta formatos: R$ 1.234,56 / 1234.56 / 1234,56
-    """
-    if not text:
-        return 0.0
-    
-    # Remover símbolos de moeda e espaços
-    text = re.sub(r'[R$\s]', '', text)
-    
-    # Detectar formato brasileiro (1.234,56) vs americano (1,234.56)
-    if ',' in text and '.' in text:
-        # Formato brasileiro: 1.234,56
-        if text.rfind(',') > text.rfind('.'):
-            text = text.replace('.', '').replace(',', '.')
-        else:
-            # Formato americano: 1,234.56
-            text = text.replace(',', '')
-    elif ',' in text:
-        # Apenas vírgula: 1234,56 (brasileiro)
-        text = text.replace(',', '.')
-    
-    try:
-        return float(text)
-    except ValueError:
-        return 0.0
-
-
-def _parse_number(text: str) -> float:
-    """Extrai um número de um texto."""
-    if not text:
-        return 0.0
-    
-    # Procurar padrão numérico
-    match = re.search(r'[\d.,]+', text)
-    if match:
-        return _parse_money(match.group())
-    
-    return 0.0
-
-
-def _find_money_in_text(text: str) -> float:
-    """Procura valor monetário em um texto livre."""
-    # Padrão: R$ X.XXX,XX ou X.XXX,XX ou X,XX
-    patterns = [
-        r'R\$\s*([\d.,]+)',
-        r'([\d]+[.,][\d]{2})\s*$',
-        r'([\d]+[.,][\d]{3}[.,][\d]{2})',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text)
-        if match:
-            value = _parse_money(match.group(1) if match.groups() else match.group())
-            if value > 0:
-                return value
-    
-    return 0.0
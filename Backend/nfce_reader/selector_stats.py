@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo Selector Stats - Ordem das cadeias de seletores aprendida por layout.
+
+O scraper tenta cada campo (estabelecimento, total) por uma cadeia fixa
+de seletores. Aqui é registrado qual seletor realmente venceu em cada
+layout (estado + host da SEFAZ) e os fallbacks da cadeia são reordenados
+para que o vencedor habitual seja tentado primeiro. O seletor do estado
+continua sempre em primeiro: o aprendizado não muda qual valor vence
+quando ele acha o campo.
+
+Também é aprendido quando um layout só tem itens pelo fallback genérico
+(tabela/lista qualquer): nesses layouts o parse parcial do plano, que
+nunca acharia os itens, é pulado. A ordem de extração não muda.
+
+As estatísticas são gravadas em NFCE_SELECTOR_STATS_FILE (JSON) e
+sobrevivem a reinícios. Cada worker do gunicorn tem as suas em memória;
+ao gravar, o arquivo é relido sob uma trava e recebe só as contagens
+registradas pelo processo desde a última gravação (nenhum worker apaga o
+que os outros aprenderam).
+"""
+
+import atexit
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: gravações concorrentes sem trava
+    fcntl = None
+
+
+# ============================================================================
+# CONFIGURAÇÃO
+# ============================================================================
+
+STATS_FILE = os.getenv("NFCE_SELECTOR_STATS_FILE", "./seletores_nfce.json")
+STATS_ENABLED = os.getenv("NFCE_SELECTOR_LEARNING", "1") not in ("0", "false", "False")
+
+MIN_OBSERVACOES = 3         # Vitórias antes de reordenar uma cadeia
+GENERICO_MIN_RAZAO = 0.9    # Fração de páginas só com itens genéricos
+DECAIMENTO_ACIMA_DE = 1000  # Contagens são divididas por 2 acima disso
+SALVAR_A_CADA = 50          # Registros entre gravações em disco
+
+CAMPOS_APRENDIDOS = ("estabelecimento", "total")
+ITENS_ESTADO = "estado"
+ITENS_GENERICO = "generico"
+
+
+# ============================================================================
+# ESTATÍSTICAS
+# ============================================================================
+
+class SelectorStats:
+    """
+    Contagem de vitórias por (layout, campo, seletor).
+
+    Formato: {layout: {"estabelecimento": {rotulo: n}, "total": {...},
+                       "itens": {"estado": n, "generico": n}, "parses": n}}
+    """
+
+    def __init__(self, caminho: Optional[str] = STATS_FILE):
+        self.caminho = Path(caminho) if caminho else None
+        self._dados: dict[str, dict] = {}
+        # Contagens registradas desde a última gravação (mesmo formato)
+        self._novos: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._pendentes = 0
+        self._dados = self._ler()
+
+    def _ler(self) -> dict:
+        if self.caminho is None or not self.caminho.exists():
+            return {}
+        try:
+            return json.loads(self.caminho.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"[AVISO] Estatísticas de seletores ignoradas ({self.caminho}): {e}")
+            return {}
+
+    def save(self) -> None:
+        """
+        Soma as contagens deste processo às do arquivo e grava (escrita
+        atômica, sob trava entre processos). As estatísticas em memória
+        passam a ser as do arquivo, com o que os outros workers gravaram.
+        """
+        if self.caminho is None:
+            return
+        with self._lock:
+            novos, self._novos = self._novos, {}
+            self._pendentes = 0
+        tmp = self.caminho.with_name(f"{self.caminho.name}.{os.getpid()}.tmp")
+        try:
+            self.caminho.parent.mkdir(parents=True, exist_ok=True)
+            with _trava(self.caminho):
+                dados = _somar(self._ler(), novos)
+                tmp.write_text(json.dumps(dados, ensure_ascii=False, indent=1), encoding="utf-8")
+                os.replace(tmp, self.caminho)
+        except OSError as e:
+            print(f"[AVISO] Falha ao gravar estatísticas de seletores: {e}")
+            with self._lock:
+                # Ficam para a próxima gravação
+                self._novos = _somar(novos, self._novos, normalizar=False)
+            return
+        with self._lock:
+            # Registros feitos durante a gravação: as regras de peso valem na próxima
+            self._dados = _somar(dados, self._novos, normalizar=False)
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def hints(self, layout: str) -> dict:
+        """
+        Ordem preferida de cada cadeia e se o layout só tem itens genéricos.
+
+        Returns:
+            {"estabelecimento": [rotulos], "total": [rotulos], "generico_primeiro": bool}
+        """
+        with self._lock:
+            dados = self._dados.get(layout)
+            if dados is None:
+                return {}
+            hints = {}
+            for campo in CAMPOS_APRENDIDOS:
+                vitorias = dados.get(campo, {})
+                ordem = [r for r, n in sorted(vitorias.items(), key=lambda kv: -kv[1]) if n >= MIN_OBSERVACOES]
+                if ordem:
+                    hints[campo] = ordem
+
+            itens = dados.get("itens", {})
+            estado = itens.get(ITENS_ESTADO, 0)
+            generico = itens.get(ITENS_GENERICO, 0)
+            total = estado + generico
+            hints["generico_primeiro"] = total >= MIN_OBSERVACOES and generico / total >= GENERICO_MIN_RAZAO
+            return hints
+
+    # ------------------------------------------------------------------
+    # Registro
+    # ------------------------------------------------------------------
+
+    def record(self, layout: str, vencedores: dict) -> None:
+        """
+        Registra o resultado de um parse.
+
+        Args:
+            vencedores: {"estabelecimento": rotulo|None, "total": rotulo|None,
+                         "itens": "estado"|"generico"|None}
+        """
+        registro = {"parses": 1}
+        for campo in CAMPOS_APRENDIDOS + ("itens",):
+            rotulo = vencedores.get(campo)
+            if rotulo is not None:
+                registro[campo] = {rotulo: 1}
+        salvar = False
+        with self._lock:
+            _somar(self._dados, {layout: registro})
+            _somar(self._novos, {layout: registro}, normalizar=False)
+            self._pendentes += 1
+            salvar = self._pendentes >= SALVAR_A_CADA
+        if salvar:
+            self.save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return json.loads(json.dumps(self._dados))
+
+
+def _somar(destino: dict, novos: dict, normalizar: bool = True) -> dict:
+    """
+    Acumula as contagens de `novos` em `destino` (alterado e devolvido).
+
+    Com `normalizar`, aplica as regras de peso sobre o total: cada página
+    com itens pelos seletores do estado divide por 2 o histórico do
+    fallback genérico (os seletores voltaram a funcionar), e contagens
+    acima de DECAIMENTO_ACIMA_DE dividem a cadeia por 2 (layouts mudam: o
+    histórico antigo perde peso).
+    """
+    for layout, campos in novos.items():
+        dados = destino.setdefault(layout, {})
+        dados["parses"] = dados.get("parses", 0) + campos.get("parses", 0)
+        for campo in CAMPOS_APRENDIDOS + ("itens",):
+            contagem = dados.setdefault(campo, {}) if campo in campos else dados.get(campo)
+            for rotulo, n in campos.get(campo, {}).items():
+                contagem[rotulo] = contagem.get(rotulo, 0) + n
+            if not normalizar or not contagem:
+                continue
+            if campo == "itens" and ITENS_GENERICO in contagem:
+                contagem[ITENS_GENERICO] >>= min(campos.get("itens", {}).get(ITENS_ESTADO, 0), 63)
+            while max(contagem.values()) > DECAIMENTO_ACIMA_DE:
+                for rotulo in list(contagem):
+                    contagem[rotulo] //= 2
+    return destino
+
+
+@contextmanager
+def _trava(caminho: Path) -> Iterator[None]:
+    """Trava exclusiva entre processos num arquivo .lock ao lado de `caminho`."""
+    if fcntl is None:
+        yield
+        return
+    with open(caminho.with_name(f"{caminho.name}.lock"), "a") as arquivo:
+        fcntl.flock(arquivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+
+# ============================================================================
+# SINGLETON
+# ============================================================================
+
+_stats: Optional[SelectorStats] = None
+_stats_lock = threading.Lock()
+
+
+def get_selector_stats() -> Optional[SelectorStats]:
+    """Estatísticas globais, ou None se NFCE_SELECTOR_LEARNING=0."""
+    global _stats
+    if not STATS_ENABLED:
+        return None
+    if _stats is None:
+        with _stats_lock:
+            if _stats is None:
+                _stats = SelectorStats(STATS_FILE)
+                atexit.register(_stats.save)
+    return _stats
+
+
+def layout_key(estado: str, host: Optional[str] = None) -> str:
+    """Chave do layout: estado + host da SEFAZ (quando conhecido)."""
+    estado = estado.upper()
+    return f"{estado}@{host.lower()}" if host else estado
@@ -11,8 +11,9 @@ Execute com:
     uvicorn nfce_reader.server:app --host 0.0.0.0 --port 8000 --reload
 """
 
+import asyncio
 import os
-import tempfile
+import sys
 import uuid
 from datetime import datetime
 from typing import List
@@ -24,11 +25,25 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 import scraper, models
-# decoder removido - agora usamos scanner nativo no celular
+from access_key import extract_chave, find_chave_candidata
+from parse_cache import get_parse_cache
+from resilience import get_host_stats
+from selector_stats import get_selector_stats
+from xml_import import import_nfce_xml, iter_xml_streams
+from workers import (
+    get_scan_pool,
+    get_parse_pool,
+    get_decode_pool,
+    configure_default_limiter,
+    default_limiter_stats,
+    shutdown_pools
+)
+# decoder é importado só em /decode/imagem: o celular usa scanner nativo e
+# os demais endpoints não precisam carregar o OpenCV
 from database import (
     create_tables,
     get_db,
-    get_nota_by_url,
+    get_nota_by_chave,
     create_nota,
     get_all_notas,
     delete_nota,
@@ -43,6 +58,9 @@ from database import (
 # CONFIGURAÇÃO DA APLICAÇÃO
 # ============================================================================
 
+# Tamanho máximo da foto enviada para /decode/imagem
+MAX_UPLOAD_BYTES = int(os.getenv("NFCE_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+
 app = FastAPI(
     title="NFC-e Reader API",
     description=(
@@ -77,6 +95,26 @@ def startup():
         db.close()
 
 
+@app.on_event("startup")
+async def configurar_pools():
+    """Aplica NFCE_DB_WORKERS ao pool de threads dos handlers síncronos."""
+    configure_default_limiter()
+    
+    # Sobe os processos de parse em segundo plano (o 1º scan não paga o spawn)
+    pool = get_parse_pool()
+    if pool is not None:
+        pool.aquecer(scraper.parse_nfce_bytes, b"", "GENERICO")
+
+
+@app.on_event("shutdown")
+async def encerrar_pools():
+    await scraper.close_async_client()
+    shutdown_pools()
+    stats = get_selector_stats()
+    if stats is not None:
+        stats.save()
+
+
 # ============================================================================
 # ENDPOINTS
 # ============================================================================
@@ -105,6 +143,71 @@ async def health_check():
     }
 
 
+@app.get("/metrics/workers")
+async def metricas_workers():
+    """
+    Métricas dos pools de execução.
+    
+    - `scan`: pool dedicado ao pipeline /scan/url
+    - `default`: pool do FastAPI para os demais handlers (DB)
+    - `decode`: processos de /decode/imagem
+    """
+    decode_pool = get_decode_pool()
+    return {
+        "scan": get_scan_pool().stats(),
+        "default": default_limiter_stats(),
+        "decode": decode_pool.stats() if decode_pool is not None else None
+    }
+
+
+@app.get("/metrics/decode")
+async def metricas_decode():
+    """
+    Métricas de /decode/imagem (null até a primeira foto: o OpenCV ainda
+    não foi carregado).
+    
+    - `cache`: acertos do cache de fotos repetidas
+    - `escada`: tentativas, sucessos e ms médio por estágio da escada e
+      por motor de QR Code
+    - `motores`: taxa de acerto recente de cada motor (ordem da política auto)
+    
+    `escada` e `motores` só existem com NFCE_DECODE_WORKERS=0 (decode em
+    thread): com o pool, cada processo filho tem os seus contadores.
+    """
+    decoder = sys.modules.get("decoder")
+    if decoder is None:
+        return {"cache": None, "escada": None, "motores": None}
+    em_thread = get_decode_pool() is None
+    return {
+        "cache": decoder.get_decode_cache().stats(),
+        "escada": decoder.get_decode_stats().stats() if em_thread else None,
+        "motores": decoder.engine_stats() if em_thread else None,
+    }
+
+
+@app.get("/metrics/hosts")
+async def metricas_hosts():
+    """
+    Estado do circuit breaker e contadores de retentativa por host da SEFAZ.
+    """
+    return {"hosts": get_host_stats()}
+
+
+@app.get("/metrics/parse")
+async def metricas_parse():
+    """
+    Acertos/falhas do cache de parse, latência (p50/p90/p99) do pool de
+    processos e ordem dos seletores aprendida por layout.
+    """
+    pool = get_parse_pool()
+    seletores = get_selector_stats()
+    return {
+        "cache": get_parse_cache().stats(),
+        "pool": pool.stats() if pool is not None else None,
+        "seletores": seletores.stats() if seletores is not None else None
+    }
+
+
 @app.post("/scan")
 async def scan_nfce_deprecated():
     """
@@ -135,6 +238,52 @@ async def decode_only_deprecated():
     )
 
 
+@app.post("/decode/imagem")
+async def decode_imagem(
+    arquivo: UploadFile = File(..., description="Foto do QR Code da NFC-e (jpg, png)")
+):
+    """
+    Decodifica o QR Code de uma foto enviada (clientes web sem scanner nativo).
+    
+    A imagem é decodificada em memória, sem arquivo temporário, em um
+    processo do pool de decode. Retorna a URL para ser enviada a /scan/url.
+    """
+    dados = await arquivo.read(MAX_UPLOAD_BYTES + 1)
+    if len(dados) > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail={"error": "image_too_large", "message": f"Imagem maior que {MAX_UPLOAD_BYTES} bytes"}
+        )
+    
+    import decoder
+    
+    pool = get_decode_pool()
+    try:
+        if pool is None:
+            url = await asyncio.to_thread(decoder.decode_qr_from_bytes, dados)
+        else:
+            # Cache consultado aqui: cada processo do pool teria o seu.
+            # Uma foto só parecida vai ao pool com a dica da região do QR Code
+            cache = decoder.get_decode_cache()
+            impressao = await asyncio.to_thread(decoder.image_fingerprint, dados)
+            dica = cache.get(impressao)
+            if dica is not None and dica.exato:
+                url = dica.url
+            else:
+                url, regiao = await pool.run(decoder.decode_qr_with_hint, dados, dica)
+                cache.registrar(impressao, dica, url, regiao)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"error": "invalid_image", "message": str(e)})
+    
+    if url is None:
+        raise HTTPException(
+            status_code=422,
+            detail={"error": "qr_not_found", "message": "Nenhum QR Code encontrado na imagem"}
+        )
+    
+    return {"success": True, "url": url, "chave_acesso": extract_chave(url)}
+
+
 @app.post("/scan/url")
 async def scan_from_url(
     url: str = Query(..., description="URL do QR Code da NFC-e"),
@@ -152,19 +301,53 @@ async def scan_from_url(
             detail={"error": "invalid_url", "message": "URL inválida"}
         )
     
-    # Verificar duplicidade
-    nota_existente = get_nota_by_url(db, url)
+    # Chave de acesso validada localmente (DV módulo 11) antes de
+    # qualquer acesso à SEFAZ
+    url = url.strip()
+    chave = extract_chave(url)
+    if chave is None:
+        candidata = find_chave_candidata(url)
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "invalid_key",
+                "message": (
+                    f"Chave de acesso inválida: {candidata}" if candidata
+                    else "URL sem chave de acesso de NFC-e"
+                )
+            }
+        )
+    
+    # Trabalho bloqueante (DB, Groq) roda no pool de scan; o download
+    # da SEFAZ usa o cliente assíncrono com conexões reaproveitadas.
+    scan_pool = get_scan_pool()
+    
+    # Verificar duplicidade pela chave (mesma nota, URLs diferentes)
+    nota_existente = await scan_pool.run(get_nota_by_chave, db, chave, url)
     if nota_existente:
         return JSONResponse(
             status_code=200,
-            content=nota_existente.to_dict(include_cached=True)
+            content=await scan_pool.run(nota_existente.to_dict, include_cached=True)
         )
     
     # Fazer scraping da NFC-e
     try:
-        print(f"[SCAN/URL] Iniciando scraping de: {url[:80]}...")
-        data = scraper.scrape_nfce(url, "RS")
+        estado = scraper.detect_estado(url)
+        print(f"[SCAN/URL] Iniciando scraping ({estado}) de: {url[:80]}...")
+        data = await scraper.scrape_nfce_async(url, estado)
         print(f"[SCAN/URL] Resultado: {data}")
+    except scraper.HostIndisponivelError as e:
+        # Circuito aberto: falha rápida sem ocupar workers com a SEFAZ fora do ar
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "error": "sefaz_unavailable",
+                "message": str(e),
+                "host": e.host,
+                "retry_after": round(e.retry_after)
+            },
+            headers={"Retry-After": str(round(e.retry_after))}
+        )
     except Exception as e:
         import traceback
         print(f"[SCAN/URL] ERRO: {str(e)}")
@@ -180,25 +363,27 @@ async def scan_from_url(
             detail={"error": "parse_failed", "message": "Não foi possível extrair dados da nota"}
         )
     
-    # Salvar no banco
-    nova_nota = create_nota(
+    # Salvar no banco (inclui classificação em lote via Groq)
+    nova_nota = await scan_pool.run(
+        create_nota,
         db=db,
         url=url,
         estabelecimento=data.get("estabelecimento", "Não identificado"),
         total=float(data.get("total", 0.0)),
         itens=data.get("itens", []),
         data_emissao=data.get("data_emissao"),
-        endereco=data.get("endereco")
+        endereco=data.get("endereco"),
+        chave_acesso=chave
     )
     
     return JSONResponse(
         status_code=200,
-        content=nova_nota.to_dict(include_cached=False)
+        content=await scan_pool.run(nova_nota.to_dict, include_cached=False)
     )
 
 
 @app.get("/notas")
-async def listar_notas(
+def listar_notas(
     busca: str = Query(default=None, description="Busca por estabelecimento ou nome de produto"),
     data_inicio: str = Query(default=None, description="Data inicial (YYYY-MM-DD)"),
     data_fim: str = Query(default=None, description="Data final (YYYY-MM-DD)"),
@@ -274,7 +459,7 @@ async def listar_notas(
 
 
 @app.get("/notas/{nota_id}")
-async def obter_nota(
+def obter_nota(
     nota_id: int,
     db: Session = Depends(get_db)
 ):
@@ -303,7 +488,7 @@ class NotaManualRequest(BaseModel):
     itens: list[ItemManual]
 
 @app.post("/notas/manual")
-async def criar_nota_manual(
+def criar_nota_manual(
     request: NotaManualRequest,
     db: Session = Depends(get_db)
 ):
@@ -372,8 +557,30 @@ async def criar_nota_manual(
     }
 
 
+@app.post("/notas/xml")
+def importar_notas_xml(
+    arquivo: UploadFile = File(..., description="XML da NFC-e (nfeProc) ou .zip com vários XMLs"),
+    db: Session = Depends(get_db)
+):
+    """
+    Importa NFC-e a partir do XML oficial (sem scraping da SEFAZ).
+    
+    O arquivo é lido em streaming; notas já cadastradas (mesma chave
+    de acesso) são ignoradas.
+    """
+    resultado = import_nfce_xml(db, iter_xml_streams(arquivo.filename or "", arquivo.file))
+    
+    if resultado["importadas"] == 0 and resultado["duplicadas"] == 0:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "invalid_xml", "message": "Nenhuma NFC-e válida encontrada no arquivo"}
+        )
+    
+    return {"success": True, **resultado}
+
+
 @app.get("/itens/busca")
-async def buscar_itens(
+def buscar_itens(
     q: str = Query(..., min_length=2, description="Termo de busca (mínimo 2 caracteres)"),
     limit: int = Query(default=50, ge=1, le=200),
     db: Session = Depends(get_db)
@@ -447,7 +654,7 @@ async def buscar_itens(
 
 
 @app.get("/itens/categoria/{categoria_id}")
-async def listar_itens_por_categoria(
+def listar_itens_por_categoria(
     categoria_id: int,
     data_inicio: str = Query(default=None, description="Data inicial (YYYY-MM-DD)"),
     data_fim: str = Query(default=None, description="Data final (YYYY-MM-DD)"),
@@ -528,7 +735,7 @@ async def listar_itens_por_categoria(
 
 
 @app.get("/itens/fornecedor")
-async def listar_itens_por_fornecedor(
+def listar_itens_por_fornecedor(
     estabelecimento: str = Query(..., description="Nome do estabelecimento"),
     data_inicio: str = Query(default=None, description="Data inicial (YYYY-MM-DD)"),
     data_fim: str = Query(default=None, description="Data final (YYYY-MM-DD)"),
@@ -610,7 +817,7 @@ async def listar_itens_por_fornecedor(
 
 
 @app.delete("/notas/{nota_id}")
-async def deletar_nota(
+def deletar_nota(
     nota_id: int,
     db: Session = Depends(get_db)
 ):
@@ -624,7 +831,7 @@ async def deletar_nota(
 
 
 @app.put("/estabelecimento/renomear")
-async def renomear_estabelecimento(
+def renomear_estabelecimento(
     nome_atual: str = Query(..., description="Nome atual do estabelecimento"),
     novo_nome: str = Query(..., description="Novo nome (apelido) para o estabelecimento"),
     db: Session = Depends(get_db)
@@ -666,7 +873,7 @@ async def renomear_estabelecimento(
 # ============================================================================
 
 @app.get("/categorias")
-async def listar_categorias(db: Session = Depends(get_db)):
+def listar_categorias(db: Session = Depends(get_db)):
     """Lista todas as categorias disponíveis."""
     categorias = db.query(CategoriaDB).order_by(CategoriaDB.nome).all()
     return {
@@ -676,7 +883,7 @@ async def listar_categorias(db: Session = Depends(get_db)):
 
 
 @app.post("/categorias")
-async def criar_categoria(
+def criar_categoria(
     nome: str = Query(..., min_length=2, max_length=50),
     icone: str = Query(..., min_length=1, max_length=10),
     cor: str = Query(default="#666666", regex="^#[0-9A-Fa-f]{6}$"),
@@ -703,7 +910,7 @@ async def criar_categoria(
 
 
 @app.put("/item/{item_id}/categoria")
-async def atualizar_categoria_item(
+def atualizar_categoria_item(
     item_id: int,
     categoria_id: int = Query(..., description="ID da nova categoria"),
     db: Session = Depends(get_db)
@@ -752,7 +959,7 @@ async def atualizar_categoria_item(
 # ============================================================================
 
 @app.get("/dashboard/resumo")
-async def dashboard_resumo(
+def dashboard_resumo(
     data_inicio: str = Query(default=None, description="Data inicial (YYYY-MM-DD)"),
     data_fim: str = Query(default=None, description="Data final (YYYY-MM-DD)"),
     db: Session = Depends(get_db)
@@ -835,7 +1042,7 @@ async def dashboard_resumo(
 
 
 @app.get("/dashboard/fornecedores")
-async def dashboard_fornecedores(
+def dashboard_fornecedores(
     data_inicio: str = Query(default=None, description="Data inicial (YYYY-MM-DD)"),
     data_fim: str = Query(default=None, description="Data final (YYYY-MM-DD)"),
     limit: int = Query(default=10, ge=1, le=50, description="Limite de fornecedores"),
@@ -910,7 +1117,7 @@ async def dashboard_fornecedores(
 
 
 @app.get("/dashboard/estatisticas")
-async def dashboard_estatisticas(
+def dashboard_estatisticas(
     data_inicio: str = Query(default=None, description="Data inicial (YYYY-MM-DD)"),
     data_fim: str = Query(default=None, description="Data final (YYYY-MM-DD)"),
     db: Session = Depends(get_db)
@@ -1004,7 +1211,7 @@ class ChatRequest(BaseModel):
     history: list = []
 
 @app.post("/api/chat")
-async def chat_with_ai(
+def chat_with_ai(
     request: ChatRequest,
     db: Session = Depends(get_db)
 ):
@@ -1053,17 +1260,6 @@ async def chat_with_ai(
     return response
 
 
-# ============================================================================
-# UTILITÁRIOS
-# ============================================================================
-
-def _get_extension(filename: str) -> str:
-    """Extrai a extensão do arquivo."""
-    if "." in filename:
-        return "." + filename.rsplit(".", 1)[-1].lower()
-    return ".jpg"
-
-
 # ============================================================================
 # EXECUÇÃO DIRETA
 # ============================================================================
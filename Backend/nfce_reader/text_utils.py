@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo Text Utils - Limpeza de texto e conversão de valores das NFC-e.
+
+Funções chamadas várias vezes por linha de item, então evitam regex
+sempre que uma operação de string resolve, usam padrões pré-compilados
+no resto e têm caminho rápido para o formato mais comum ("1.234,56").
+"""
+
+import re
+from typing import Iterable
+
+
+# ============================================================================
+# PADRÕES PRÉ-COMPILADOS
+# ============================================================================
+
+# Início dos metadados técnicos do item: "(Código: 123)", "(Cód. 123)"
+_RE_CODIGO = re.compile(r'\s*\(C[óo]d', re.IGNORECASE)
+
+# Formato brasileiro canônico: 1.234,56 / 12,90
+_RE_MOEDA_BR = re.compile(r'\d{1,3}(?:\.\d{3})*,\d{2}')
+
+_RE_NUMERO = re.compile(r'[\d.,]+')
+_RE_SEQUENCIA_CHAVE = re.compile(r'\d{15,}')
+
+_PADROES_MOEDA_TEXTO = (
+    re.compile(r'R\$\s*([\d.,]+)'),
+    re.compile(r'([\d]+[.,][\d]{2})\s*$'),
+    re.compile(r'([\d]+[.,][\d]{3}[.,][\d]{2})'),
+)
+
+
+# ============================================================================
+# TEXTO
+# ============================================================================
+
+def clean_text(text: str) -> str:
+    """
+    Limpa o texto removendo espaços extras e metadados técnicos da nota.
+
+    Transforma: "PRODUTO X (Código: 123) Qtd..." -> "PRODUTO X"
+    """
+    if not text:
+        return ""
+
+    # Normaliza espaços (str.split() usa o mesmo conjunto de \s do regex)
+    text = " ".join(text.split())
+
+    # Corta o texto onde começa a parte técnica "(Código:" ou "(Cód."
+    if "(" in text:
+        match = _RE_CODIGO.search(text)
+        if match:
+            text = text[:match.start()]
+
+    return text.strip()
+
+
+def is_valid_product(nome: str) -> bool:
+    """
+    Valida se o nome representa um produto real.
+
+    Retorna False se:
+    - O nome for composto apenas por dígitos e espaços (chave de acesso da nota)
+    - O nome tiver mais de 15 caracteres numéricos consecutivos
+    - O nome estiver vazio ou muito curto
+    """
+    if not nome or len(nome) < 3:
+        return False
+
+    nome_sem_espacos = nome.replace(' ', '')
+
+    # Se for apenas dígitos e tiver mais de 10 caracteres, é chave de acesso
+    if nome_sem_espacos.isdigit() and len(nome_sem_espacos) > 10:
+        return False
+
+    # Sequência de 15+ dígitos (padrão de chave NFC-e)
+    if len(nome_sem_espacos) >= 15 and _RE_SEQUENCIA_CHAVE.search(nome_sem_espacos):
+        return False
+
+    return True
+
+
+# ============================================================================
+# VALORES
+# ============================================================================
+
+def parse_money(text: str) -> float:
+    """
+    Converte texto com valor monetário para float.
+    Suporta formatos: R$ 1.234,56 / 1234.56 / 1234,56
+    """
+    if not text:
+        return 0.0
+
+    # Remover símbolos de moeda e espaços
+    text = "".join(text.split()).replace("R", "").replace("$", "")
+
+    # Caminho rápido: formato brasileiro canônico
+    if _RE_MOEDA_BR.fullmatch(text):
+        return float(text.replace('.', '').replace(',', '.'))
+
+    # Detectar formato brasileiro (1.234,56) vs americano (1,234.56)
+    if ',' in text and '.' in text:
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        # Apenas vírgula: 1234,56 (brasileiro)
+        text = text.replace(',', '.')
+
+    try:
+        return float(text)
+    except ValueError:
+        return 0.0
+
+
+def parse_money_batch(textos: Iterable[str]) -> list[float]:
+    """
+    Converte uma coluna inteira de valores monetários.
+
+    Valores repetidos (comuns em notas: "1,00", "UN") são convertidos
+    uma única vez.
+    """
+    cache: dict[str, float] = {}
+    resultado = []
+    append = resultado.append
+    for texto in textos:
+        valor = cache.get(texto)
+        if valor is None:
+            valor = cache[texto] = parse_money(texto)
+        append(valor)
+    return resultado
+
+
+def parse_number(text: str) -> float:
+    """Extrai um número de um texto."""
+    if not text:
+        return 0.0
+
+    match = _RE_NUMERO.search(text)
+    if match:
+        return parse_money(match.group())
+
+    return 0.0
+
+
+def find_money_in_text(text: str) -> float:
+    """Procura valor monetário em um texto livre."""
+    # Padrão: R$ X.XXX,XX ou X.XXX,XX ou X,XX
+    for pattern in _PADROES_MOEDA_TEXTO:
+        match = pattern.search(text)
+        if match:
+            value = parse_money(match.group(1))
+            if value > 0:
+                return value
+
+    return 0.0
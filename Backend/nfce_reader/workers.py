@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo Workers - Pools de execução para trabalho bloqueante da API.
+
+Os handlers do FastAPI rodam no event loop do uvicorn. Qualquer chamada
+bloqueante feita ali (requests, SDK do Groq, SQLAlchemy) congela todas as
+outras requisições do mesmo worker. Este módulo oferece pools de threads
+limitados, com métricas de fila, para tirar esse trabalho do loop.
+
+O parse do HTML (CPU puro, segura o GIL) vai para um pool de processos,
+para que vários scans simultâneos não fiquem serializados no mesmo
+worker do gunicorn.
+
+Configuração por variáveis de ambiente:
+    NFCE_SCAN_WORKERS:    threads para scraping + classificação (padrão: 8)
+    NFCE_DB_WORKERS:      threads para handlers síncronos/DB (padrão: 40)
+    NFCE_PARSE_PROCESSES: processos para parse_nfce, 0 = parse em thread
+                          (padrão: núcleos / workers do gunicorn, lidos de
+                          WEB_CONCURRENCY; mínimo 1)
+    NFCE_DECODE_WORKERS:  processos para decodificar QR Codes enviados por
+                          upload, 0 = decodifica em thread (padrão: 2)
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterable, Optional
+
+
+# ============================================================================
+# CONFIGURAÇÃO
+# ============================================================================
+
+SCAN_WORKERS = int(os.getenv("NFCE_SCAN_WORKERS", "8"))
+DB_WORKERS = int(os.getenv("NFCE_DB_WORKERS", "40"))
+
+
+def _processos_parse_padrao() -> int:
+    """Divide os núcleos entre os workers do gunicorn (cada um tem seu pool)."""
+    workers = int(os.getenv("WEB_CONCURRENCY", "1") or "1")
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+PARSE_PROCESSES = int(os.getenv("NFCE_PARSE_PROCESSES", str(_processos_parse_padrao())))
+DECODE_WORKERS = int(os.getenv("NFCE_DECODE_WORKERS", "2"))
+
+
+# ============================================================================
+# POOL DE THREADS COM MÉTRICAS
+# ============================================================================
+
+class BoundedThreadPool:
+    """
+    Pool de threads de tamanho fixo com contadores de fila.
+
+    Uso dentro de um handler async:
+        resultado = await pool.run(funcao_bloqueante, arg1, arg2)
+    """
+
+    def __init__(self, nome: str, max_workers: int):
+        self.nome = nome
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix=f"nfce-{nome}"
+        )
+        self._lock = threading.Lock()
+        self._pendentes = 0      # Submetidas e ainda não concluídas
+        self._em_execucao = 0    # Rodando em alguma thread agora
+        self._concluidas = 0
+        self._falhas = 0
+        self._pico_fila = 0
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Executa `func` no pool sem bloquear o event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._pendentes += 1
+            fila = self._pendentes - self._em_execucao
+            self._pico_fila = max(self._pico_fila, fila)
+        try:
+            return await loop.run_in_executor(
+                self._executor,
+                functools.partial(self._executar, func, *args, **kwargs)
+            )
+        finally:
+            with self._lock:
+                self._pendentes -= 1
+
+    def _executar(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Wrapper executado na thread do pool (mantém os contadores)."""
+        with self._lock:
+            self._em_execucao += 1
+        try:
+            resultado = func(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._falhas += 1
+            raise
+        finally:
+            with self._lock:
+                self._em_execucao -= 1
+        with self._lock:
+            self._concluidas += 1
+        return resultado
+
+    def stats(self) -> dict:
+        """Retorna um snapshot das métricas do pool."""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "em_execucao": self._em_execucao,
+                "na_fila": max(0, self._pendentes - self._em_execucao),
+                "pico_fila": self._pico_fila,
+                "concluidas": self._concluidas,
+                "falhas": self._falhas,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Encerra o pool (chamado no shutdown da aplicação)."""
+        self._executor.shutdown(wait=wait)
+
+
+# ============================================================================
+# POOL DE PROCESSOS (CPU)
+# ============================================================================
+
+class LatencyTracker:
+    """Janela das últimas latências (ms) para cálculo de percentis."""
+
+    def __init__(self, janela: int = 1000):
+        self._amostras: deque[float] = deque(maxlen=janela)
+        self._lock = threading.Lock()
+
+    def record(self, ms: float) -> None:
+        with self._lock:
+            self._amostras.append(ms)
+
+    def percentiles(self) -> dict:
+        with self._lock:
+            amostras = sorted(self._amostras)
+        if not amostras:
+            return {"p50_ms": None, "p90_ms": None, "p99_ms": None}
+        n = len(amostras)
+        return {
+            f"p{p}_ms": round(amostras[min(n - 1, int(n * p / 100))], 2)
+            for p in (50, 90, 99)
+        }
+
+
+class BoundedProcessPool:
+    """
+    Pool de processos com contadores de fila e percentis de latência.
+
+    Os processos são criados com "spawn" (seguro com as threads do
+    servidor) e só na primeira tarefa. `func` e argumentos precisam ser
+    serializáveis: mantenha-os pequenos (ex.: bytes do HTML).
+    """
+
+    def __init__(self, nome: str, max_workers: int):
+        self.nome = nome
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pendentes = 0
+        self._pico_fila = 0
+        self._concluidas = 0
+        self._falhas = 0
+        self._reinicios = 0
+        self.latencias = LatencyTracker()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _descartar_executor(self, executor: ProcessPoolExecutor) -> None:
+        """Um processo morreu: o próximo uso cria um pool novo."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self._reinicios += 1
+        executor.shutdown(wait=False)
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """Executa `func(*args)` em um processo sem bloquear o event loop."""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        with self._lock:
+            self._pendentes += 1
+            self._pico_fila = max(self._pico_fila, self._pendentes - self.max_workers)
+        inicio = time.perf_counter()
+        try:
+            resultado = await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            self._descartar_executor(executor)
+            with self._lock:
+                self._falhas += 1
+            raise
+        except Exception:
+            with self._lock:
+                self._falhas += 1
+            raise
+        finally:
+            with self._lock:
+                self._pendentes -= 1
+        self.latencias.record((time.perf_counter() - inicio) * 1000)
+        with self._lock:
+            self._concluidas += 1
+        return resultado
+
+    def aquecer(self, func: Callable[..., Any], *args) -> None:
+        """
+        Sobe os processos em segundo plano com uma tarefa descartável por
+        processo (ex.: importar os módulos). Não entra nas métricas: o
+        spawn levaria segundos aos percentis de latência.
+        """
+        executor = self._get_executor()
+        for _ in range(self.max_workers):
+            futuro = executor.submit(func, *args)
+            futuro.add_done_callback(functools.partial(self._aquecimento_concluido, executor))
+
+    def _aquecimento_concluido(self, executor: ProcessPoolExecutor, futuro) -> None:
+        if futuro.cancelled() or futuro.exception() is None:
+            return
+        print(f"[AVISO] Falha ao aquecer o pool '{self.nome}': {futuro.exception()}")
+        if isinstance(futuro.exception(), BrokenProcessPool):
+            self._descartar_executor(executor)
+
+    def map(self, func: Callable[..., Any], *iterables: Iterable, chunksize: int = 4) -> list:
+        """Versão síncrona em lote (jobs fora do servidor), na ordem da entrada."""
+        executor = self._get_executor()
+        try:
+            resultados = list(executor.map(func, *iterables, chunksize=chunksize))
+        except BrokenProcessPool:
+            self._descartar_executor(executor)
+            raise
+        with self._lock:
+            self._concluidas += len(resultados)
+        return resultados
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "max_workers": self.max_workers,
+                "ativo": self._executor is not None,
+                "em_andamento": self._pendentes,
+                "na_fila": max(0, self._pendentes - self.max_workers),
+                "pico_fila": self._pico_fila,
+                "concluidas": self._concluidas,
+                "falhas": self._falhas,
+                "reinicios": self._reinicios,
+            }
+        stats.update(self.latencias.percentiles())
+        return stats
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# ============================================================================
+# SINGLETONS
+# ============================================================================
+
+_scan_pool: Optional[BoundedThreadPool] = None
+_parse_pool: Optional[BoundedProcessPool] = None
+_parse_pool_lock = threading.Lock()
+_decode_pool: Optional[BoundedProcessPool] = None
+
+
+def get_scan_pool() -> BoundedThreadPool:
+    """
+    Pool dedicado ao pipeline de scan (SEFAZ + classificação por IA).
+
+    Separado do pool padrão do FastAPI para que scans lentos não
+    esgotem as threads que atendem /notas e /dashboard/*.
+    """
+    global _scan_pool
+    if _scan_pool is None:
+        _scan_pool = BoundedThreadPool("scan", SCAN_WORKERS)
+    return _scan_pool
+
+
+def get_parse_pool() -> Optional[BoundedProcessPool]:
+    """
+    Pool de processos para parse_nfce, ou None se NFCE_PARSE_PROCESSES=0.
+
+    Cada worker do gunicorn tem o seu pool: por padrão os núcleos são
+    divididos pelo WEB_CONCURRENCY (o mesmo valor passado em -w).
+    """
+    global _parse_pool
+    if PARSE_PROCESSES <= 0:
+        return None
+    if _parse_pool is None:
+        with _parse_pool_lock:
+            if _parse_pool is None:
+                _parse_pool = BoundedProcessPool("parse", PARSE_PROCESSES)
+    return _parse_pool
+
+
+def get_decode_pool() -> Optional[BoundedProcessPool]:
+    """
+    Pool de processos para decodificar imagens de QR Code (upload), ou
+    None se NFCE_DECODE_WORKERS=0.
+
+    Separado do pool de parse: uma foto grande não atrasa o parse dos scans.
+    """
+    global _decode_pool
+    if DECODE_WORKERS <= 0:
+        return None
+    if _decode_pool is None:
+        with _parse_pool_lock:
+            if _decode_pool is None:
+                _decode_pool = BoundedProcessPool("decode", DECODE_WORKERS)
+    return _decode_pool
+
+
+def configure_default_limiter() -> None:
+    """
+    Ajusta o limite de threads usado pelo FastAPI para handlers `def`.
+
+    Deve ser chamado de dentro do event loop (evento de startup).
+    """
+    from anyio import to_thread
+    to_thread.current_default_thread_limiter().total_tokens = max(1, DB_WORKERS)
+
+
+def default_limiter_stats() -> dict:
+    """Métricas do pool padrão do FastAPI (handlers síncronos)."""
+    from anyio import to_thread
+    limiter = to_thread.current_default_thread_limiter()
+    estatisticas = limiter.statistics()
+    return {
+        "max_workers": int(limiter.total_tokens),
+        "em_execucao": estatisticas.borrowed_tokens,
+        "na_fila": estatisticas.tasks_waiting,
+    }
+
+
+def shutdown_pools() -> None:
+    """Encerra todos os pools criados por este módulo."""
+    global _scan_pool, _parse_pool, _decode_pool
+    if _scan_pool is not None:
+        _scan_pool.shutdown(wait=False)
+        _scan_pool = None
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False)
+        _parse_pool = None
+    if _decode_pool is not None:
+        _decode_pool.shutdown(wait=False)
+        _decode_pool = None
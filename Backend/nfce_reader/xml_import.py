@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo XML Import - Importação de NFC-e a partir do XML (nfeProc).
+
+O XML da nota (baixado da SEFAZ ou recebido por e-mail) tem os campos
+exatos: itens, quantidades, valores, CNPJ e data de emissão. Não há
+heurística de seletores como no scraping do HTML.
+
+O parse é incremental (iterparse): cada documento é liberado da memória
+assim que lido, então arquivos com milhares de notas (um XML com várias
+nfeProc, ou um .zip de XMLs) nunca são carregados inteiros.
+
+Execute com (dentro da pasta Backend/nfce_reader):
+    python xml_import.py nota.xml
+    python xml_import.py notas/ lote.zip
+"""
+
+import sys
+import zipfile
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional, Union
+
+try:
+    from .access_key import is_valid_chave
+except ImportError:  # Execução direta dentro da pasta
+    from access_key import is_valid_chave
+
+
+# ============================================================================
+# ESTRUTURA
+# ============================================================================
+
+@dataclass
+class NotaXML:
+    """Uma NFC-e lida do XML."""
+    chave_acesso: Optional[str]
+    cnpj: Optional[str]
+    url_qrcode: Optional[str]
+    # Mesmo formato retornado por scraper.parse_nfce
+    dados: dict
+
+    @property
+    def url_origem(self) -> str:
+        """URL do QR Code; notas sem ela recebem uma URL sintética única."""
+        return self.url_qrcode or f"xml://{self.chave_acesso}"
+
+
+# ============================================================================
+# PARSE INCREMENTAL
+# ============================================================================
+
+def _local(tag: str) -> str:
+    """Nome da tag sem namespace: '{http://...nfe}det' -> 'det'."""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _filho(elem: ET.Element, *caminho: str) -> Optional[ET.Element]:
+    """Desce pelos filhos com os nomes dados (ignorando namespace)."""
+    for nome in caminho:
+        for filho in elem:
+            if _local(filho.tag) == nome:
+                elem = filho
+                break
+        else:
+            return None
+    return elem
+
+
+def _texto(elem: Optional[ET.Element], *caminho: str) -> str:
+    alvo = _filho(elem, *caminho) if elem is not None else None
+    return (alvo.text or "").strip() if alvo is not None else ""
+
+
+def _float(texto: str, padrao: float = 0.0) -> float:
+    try:
+        return float(texto)
+    except ValueError:
+        return padrao
+
+
+def _read_item(det: ET.Element) -> Optional[dict]:
+    """Item no formato do scraper: valor = valor unitário (vUnCom)."""
+    prod = _filho(det, "prod")
+    if prod is None:
+        return None
+    nome = " ".join(_texto(prod, "xProd").split())
+    if not nome:
+        return None
+    qtd = _float(_texto(prod, "qCom"), 1.0)
+    return {
+        "nome": nome,
+        "qtd": qtd if qtd > 0 else 1.0,
+        "valor": _float(_texto(prod, "vUnCom"))
+    }
+
+
+def _read_endereco(emit: Optional[ET.Element]) -> Optional[str]:
+    ender = _filho(emit, "enderEmit") if emit is not None else None
+    if ender is None:
+        return None
+    partes = [_texto(ender, campo) for campo in ("xLgr", "nro", "xBairro", "xMun", "UF")]
+    endereco = ", ".join(p for p in partes if p)
+    return endereco or None
+
+
+def _build_nota(inf_nfe: ET.Element, itens: list[dict], chave: Optional[str], qrcode: str) -> NotaXML:
+    """Monta a NotaXML a partir do infNFe (já sem os <det>)."""
+    emit = _filho(inf_nfe, "emit")
+    ide = _filho(inf_nfe, "ide")
+
+    # dhEmi (v4.00: 2025-01-31T10:20:30-03:00) ou dEmi (versões antigas)
+    data = _texto(ide, "dhEmi") or _texto(ide, "dEmi")
+
+    if not chave:
+        chave = inf_nfe.get("Id", "")[-44:]
+
+    dados = {
+        "estabelecimento": _texto(emit, "xNome") or _texto(emit, "xFant") or None,
+        "endereco": _read_endereco(emit),
+        "total": _float(_texto(inf_nfe, "total", "ICMSTot", "vNF")),
+        "itens": itens,
+        "data_emissao": data[:10] or None
+    }
+    return NotaXML(
+        chave_acesso=chave if is_valid_chave(chave) else None,
+        cnpj=_texto(emit, "CNPJ") or None,
+        url_qrcode=qrcode or None,
+        dados=dados
+    )
+
+
+def iter_nfce_xml(source: Union[str, Path, BinaryIO]) -> Iterator[NotaXML]:
+    """
+    Lê as NFC-e de um XML em streaming.
+
+    Aceita nfeProc avulsa, NFe sem protocolo, ou um XML com vários
+    documentos (ex.: <lote><nfeProc>...</nfeProc>...</lote>).
+
+    Yields:
+        NotaXML para cada documento encontrado.
+    """
+    itens: list[dict] = []
+    inf_nfe: Optional[ET.Element] = None
+    chave = ""
+    qrcode = ""
+    pilha: list[ET.Element] = []
+
+    for evento, elem in ET.iterparse(source, events=("start", "end")):
+        if evento == "start":
+            pilha.append(elem)
+            continue
+        pilha.pop()
+        nome = _local(elem.tag)
+
+        if nome == "det":
+            item = _read_item(elem)
+            if item:
+                itens.append(item)
+            elem.clear()
+            pilha[-1].remove(elem)
+        elif nome == "infNFe":
+            inf_nfe = elem
+        elif nome == "qrCode":
+            qrcode = (elem.text or "").strip()
+        elif nome == "chNFe":
+            chave = (elem.text or "").strip()
+        elif nome in ("nfeProc", "NFe") and inf_nfe is not None:
+            # NFe dentro de nfeProc: espera o protocolo (chNFe) antes de emitir
+            if nome == "NFe" and pilha and _local(pilha[-1].tag) == "nfeProc":
+                continue
+            yield _build_nota(inf_nfe, itens, chave, qrcode)
+            itens, inf_nfe, chave, qrcode = [], None, "", ""
+            elem.clear()
+            if pilha:
+                # Libera o documento já lido do elemento pai (lote)
+                pilha[-1].remove(elem)
+
+
+def parse_nfce_xml(source: Union[str, Path, BinaryIO]) -> Optional[dict]:
+    """
+    Lê o primeiro documento do XML.
+
+    Returns:
+        Dicionário no formato de scraper.parse_nfce, ou None se não houver NFC-e.
+    """
+    for nota in iter_nfce_xml(source):
+        return nota.dados
+    return None
+
+
+def iter_xml_streams(nome: str, arquivo: BinaryIO) -> Iterator[tuple[str, BinaryIO]]:
+    """
+    Expande um arquivo aberto: .zip vira um fluxo por XML interno.
+
+    Yields:
+        (nome, arquivo binário) de cada XML.
+    """
+    if not nome.lower().endswith(".zip"):
+        yield nome, arquivo
+        return
+    try:
+        zf = zipfile.ZipFile(arquivo)
+    except zipfile.BadZipFile as e:
+        print(f"[ERRO] {nome}: zip inválido - {e}")
+        return
+    with zf:
+        for membro in zf.namelist():
+            if membro.lower().endswith(".xml"):
+                # Membros são descomprimidos sob demanda, sem extrair para o disco
+                with zf.open(membro) as f:
+                    yield f"{nome}:{membro}", f
+
+
+def iter_xml_files(caminhos: list[Union[str, Path]]) -> Iterator[tuple[str, BinaryIO]]:
+    """
+    Expande arquivos .xml, pastas e arquivos .zip em fluxos de leitura.
+
+    Yields:
+        (nome, arquivo binário aberto) — fechado após o consumo.
+    """
+    for caminho in map(Path, caminhos):
+        if caminho.is_dir():
+            arquivos = sorted(p for p in caminho.rglob("*") if p.suffix.lower() in (".xml", ".zip"))
+        else:
+            arquivos = [caminho]
+
+        for arquivo in arquivos:
+            with open(arquivo, "rb") as f:
+                yield from iter_xml_streams(str(arquivo), f)
+
+
+# ============================================================================
+# IMPORTAÇÃO PARA O BANCO
+# ============================================================================
+
+def import_nfce_xml(db, fontes: Iterable[tuple[str, BinaryIO]]) -> dict:
+    """
+    Importa NFC-e de XMLs para o banco via create_nota.
+
+    Notas já existentes (mesma chave de acesso) são ignoradas.
+
+    Args:
+        db: Sessão do banco.
+        fontes: Pares (nome, arquivo), ex.: iter_xml_files(caminhos).
+
+    Returns:
+        Contadores {"importadas", "duplicadas", "erros"}.
+    """
+    try:
+        from .database import create_nota, get_nota_by_chave
+    except ImportError:
+        from database import create_nota, get_nota_by_chave
+
+    resultado = {"importadas": 0, "duplicadas": 0, "erros": 0}
+
+    for nome, arquivo in fontes:
+        try:
+            for nota in iter_nfce_xml(arquivo):
+                if nota.chave_acesso is None or not nota.dados["itens"]:
+                    print(f"[AVISO] {nome}: documento sem chave válida ou sem itens, ignorado")
+                    resultado["erros"] += 1
+                    continue
+                if get_nota_by_chave(db, nota.chave_acesso, nota.url_origem):
+                    resultado["duplicadas"] += 1
+                    continue
+                dados = nota.dados
+                try:
+                    create_nota(
+                        db=db,
+                        url=nota.url_origem,
+                        estabelecimento=dados["estabelecimento"] or "Não identificado",
+                        total=dados["total"],
+                        itens=dados["itens"],
+                        data_emissao=dados["data_emissao"],
+                        endereco=dados["endereco"],
+                        chave_acesso=nota.chave_acesso
+                    )
+                except Exception as e:
+                    print(f"[ERRO] {nome}: falha ao gravar nota {nota.chave_acesso} - {e}")
+                    db.rollback()
+                    resultado["erros"] += 1
+                    continue
+                resultado["importadas"] += 1
+        except ET.ParseError as e:
+            print(f"[ERRO] {nome}: XML inválido - {e}")
+            resultado["erros"] += 1
+
+    return resultado
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("Uso: python xml_import.py <arquivo.xml | pasta | lote.zip> ...")
+        return 1
+
+    try:
+        from .database import SessionLocal, create_tables
+    except ImportError:
+        from database import SessionLocal, create_tables
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        resultado = import_nfce_xml(db, iter_xml_files(argv))
+    finally:
+        db.close()
+
+    print(
+        f"✅ {resultado['importadas']} importadas, "
+        f"{resultado['duplicadas']} já existentes, {resultado['erros']} com erro"
+    )
+    return 0 if resultado["erros"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
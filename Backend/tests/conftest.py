@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""Configuração comum dos testes (rodar de Backend/: python -m pytest tests)."""
+
+import os
+import sys
+from pathlib import Path
+
+# Sem aprendizado de seletores nem arquivo de páginas: os testes não
+# gravam estado em disco e o resultado não depende de execuções anteriores
+os.environ.setdefault("NFCE_SELECTOR_LEARNING", "0")
+os.environ.setdefault("NFCE_ARCHIVE_ENABLED", "0")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""O backfill preenche campos vazios e regrava itens sem desfazer edições do usuário."""
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from nfce_reader.backfill import ESTABELECIMENTO_VAZIO, _campos_alterados, _itens_alterados, _substituir_itens
+from nfce_reader.database import Base, CategoriaDB, CorrecaoClassificacaoDB, ItemDB, NotaFiscalDB
+
+DADOS = {
+    "estabelecimento": "ARCOS DOURADOS COMERCIO DE ALIMENTOS LTDA",
+    "endereco": "AV. BRASIL, 100 - CENTRO",
+    "total": 42.5,
+    "data_emissao": "2024-03-15",
+}
+
+
+def _nota(**campos):
+    base = {"estabelecimento": ESTABELECIMENTO_VAZIO, "endereco": None, "total": 0.0, "data_emissao": None}
+    base.update(campos)
+    return SimpleNamespace(**base)
+
+
+def test_preenche_campos_vazios():
+    alterados = _campos_alterados(_nota(), DADOS)
+    assert alterados == {
+        "estabelecimento": DADOS["estabelecimento"],
+        "endereco": DADOS["endereco"],
+        "total": 42.5,
+        "data_emissao": datetime(2024, 3, 15),
+    }
+
+
+def test_nao_desfaz_nome_editado_pelo_usuario():
+    nota = _nota(estabelecimento="McDonald's", endereco="Rua A, 1", total=40.0, data_emissao=datetime(2024, 3, 14))
+    assert _campos_alterados(nota, DADOS) == {}
+
+
+def test_sobrescrever_substitui_campos_preenchidos():
+    nota = _nota(estabelecimento="McDonald's", total=40.0)
+    alterados = _campos_alterados(nota, DADOS, sobrescrever=True)
+    assert alterados["estabelecimento"] == DADOS["estabelecimento"]
+    assert alterados["total"] == 42.5
+
+
+def test_parse_vazio_nao_apaga_nada():
+    nota = _nota(estabelecimento="PADARIA", endereco="Rua B, 2", total=10.0)
+    vazio = {"estabelecimento": ESTABELECIMENTO_VAZIO, "endereco": None, "total": 0.0, "data_emissao": None}
+    assert _campos_alterados(nota, vazio, sobrescrever=True) == {}
+
+
+def _item(id, nome, valor, categoria_id, qtd=1.0):
+    return SimpleNamespace(id=id, nome=nome, qtd=qtd, valor=valor, categoria_id=categoria_id)
+
+
+def test_itens_herdam_a_categoria_pelo_nome():
+    gravados = [_item(1, "ARROZ 5KG", 24.9, 7), _item(2, "FEIJAO 1KG", 8.0, 3)]
+    parse = [
+        {"nome": "Feijao  1kg", "qtd": 1, "valor": 8.0},
+        {"nome": "ARROZ 5KG", "qtd": 1, "valor": 24.9},
+        {"nome": "CAFE 500G", "qtd": 1, "valor": 18.9},
+    ]
+    novos = _itens_alterados(gravados, parse)
+    assert [(i["categoria_id"], i["anterior"]) for i in novos] == [(3, 2), (7, 1), (None, None)]
+
+
+def test_itens_iguais_ou_parse_vazio_nao_regravam():
+    gravados = [_item(1, "ARROZ 5KG", 24.9, 7)]
+    assert _itens_alterados(gravados, [{"nome": "ARROZ 5KG", "qtd": 1, "valor": 24.9}]) is None
+    assert _itens_alterados(gravados, []) is None
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    # Chaves estrangeiras ligadas, como no PostgreSQL: nada pode apontar para um item apagado
+    event.listen(engine, "connect", lambda conexao, _: conexao.execute("PRAGMA foreign_keys=ON"))
+    Base.metadata.create_all(engine)
+    sessao = sessionmaker(bind=engine, autoflush=False)()
+    yield sessao
+    sessao.close()
+
+
+def test_substituir_itens_mantem_categoria_e_correcoes(db):
+    mercearia, bebidas = CategoriaDB(nome="Mercearia"), CategoriaDB(nome="Bebidas")
+    nota = NotaFiscalDB(estabelecimento="MERCADO", total=30.0, url_origem="https://sefaz/1")
+    nota.itens = [
+        ItemDB(nome="ARROZ 5KG", qtd=1, valor=24.9, categoria_rel=mercearia),
+        ItemDB(nome="REFRI 2L", qtd=1, valor=8.0, categoria_rel=bebidas),
+    ]
+    db.add_all([mercearia, bebidas, nota])
+    db.flush()
+    refri = nota.itens[1]
+    db.add(CorrecaoClassificacaoDB(item_id=refri.id, termo_original="REFRI 2L", categoria_nova_id=bebidas.id))
+    db.commit()
+
+    parse = [
+        {"nome": "ARROZ 5KG", "qtd": 2, "valor": 49.8},
+        {"nome": "REFRI 2L", "qtd": 1, "valor": 8.0},
+        {"nome": "PAO FRANCES", "qtd": 6, "valor": 4.5},
+    ]
+    _substituir_itens(db, nota, _itens_alterados(nota.itens, parse))
+    db.commit()
+
+    itens = db.query(ItemDB).order_by(ItemDB.id).all()
+    assert [(i.nome, i.qtd, i.categoria_id) for i in itens] == [
+        ("ARROZ 5KG", 2, mercearia.id), ("REFRI 2L", 1, bebidas.id), ("PAO FRANCES", 6, None)
+    ]
+    correcao = db.query(CorrecaoClassificacaoDB).one()
+    assert correcao.item_id == itens[1].id
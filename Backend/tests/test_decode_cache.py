@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""O cache de decodificação nunca devolve a URL de outra foto."""
+
+import cv2
+import numpy as np
+import pytest
+
+from nfce_reader import decoder
+from nfce_reader.decode_cache import DecodeCache
+
+URL = "https://www.sefaz.rs.gov.br/NFCE/NFCE-COM.aspx?p=432403{:02d}00000000000065001000000001100000001|2|1|1|ABC"
+
+
+def _foto(numero: int, qualidade: int = 90) -> bytes:
+    """JPEG de um cupom: papel claro, texto e um QR Code pequeno sempre no mesmo lugar."""
+    foto = np.full((1500, 1000), 228, dtype=np.uint8)
+    for linha in range(12):
+        cv2.putText(foto, "ARROZ TIPO 1 5KG    24,90", (80, 120 + linha * 60),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.2, 40, 2)
+    qr = cv2.QRCodeEncoder.create().encode(URL.format(numero))
+    qr = cv2.resize(qr, (220, 220), interpolation=cv2.INTER_NEAREST)
+    foto[1000:1220, 390:610] = qr
+    return cv2.imencode(".jpg", foto, [cv2.IMWRITE_JPEG_QUALITY, qualidade])[1].tobytes()
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    # Tolerância máxima: toda foto com dHash próximo vira candidata, como
+    # fotos de cupons diferentes com a mesma diagramação
+    cache = DecodeCache(max_entradas=16, tolerancia=255)
+    monkeypatch.setattr(decoder, "get_decode_cache", lambda: cache)
+    return cache
+
+
+def test_outro_cupom_parecido_nao_herda_a_url(cache):
+    a, b = _foto(1), _foto(2)
+    ia, ib = decoder.image_fingerprint(a), decoder.image_fingerprint(b)
+    # As impressões perceptuais são quase iguais: só o dHash confundiria as notas
+    assert (ia.dhash ^ ib.dhash).bit_count() <= cache.distancia
+
+    assert decoder.decode_qr_from_bytes(a) == URL.format(1)
+    assert decoder.decode_qr_from_bytes(b) == URL.format(2)
+    assert cache.stats()["rejeitadas"] == 1
+
+
+def test_reenvio_do_mesmo_arquivo_e_acerto_exato(cache, monkeypatch):
+    foto = _foto(3)
+    assert decoder.decode_qr_from_bytes(foto) == URL.format(3)
+    monkeypatch.setattr(decoder, "_imdecode", lambda dados: pytest.fail("não deveria carregar a imagem"))
+    assert decoder.decode_qr_from_bytes(foto) == URL.format(3)
+    assert cache.stats()["hits_exatos"] == 1
+
+
+def test_copia_recomprimida_decodifica_so_a_regiao(cache, monkeypatch):
+    assert decoder.decode_qr_from_bytes(_foto(4)) == URL.format(4)
+    monkeypatch.setattr(decoder, "decode_ladder", lambda *a, **k: pytest.fail("não deveria usar a escada"))
+    assert decoder.decode_qr_from_bytes(_foto(4, qualidade=60)) == URL.format(4)
+    assert cache.stats()["hits_verificados"] == 1
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Estatísticas da escada e dos motores chegam ao lote, mesmo em processos filhos."""
+
+import cv2
+import numpy as np
+import pytest
+
+from nfce_reader import decoder
+
+URL = "https://www.sefaz.rs.gov.br/NFCE/NFCE-COM.aspx?p=4324{:02d}|2|1|1|ABC"
+
+
+@pytest.fixture
+def fotos(tmp_path):
+    caminhos = []
+    for numero in range(4):
+        qr = cv2.QRCodeEncoder.create().encode(URL.format(numero))
+        foto = np.full((600, 600), 235, dtype=np.uint8)
+        foto[200:400, 200:400] = cv2.resize(qr, (200, 200), interpolation=cv2.INTER_NEAREST)
+        caminho = tmp_path / f"cupom{numero}.png"
+        cv2.imwrite(str(caminho), foto)
+        caminhos.append(str(caminho))
+    return caminhos
+
+
+@pytest.mark.parametrize("processos", [1, 2])
+def test_lote_soma_os_contadores_de_cada_processo(fotos, processos):
+    ultimos = {}
+    for resultado in decoder.decode_batch(fotos, processos, chunksize=1):
+        assert resultado.url is not None
+        ultimos[resultado.pid] = resultado
+    stats = decoder.batch_stats(ultimos.values()).stats()
+    if processos > 1:
+        # Processos novos: os contadores são só deste lote
+        assert stats["imagens"] == len(fotos)
+        assert stats["estagios"]["reduzida"]["sucessos"] == len(fotos)
+    else:
+        assert stats["imagens"] >= len(fotos)
+    assert sum(d["sucessos"] for d in stats["motores"].values()) >= len(fotos)
+
+
+def test_somar_contadores():
+    a, b = decoder.DecodeStats(), decoder.DecodeStats()
+    a.registrar("reduzida", True, 4.0)
+    b.registrar("reduzida", False, 2.0)
+    b.registrar_motor("opencv", True, 1.0)
+    b.registrar_imagem(False)
+    a.somar(b.contadores())
+    stats = a.stats()
+    assert stats["estagios"]["reduzida"] == {"tentativas": 2, "sucessos": 1, "taxa_sucesso": 0.5, "ms_medio": 3.0}
+    assert stats["motores"]["opencv"]["tentativas"] == 1
+    assert (stats["imagens"], stats["sem_qr"]) == (1, 1)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""decode_video não pula quadros com um QR Code diferente no mesmo lugar."""
+
+import cv2
+import numpy as np
+
+from nfce_reader import decoder
+
+URL = "https://www.sefaz.rs.gov.br/NFCE/NFCE-COM.aspx?p=4324{:02d}|2|1|1|ABC"
+
+
+def _quadro(conteudo: str, lado: int = 140) -> np.ndarray:
+    """Quadro 1280x720 de papel claro com um QR Code pequeno no centro."""
+    qr = cv2.QRCodeEncoder.create().encode(conteudo)
+    qr = cv2.resize(qr, (lado, lado), interpolation=cv2.INTER_NEAREST)
+    quadro = np.full((720, 1280), 235, dtype=np.uint8)
+    y, x = (720 - lado) // 2, (1280 - lado) // 2
+    quadro[y:y + lado, x:x + lado] = qr
+    return quadro
+
+
+def test_troca_de_qr_no_mesmo_lugar():
+    # Mesmo cupom, só o QR Code muda: a foto inteira reduzida quase não muda
+    quadros = [_quadro(URL.format(1))] * 3 + [_quadro(URL.format(2))] * 3
+    hits = list(decoder.decode_video(quadros, fps=6))
+    assert [hit.url for hit in hits] == [URL.format(1), URL.format(2)]
+
+
+def test_cena_parada_pula_decodificacao():
+    stats = {}
+    hits = list(decoder.decode_video([_quadro(URL.format(1))] * 12, fps=6, estatisticas=stats))
+    assert len(hits) == 1
+    assert stats["repetidos"] > 0
+
+
+def test_quadro_sem_leitura_nao_vira_referencia():
+    # Um quadro sem QR legível antes do cupom: o seguinte é sempre decodificado
+    vazio = np.full((720, 1280), 235, dtype=np.uint8)
+    stats = {}
+    hits = list(decoder.decode_video([vazio, vazio, _quadro(URL.format(3))], fps=6, estatisticas=stats))
+    assert [hit.url for hit in hits] == [URL.format(3)]
+    assert stats["repetidos"] == 0
+
+
+def test_margem_do_video_nao_altera_a_escada():
+    # As constantes do vídeo e da escada de decodificação são independentes
+    assert decoder.MARGEM_RECORTE == 0.15
+    assert decoder.VIDEO_MARGEM_REGIAO == 0.1
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""`import nfce_reader` continua barato (ver `benchmark.py importacao`)."""
+
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+ORCAMENTO_MS = 50.0
+PROIBIDOS = ("cv2", "numpy", "bs4", "httpx")
+
+
+def _importar(codigo: str) -> tuple[dict[str, int], set[str]]:
+    """
+    Executa `codigo` num interpretador novo (-X importtime).
+
+    Returns:
+        ({módulo: µs acumulados}, módulos em sys.modules ao final)
+    """
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"{codigo}; import sys; print(*sys.modules)"],
+        cwd=BACKEND, capture_output=True, text=True, check=True,
+    )
+    tempos = {}
+    for linha in resultado.stderr.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        _, cumulativo, nome = linha.split(":", 1)[1].split("|")
+        tempos[nome.strip()] = int(cumulativo)
+    return tempos, set(resultado.stdout.split())
+
+
+def _pesados(modulos: set[str], proibidos: tuple[str, ...] = PROIBIDOS) -> list[str]:
+    return sorted(nome for nome in modulos if nome.split(".")[0] in proibidos)
+
+
+def test_import_do_pacote_nao_carrega_dependencias_pesadas():
+    _, modulos = _importar("import nfce_reader")
+    assert _pesados(modulos) == []
+
+
+def test_import_do_pacote_dentro_do_orcamento():
+    # Melhor de três: a primeira execução pode pagar o disco frio
+    tempos = [_importar("import nfce_reader")[0]["nfce_reader"] / 1000 for _ in range(3)]
+    assert min(tempos) < ORCAMENTO_MS
+
+
+def test_scraper_nao_carrega_opencv():
+    _, modulos = _importar("from nfce_reader import parse_nfce")
+    assert "nfce_reader.scraper" in modulos
+    assert _pesados(modulos, ("cv2", "numpy")) == []
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""O parse parcial (plano por estado) devolve o mesmo que o parse completo."""
+
+import pytest
+
+from conftest import FIXTURES
+from nfce_reader import scraper
+
+PAGINAS = sorted(FIXTURES.glob("*/*.html"))
+ESTADOS = ["RS", "SP", "RJ", "GENERICO"]
+
+
+@pytest.mark.parametrize("pagina", PAGINAS, ids=lambda p: f"{p.parent.name}/{p.name}")
+@pytest.mark.parametrize("estado", ESTADOS)
+def test_plano_igual_ao_parse_completo(pagina, estado):
+    html = pagina.read_text(encoding="utf-8")
+    com_plano = scraper.parse_nfce(html, estado, usar_plano=True, usar_cache=False)
+    completo = scraper.parse_nfce(html, estado, usar_plano=False, usar_cache=False)
+    assert com_plano == completo
+
+
+@pytest.mark.parametrize("pagina", PAGINAS, ids=lambda p: f"{p.parent.name}/{p.name}")
+def test_campos_do_cabecalho(pagina):
+    html = pagina.read_text(encoding="utf-8")
+    resultado = scraper.parse_nfce(html, pagina.parent.name, usar_cache=False)
+    assert resultado["estabelecimento"] != "Não identificado"
+    assert resultado["total"] > 0
+    assert resultado["data_emissao"] is not None
+    assert resultado["itens"]
+
+
+def test_pagina_de_sp_com_seletores_do_rs():
+    # Os fallbacks (#u20, .totalNumb) entram no plano
+    html = (FIXTURES / "SP" / "drogaria.html").read_text(encoding="utf-8")
+    resultado = scraper.parse_nfce(html, "RS", usar_cache=False)
+    esperado = scraper.parse_nfce(html, "SP", usar_cache=False)
+    assert resultado["estabelecimento"] == "DROGARIA EXEMPLO S/A"
+    assert resultado["total"] == esperado["total"]
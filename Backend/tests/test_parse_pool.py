@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Processos do pool de parse enxergam estados registrados em tempo de execução."""
+
+import asyncio
+
+import pytest
+
+from nfce_reader import scraper
+from nfce_reader.workers import BoundedProcessPool
+
+HTML = """
+<html><body>
+  <div class="loja">MERCADO DO BAIRRO LTDA</div>
+  <div id="compras">
+    <div class="produto"><span class="desc">CAFE 500G</span><span class="qt">1</span><span class="vl">18,90</span></div>
+    <div class="produto"><span class="desc">LEITE 1L</span><span class="qt">2</span><span class="vl">5,49</span></div>
+  </div>
+  <div class="pagar">29,88</div>
+</body></html>
+"""
+
+SELETORES_XX = scraper.EstadoSelectors(
+    nome="XX",
+    estabelecimento=".loja",
+    total=".pagar",
+    itens_container="#compras .produto",
+    item_nome=".desc",
+    item_qtd=".qt",
+    item_valor=".vl",
+    plano_extra=(),
+)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = BoundedProcessPool("parse-teste", 1)
+    monkeypatch.setattr(scraper, "get_parse_pool", lambda: pool)
+    monkeypatch.setitem(scraper.SELETORES_ESTADO, "XX", SELETORES_XX)
+    yield pool
+    pool.shutdown()
+
+
+def test_batch_usa_seletores_registrados_no_pai(pool):
+    esperado = scraper.parse_nfce(HTML, "XX", usar_cache=False)
+    assert esperado["estabelecimento"] == "MERCADO DO BAIRRO LTDA"
+    assert len(esperado["itens"]) == 2
+
+    resultados = scraper.parse_nfce_batch([(HTML, "XX"), (HTML.replace("18,90", "19,90"), "XX")])
+    assert resultados[0] == esperado
+    assert resultados[1]["itens"][0]["valor"] == 19.90
+
+
+def test_aquecimento_fora_das_metricas(pool):
+    pool.aquecer(scraper.parse_nfce_bytes, b"", "GENERICO")
+    html = HTML.replace("MERCADO", "EMPORIO")
+    resultado = asyncio.run(scraper.parse_nfce_async(html, "XX"))
+    assert resultado["estabelecimento"] == "EMPORIO DO BAIRRO LTDA"
+    stats = pool.stats()
+    assert stats["concluidas"] == 1
+    assert stats["p50_ms"] is not None
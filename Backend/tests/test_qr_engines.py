@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Motores de QR Code: interface abstrata, política auto e corrida."""
+
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from nfce_reader import decoder
+
+URL = "https://www.sefaz.rs.gov.br/NFCE/NFCE-COM.aspx?p=43240000000000000000650010000000011000000011|2|1|1|ABC"
+
+
+class _Motor(decoder.QREngine):
+    def __init__(self, nome, acha, espera=0.0):
+        self.nome = nome
+        self.acha = acha
+        self.espera = espera
+        self.chamadas = 0
+
+    def decode(self, image, multiplos=False):
+        self.chamadas += 1
+        time.sleep(self.espera)
+        return [decoder.QRHit(URL, (0, 0, 1, 1))] if self.acha else []
+
+
+@pytest.fixture
+def motores(monkeypatch):
+    monkeypatch.setattr(decoder, "_engines", {})
+    monkeypatch.setattr(decoder, "_resultados", {})
+    return lambda *lista: [decoder.register_engine(m) for m in lista]
+
+
+def test_interface_abstrata():
+    class SemDecode(decoder.QREngine):
+        nome = "incompleto"
+
+    with pytest.raises(TypeError):
+        SemDecode()
+
+
+def test_auto_prefere_o_motor_com_mais_acertos(motores):
+    ruim, bom = _Motor("ruim", False), _Motor("bom", True)
+    motores(ruim, bom)
+    imagem = np.zeros((8, 8), dtype=np.uint8)
+    for _ in range(decoder.AUTO_MIN_TENTATIVAS):
+        assert decoder.decode_hits(imagem, politica="auto")
+    # Com amostras suficientes o motor que acerta passa a ser o primeiro
+    ruim.chamadas = 0
+    for _ in range(5):
+        decoder.decode_hits(imagem, politica="auto")
+    assert ruim.chamadas == 0
+    # fallback mantém a ordem de registro
+    decoder.decode_hits(imagem, politica="fallback")
+    assert ruim.chamadas == 1
+
+
+def test_race_nao_prende_threads_dos_perdedores(motores):
+    rapido, lento = _Motor("rapido", True), _Motor("lento", True, espera=0.5)
+    motores(rapido, lento)
+    imagem = np.zeros((8, 8), dtype=np.uint8)
+    inicio = time.perf_counter()
+    for _ in range(3):
+        assert decoder.decode_hits(imagem, politica="race")
+    # Cada corrida volta com o motor rápido, sem esperar os lentos anteriores
+    assert time.perf_counter() - inicio < 0.5
+    while any(t.name.startswith("qr-race") for t in threading.enumerate()):
+        time.sleep(0.05)
+
+
+def test_opencv_le_qr_sintetico():
+    qr = cv2.QRCodeEncoder.create().encode(URL)
+    imagem = cv2.copyMakeBorder(cv2.resize(qr, None, fx=4, fy=4, interpolation=cv2.INTER_NEAREST),
+                                40, 40, 40, 40, cv2.BORDER_CONSTANT, value=255)
+    assert [hit.data for hit in decoder.decode_hits(imagem, politica="opencv")] == [URL]
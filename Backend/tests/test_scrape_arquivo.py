@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Só páginas com itens são arquivadas; cópias sem itens são baixadas de novo."""
+
+import pytest
+
+from conftest import FIXTURES
+from nfce_reader import scraper
+from nfce_reader.archive import PageArchive
+
+CHAVE = "43240312345678000190650010000123451000123451"
+URL = f"https://www.sefaz.rs.gov.br/NFCE/NFCE-COM.aspx?p={CHAVE}|2|1|1|ABC"
+PAGINA = (FIXTURES / "RS" / "supermercado.html").read_text(encoding="utf-8")
+ERRO = "<html><body><p>Nota em processamento. Tente novamente mais tarde.</p></body></html>"
+
+
+@pytest.fixture
+def arquivo(tmp_path, monkeypatch):
+    arquivo = PageArchive(str(tmp_path / "arquivo"))
+    monkeypatch.setattr(scraper, "get_archive", lambda: arquivo)
+    yield arquivo
+    arquivo.close()
+
+
+def _servidor(monkeypatch, *respostas):
+    fila = list(respostas)
+    monkeypatch.setattr(scraper, "fetch_page", lambda url: fila.pop(0))
+    return fila
+
+
+def test_pagina_de_erro_nao_e_arquivada(arquivo, monkeypatch):
+    _servidor(monkeypatch, ERRO)
+    resultado = scraper.scrape_nfce(URL, "RS")
+    assert resultado["itens"] == []
+    assert CHAVE not in arquivo
+
+
+def test_copia_sem_itens_e_baixada_de_novo(arquivo, monkeypatch):
+    # Cópia ruim gravada por uma versão anterior
+    arquivo.put(CHAVE, ERRO.encode("utf-8"))
+    fila = _servidor(monkeypatch, PAGINA)
+    resultado = scraper.scrape_nfce(URL, "RS")
+    assert resultado["itens"]
+    assert fila == []
+    assert arquivo.get(CHAVE).decode("utf-8") == PAGINA
+
+    # Próximo scan usa a cópia boa, sem baixar
+    _servidor(monkeypatch)
+    assert scraper.scrape_nfce(URL, "RS") == resultado
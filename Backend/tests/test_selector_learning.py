@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""A ordem aprendida dos seletores não muda o resultado do parse."""
+
+import pytest
+
+from conftest import FIXTURES
+from nfce_reader import scraper
+
+PAGINAS = sorted(FIXTURES.glob("*/*.html"))
+
+# Histórico que coloca os fallbacks mais genéricos na frente
+DICAS = {
+    "estabelecimento": ["[class*='emitente']", ".razao", scraper.ROTULO_ESTADO],
+    "total": ["[class*='total']", ".total", scraper.ROTULO_ESTADO],
+    "generico_primeiro": True,
+}
+
+
+def test_seletor_do_estado_continua_primeiro():
+    cadeia = [(scraper.ROTULO_ESTADO, 0), (".txtTopo", 1), ("#u20", 2), (".razao", 3)]
+    ordenada = scraper._ordenar_cadeia(cadeia, [".razao", "#u20", scraper.ROTULO_ESTADO])
+    assert [rotulo for rotulo, _ in ordenada] == [scraper.ROTULO_ESTADO, ".razao", "#u20", ".txtTopo"]
+
+
+@pytest.mark.parametrize("pagina", PAGINAS, ids=lambda p: f"{p.parent.name}/{p.name}")
+@pytest.mark.parametrize("usar_plano", [True, False])
+def test_dicas_nao_mudam_o_resultado(pagina, usar_plano):
+    html = pagina.read_text(encoding="utf-8")
+    estado = pagina.parent.name
+    sem_dicas, _ = scraper._parse_nfce(html, estado, None, usar_plano)
+    com_dicas, _ = scraper._parse_nfce(html, estado, None, usar_plano, DICAS)
+    assert com_dicas == sem_dicas
+
+
+def test_dicas_entram_na_chave_do_cache():
+    assert scraper._assinatura_dicas(None) == scraper._assinatura_dicas({"generico_primeiro": True})
+    assert scraper._assinatura_dicas(DICAS) != scraper._assinatura_dicas(None)
+    # O rótulo do estado é sempre o primeiro: não diferencia chaves
+    assert scraper._assinatura_dicas({"total": [scraper.ROTULO_ESTADO]}) == scraper._assinatura_dicas(None)
+
+
+def test_workers_somam_as_estatisticas_no_arquivo(tmp_path):
+    from nfce_reader.selector_stats import ITENS_ESTADO, ITENS_GENERICO, SelectorStats
+
+    caminho = tmp_path / "seletores.json"
+    # Dois workers do gunicorn, cada um com as suas contagens em memória
+    a, b = SelectorStats(str(caminho)), SelectorStats(str(caminho))
+    for _ in range(3):
+        a.record("RS", {"estabelecimento": ".txtTopo", "itens": ITENS_GENERICO})
+    b.record("RS", {"estabelecimento": ".razao", "itens": ITENS_GENERICO})
+    a.save()
+    b.save()
+    a.save()   # Sem registros novos: nada é somado de novo
+
+    dados = SelectorStats(str(caminho)).stats()["RS"]
+    assert dados["parses"] == 4
+    assert dados["estabelecimento"] == {".txtTopo": 3, ".razao": 1}
+    # Quem gravou por último enxerga o que o outro aprendeu
+    assert b.stats()["RS"]["estabelecimento"] == {".txtTopo": 3, ".razao": 1}
+
+    # Itens pelos seletores do estado em outro worker: o histórico genérico perde peso
+    b.record("RS", {"itens": ITENS_ESTADO})
+    b.save()
+    assert SelectorStats(str(caminho)).stats()["RS"]["itens"] == {ITENS_GENERICO: 2, ITENS_ESTADO: 1}